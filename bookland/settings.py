@@ -56,6 +56,7 @@ MIDDLEWARE = [
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'social_django.middleware.SocialAuthExceptionMiddleware',
+    'pdftranslate.profiling.ProfilingMiddleware',
 ]
 
 ROOT_URLCONF = 'bookland.urls'
@@ -84,13 +85,49 @@ WSGI_APPLICATION = 'bookland.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
+# SQLite is tuned for background jobs writing while requests read:
+# - WAL lets readers run alongside the single writer.
+# - synchronous=NORMAL is safe with WAL and avoids an fsync per commit.
+# - 'timeout' is SQLite's busy timeout, how long a connection waits for the
+#   write lock before raising "database is locked".
+# - IMMEDIATE transactions take the write lock when they begin, so they
+#   wait for it there instead of failing when a read turns into a write.
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            'init_command': 'PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL',
+            'timeout': int(os.getenv('SQLITE_BUSY_TIMEOUT', 20)),
+            'transaction_mode': 'IMMEDIATE',
+        },
     }
 }
 
+# Background jobs hand their database writes to one writer thread per
+# process, which commits the writes arriving within
+# INGESTION_QUEUE_BATCH_WINDOW seconds (at most INGESTION_QUEUE_MAX_BATCH)
+# in one transaction. See pdftranslate/write_queue.py.
+INGESTION_QUEUE_ENABLED = os.getenv('INGESTION_QUEUE_ENABLED', 'True') == 'True'
+INGESTION_QUEUE_BATCH_WINDOW = float(os.getenv('INGESTION_QUEUE_BATCH_WINDOW', 0.05))
+INGESTION_QUEUE_MAX_BATCH = int(os.getenv('INGESTION_QUEUE_MAX_BATCH', 50))
+
+# Deleted documents are hidden at once and their rows purged in the
+# background, PURGE_CHUNK_SIZE rows per DELETE.
+PURGE_CHUNK_SIZE = int(os.getenv('PURGE_CHUNK_SIZE', 1000))
+
+# Translation, video and word list jobs run on
+# TRANSLATION_MAX_CONCURRENT_JOBS worker threads per process; the rest
+# wait in a queue where users take turns. Uploads are turned away while
+# TRANSLATION_MAX_QUEUED_JOBS jobs (or TRANSLATION_MAX_QUEUED_JOBS_PER_USER
+# of one user's) are waiting. The queue is in memory, so these limits
+# apply to each server process separately, and jobs still waiting or
+# running when a process exits are lost (their documents can be
+# re-translated). See pdftranslate/job_scheduler.py.
+TRANSLATION_MAX_CONCURRENT_JOBS = int(os.getenv('TRANSLATION_MAX_CONCURRENT_JOBS', 2))
+TRANSLATION_MAX_QUEUED_JOBS = int(os.getenv('TRANSLATION_MAX_QUEUED_JOBS', 100))
+TRANSLATION_MAX_QUEUED_JOBS_PER_USER = int(os.getenv('TRANSLATION_MAX_QUEUED_JOBS_PER_USER', 20))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -219,11 +256,103 @@ LOGGING = {
     },
 }
 
+# PDF processing
+# Documents with at least this many pages are processed in large-document
+# mode: memory-mapped, PDF_PAGE_WINDOW pages at a time, without keeping the
+# full extracted text, and failed once they use more than
+# PDF_JOB_MEMORY_LIMIT_MB on top of what the worker was already using.
+PDF_LARGE_DOCUMENT_PAGES = int(os.getenv('PDF_LARGE_DOCUMENT_PAGES', 300))
+PDF_PAGE_WINDOW = int(os.getenv('PDF_PAGE_WINDOW', 25))
+PDF_JOB_MEMORY_LIMIT_MB = int(os.getenv('PDF_JOB_MEMORY_LIMIT_MB', 512))
+
+# OpenAI (Whisper transcription)
+OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
+
+# Video transcription
+# Audio is split into chunks of this many seconds, which are transcribed
+# concurrently by at most TRANSCRIPTION_MAX_WORKERS requests.
+TRANSCRIPTION_CHUNK_SECONDS = int(os.getenv('TRANSCRIPTION_CHUNK_SECONDS', 600))
+TRANSCRIPTION_MAX_WORKERS = int(os.getenv('TRANSCRIPTION_MAX_WORKERS', 4))
+# Audio is extracted with ffmpeg; transcripts are cached by the video's
+# content hash in the 'translations' cache for TRANSCRIPT_CACHE_TTL seconds.
+FFMPEG_BINARY = os.getenv('FFMPEG_BINARY', 'ffmpeg')
+TRANSCRIPT_CACHE_TTL = int(os.getenv('TRANSCRIPT_CACHE_TTL', 30 * 24 * 3600))
+
+# Translation backend used by background jobs and management commands
+TRANSLATION_BACKEND = os.getenv(
+    'TRANSLATION_BACKEND',
+    'pdftranslate.google_translate_service.GoogleTranslateService'
+)
+# Backend requests a translation job may have in flight at once, shared by
+# all of the document's target languages.
+TRANSLATION_MAX_CONCURRENT_REQUESTS = int(os.getenv('TRANSLATION_MAX_CONCURRENT_REQUESTS', 4))
+
+# OpenAI translation backend (pdftranslate.translation_service.TranslationService)
+# Words are sent in batches estimated at OPENAI_TRANSLATION_BATCH_TOKENS
+# tokens, with at most OPENAI_TRANSLATION_MAX_CONCURRENT_REQUESTS requests
+# in flight per process. The model must support JSON mode.
+OPENAI_TRANSLATION_MODEL = os.getenv('OPENAI_TRANSLATION_MODEL', 'gpt-4o-mini')
+OPENAI_TRANSLATION_BATCH_TOKENS = int(os.getenv('OPENAI_TRANSLATION_BATCH_TOKENS', 2000))
+OPENAI_TRANSLATION_MAX_CONCURRENT_REQUESTS = int(
+    os.getenv('OPENAI_TRANSLATION_MAX_CONCURRENT_REQUESTS', 4)
+)
+
+# Known words
+# Words a reader has mastered (a flashcard reviewed KNOWN_WORD_MIN_REVIEWS
+# times) are not translated or offered as new flashcards again in that
+# language, and neither are the stopwords listed one per line in
+# TRANSLATION_STOPWORDS_FILE.
+KNOWN_WORD_MIN_REVIEWS = int(os.getenv('KNOWN_WORD_MIN_REVIEWS', 5))
+TRANSLATION_STOPWORDS_FILE = os.getenv('TRANSLATION_STOPWORDS_FILE')
+
+# Translation cache and cost accounting
+# Translations are cached per word, backend and language pair in the
+# 'translations' cache for TRANSLATION_CACHE_TTL seconds.
+# TRANSLATION_COST_PER_MILLION_CHARACTERS maps a backend class name to its
+# price, used by translation_usage_report.
+TRANSLATION_CACHE_TTL = int(os.getenv('TRANSLATION_CACHE_TTL', 90 * 24 * 3600))
+TRANSLATION_COST_PER_MILLION_CHARACTERS = {
+    'GoogleTranslateService': float(os.getenv('GOOGLE_TRANSLATE_COST_PER_MILLION', 20)),
+}
+
+# Profiling
+# With PROFILING_ENABLED, a PROFILING_SAMPLE_RATE fraction of requests and
+# a PROFILING_TASK_SAMPLE_RATE fraction of translation jobs are profiled.
+# Staff users can profile any request by sending the PROFILING_HEADER
+# header. Uses pyinstrument (sampling every PROFILING_INTERVAL seconds);
+# without it, cProfile for sync requests and jobs and nothing for async
+# requests.
+PROFILING_ENABLED = os.getenv('PROFILING_ENABLED', 'False') == 'True'
+PROFILING_SAMPLE_RATE = float(os.getenv('PROFILING_SAMPLE_RATE', 0.01))
+PROFILING_TASK_SAMPLE_RATE = float(os.getenv('PROFILING_TASK_SAMPLE_RATE', 0.1))
+PROFILING_INTERVAL = float(os.getenv('PROFILING_INTERVAL', 0.001))
+PROFILING_HEADER = 'X-Profile'
+PROFILING_DIR = os.getenv('PROFILING_DIR', str(BASE_DIR / 'profiles'))
+PROFILING_MAX_FILES = int(os.getenv('PROFILING_MAX_FILES', 200))
+
+# Metrics
+# /metrics serves Prometheus metrics for translation jobs. Set
+# PROMETHEUS_MULTIPROC_DIR in the environment of every server process to
+# aggregate them across workers, and METRICS_TOKEN to require
+# "Authorization: Bearer <token>" on scrapes.
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+
 # Cache configuration
 CACHES = {
     'default': {
         'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-    }
+    },
+    # Translation memory shared by every process and kept across restarts,
+    # so pre-warmed translations (see prewarm_translations) are not lost.
+    # Its table is created by the pdftranslate migrations.
+    'translations': {
+        'BACKEND': 'pdftranslate.cache_backends.BulkDatabaseCache',
+        'LOCATION': 'translation_cache',
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.getenv('TRANSLATION_CACHE_MAX_ENTRIES', 2_000_000)),
+            'CULL_FREQUENCY': 10,
+        },
+    },
 }
 
 # Cache timeout settings (in seconds)
@@ -0,0 +1,77 @@
+import base64
+import pickle
+from datetime import datetime, timezone
+from django.conf import settings
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.core.cache.backends.db import DatabaseCache
+from django.db import DatabaseError, connections, router, transaction
+
+# Keys per DELETE statement, well below SQLite's parameter limit
+DELETE_BATCH_SIZE = 500
+
+
+class BulkDatabaseCache(DatabaseCache):
+    """
+    Database cache whose ``set_many`` writes all keys with one DELETE per
+    500 keys and a single multi-row INSERT, instead of three queries and a
+    table count per key. Translation batches are written this way.
+
+    Its table is created by migration 0020_translation_cache_table.
+    """
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        if not data:
+            return []
+        expires_at = self.get_backend_timeout(timeout)
+        if expires_at is None:
+            expires = datetime.max
+        else:
+            expires = datetime.fromtimestamp(
+                expires_at, tz=timezone.utc if settings.USE_TZ else None
+            )
+        expires = expires.replace(microsecond=0)
+
+        db = router.db_for_write(self.cache_model_class)
+        connection = connections[db]
+        quote_name = connection.ops.quote_name
+        table = quote_name(self._table)
+        expires = connection.ops.adapt_datetimefield_value(expires)
+        rows = [
+            (
+                self.make_and_validate_key(key, version=version),
+                base64.b64encode(pickle.dumps(value, self.pickle_protocol)).decode('latin1'),
+                expires,
+            )
+            for key, value in data.items()
+        ]
+        try:
+            with transaction.atomic(using=db), connection.cursor() as cursor:
+                for start in range(0, len(rows), DELETE_BATCH_SIZE):
+                    keys = [row[0] for row in rows[start:start + DELETE_BATCH_SIZE]]
+                    cursor.execute(
+                        'DELETE FROM %s WHERE %s IN (%s)' % (
+                            table,
+                            quote_name('cache_key'),
+                            ', '.join(['%s'] * len(keys)),
+                        ),
+                        keys,
+                    )
+                cursor.executemany(
+                    'INSERT INTO %s (%s, %s, %s) VALUES (%%s, %%s, %%s)' % (
+                        table,
+                        quote_name('cache_key'),
+                        quote_name('value'),
+                        quote_name('expires'),
+                    ),
+                    rows,
+                )
+                cursor.execute('SELECT COUNT(*) FROM %s' % table)
+                count = cursor.fetchone()[0]
+                if count > self._max_entries:
+                    now = datetime.now(tz=timezone.utc if settings.USE_TZ else None)
+                    self._cull(db, cursor, now.replace(microsecond=0), count)
+        except DatabaseError:
+            # Another process wrote one of the keys first; fall back to
+            # per-key upserts, which tolerate that
+            return super().set_many(data, timeout=timeout, version=version)
+        return []
@@ -0,0 +1,267 @@
+import csv
+import hashlib
+import html
+import json
+import os
+import sqlite3
+import tempfile
+import time
+import zipfile
+
+# Rows fetched per database round trip while exporting
+EXPORT_CHUNK_SIZE = 2000
+
+ANKI_DECK_ID = 1
+ANKI_SCHEMA = """
+CREATE TABLE col (
+    id integer primary key, crt integer not null, mod integer not null,
+    scm integer not null, ver integer not null, dty integer not null,
+    usn integer not null, ls integer not null, conf text not null,
+    models text not null, decks text not null, dconf text not null,
+    tags text not null
+);
+CREATE TABLE notes (
+    id integer primary key, guid text not null, mid integer not null,
+    mod integer not null, usn integer not null, tags text not null,
+    flds text not null, sfld integer not null, csum integer not null,
+    flags integer not null, data text not null
+);
+CREATE TABLE cards (
+    id integer primary key, nid integer not null, did integer not null,
+    ord integer not null, mod integer not null, usn integer not null,
+    type integer not null, queue integer not null, due integer not null,
+    ivl integer not null, factor integer not null, reps integer not null,
+    lapses integer not null, left integer not null, odue integer not null,
+    odid integer not null, flags integer not null, data text not null
+);
+CREATE TABLE revlog (
+    id integer primary key, cid integer not null, usn integer not null,
+    ease integer not null, ivl integer not null, lastIvl integer not null,
+    factor integer not null, time integer not null, type integer not null
+);
+CREATE TABLE graves (
+    usn integer not null, oid integer not null, type integer not null
+);
+CREATE INDEX ix_notes_usn ON notes (usn);
+CREATE INDEX ix_cards_usn ON cards (usn);
+CREATE INDEX ix_revlog_usn ON revlog (usn);
+CREATE INDEX ix_cards_nid ON cards (nid);
+CREATE INDEX ix_cards_sched ON cards (did, queue, due);
+CREATE INDEX ix_revlog_cid ON revlog (cid);
+CREATE INDEX ix_notes_csum ON notes (csum);
+"""
+
+
+class Echo:
+    """File-like object that returns what is written instead of storing it."""
+
+    def write(self, value):
+        return value
+
+
+def iter_csv(header, rows):
+    """Yield CSV lines one at a time so the response can start immediately."""
+    writer = csv.writer(Echo())
+    yield writer.writerow(header)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def build_apkg(deck_name, cards, output):
+    """
+    Write an Anki package containing one basic note per ``(front, back)``
+    pair in ``cards`` to the binary file object ``output``.
+
+    Notes are inserted into the collection straight from the iterator, so
+    only the temporary collection file grows with the size of the deck.
+    """
+    fd, collection_path = tempfile.mkstemp(suffix='.anki2')
+    os.close(fd)
+    try:
+        connection = sqlite3.connect(collection_path)
+        try:
+            _write_collection(connection, deck_name, cards)
+        finally:
+            connection.close()
+
+        with zipfile.ZipFile(output, 'w', zipfile.ZIP_DEFLATED) as package:
+            package.write(collection_path, 'collection.anki2')
+            package.writestr('media', '{}')
+    finally:
+        os.remove(collection_path)
+
+
+def _write_collection(connection, deck_name, cards):
+    now = int(time.time())
+    model_id = now * 1000
+    deck_id = model_id + 1
+    connection.executescript(ANKI_SCHEMA)
+    connection.execute(
+        'INSERT INTO col VALUES (1, ?, ?, ?, 11, 0, 0, 0, ?, ?, ?, ?, ?)',
+        (
+            now - now % 86400,
+            now * 1000,
+            now * 1000,
+            json.dumps(_collection_conf(deck_id, model_id)),
+            json.dumps({str(model_id): _note_model(model_id, deck_id, now)}),
+            json.dumps({
+                str(ANKI_DECK_ID): _deck(ANKI_DECK_ID, 'Default', now),
+                str(deck_id): _deck(deck_id, deck_name, now),
+            }),
+            json.dumps({'1': _deck_conf()}),
+            '{}',
+        )
+    )
+
+    def note_rows():
+        for position, (front, back) in enumerate(cards):
+            front = html.escape(front or '')
+            back = html.escape(back or '')
+            guid = hashlib.sha1(f'{front}\x1f{back}'.encode()).hexdigest()[:10]
+            checksum = int(hashlib.sha1(front.encode()).hexdigest()[:8], 16)
+            yield (
+                model_id + position, guid, model_id, now, -1, '',
+                f'{front}\x1f{back}', front, checksum, 0, ''
+            )
+
+    connection.executemany(
+        'INSERT INTO notes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+        note_rows()
+    )
+    # One new card per note, due in the order the notes were exported
+    connection.execute(
+        "INSERT INTO cards SELECT id, id, ?, 0, mod, -1, 0, 0, id - ?, "
+        "0, 0, 0, 0, 0, 0, 0, 0, '' FROM notes",
+        (deck_id, model_id)
+    )
+    connection.commit()
+
+
+def _collection_conf(deck_id, model_id):
+    return {
+        'activeDecks': [deck_id],
+        'curDeck': deck_id,
+        'curModel': str(model_id),
+        'newSpread': 0,
+        'collapseTime': 1200,
+        'timeLim': 0,
+        'estTimes': True,
+        'dueCounts': True,
+        'nextPos': 1,
+        'sortType': 'noteFld',
+        'sortBackwards': False,
+        'addToCur': True,
+    }
+
+
+def _note_model(model_id, deck_id, now):
+    return {
+        'id': model_id,
+        'name': 'BookLand Word',
+        'type': 0,
+        'mod': now,
+        'usn': -1,
+        'sortf': 0,
+        'did': deck_id,
+        'tmpls': [{
+            'name': 'Card 1',
+            'ord': 0,
+            'qfmt': '{{Original}}',
+            'afmt': '{{FrontSide}}<hr id=answer>{{Translation}}',
+            'did': None,
+            'bqfmt': '',
+            'bafmt': '',
+        }],
+        'flds': [
+            _field('Original', 0),
+            _field('Translation', 1),
+        ],
+        'css': (
+            '.card { font-family: arial; font-size: 20px; '
+            'text-align: center; color: black; background-color: white; }'
+        ),
+        'latexPre': (
+            '\\documentclass[12pt]{article}\n'
+            '\\special{papersize=3in,5in}\n'
+            '\\usepackage[utf8]{inputenc}\n'
+            '\\usepackage{amssymb,amsmath}\n'
+            '\\pagestyle{empty}\n'
+            '\\setlength{\\parindent}{0in}\n'
+            '\\begin{document}\n'
+        ),
+        'latexPost': '\\end{document}',
+        'tags': [],
+        'vers': [],
+        'req': [[0, 'all', [0]]],
+    }
+
+
+def _field(name, ord):
+    return {
+        'name': name,
+        'ord': ord,
+        'sticky': False,
+        'rtl': False,
+        'font': 'Arial',
+        'size': 20,
+        'media': [],
+    }
+
+
+def _deck(deck_id, name, now):
+    return {
+        'id': deck_id,
+        'name': name,
+        'desc': '',
+        'mod': now,
+        'usn': -1,
+        'conf': 1,
+        'dyn': 0,
+        'collapsed': False,
+        'browserCollapsed': False,
+        'extendNew': 10,
+        'extendRev': 50,
+        'newToday': [0, 0],
+        'revToday': [0, 0],
+        'lrnToday': [0, 0],
+        'timeToday': [0, 0],
+    }
+
+
+def _deck_conf():
+    return {
+        'id': 1,
+        'name': 'Default',
+        'mod': 0,
+        'usn': 0,
+        'maxTaken': 60,
+        'autoplay': True,
+        'timer': 0,
+        'replayq': True,
+        'dyn': False,
+        'new': {
+            'bury': True,
+            'delays': [1, 10],
+            'initialFactor': 2500,
+            'ints': [1, 4, 7],
+            'order': 1,
+            'perDay': 20,
+            'separate': True,
+        },
+        'rev': {
+            'bury': True,
+            'ease4': 1.3,
+            'fuzz': 0.05,
+            'ivlFct': 1,
+            'maxIvl': 36500,
+            'minSpace': 1,
+            'perDay': 100,
+        },
+        'lapse': {
+            'delays': [10],
+            'leechAction': 0,
+            'leechFails': 8,
+            'minInt': 1,
+            'mult': 0,
+        },
+    }
@@ -1,15 +1,39 @@
 from google.cloud import translate_v2 as translate
-import os
+from tenacity import retry, stop_after_attempt, wait_exponential
+from .metrics import backend_call, record_retry
+
+# Maximum number of strings the v2 API accepts in a single request
+MAX_SEGMENTS_PER_REQUEST = 128
 
 class GoogleTranslateService:
     def __init__(self):
         self.client = translate.Client()
 
+    @retry(
+        stop=stop_after_attempt(3),
+        wait=wait_exponential(multiplier=1, min=4, max=10),
+        before_sleep=record_retry
+    )
+    def request(self, values, target_language, source_language):
+        """Send one translate request, retrying it on failure."""
+        with backend_call('GoogleTranslateService'):
+            return self.client.translate(
+                values,
+                target_language=target_language,
+                source_language=source_language,
+                format_='text'
+            )
+
     def translate_word(self, word, target_language='ru', source_language='en'):
-        result = self.client.translate(
-            word,
-            target_language=target_language,
-            source_language=source_language,
-            format_='text'
-        )
-        return result['translatedText'] 
\ No newline at end of file
+        result = self.request(word, target_language, source_language)
+        return result['translatedText']
+
+    def translate_words(self, words, target_language='ru', source_language='en'):
+        """Translate a list of words, sending up to 128 words per request."""
+        translations = []
+        for i in range(0, len(words), MAX_SEGMENTS_PER_REQUEST):
+            results = self.request(
+                words[i:i + MAX_SEGMENTS_PER_REQUEST], target_language, source_language
+            )
+            translations.extend(result['translatedText'] for result in results)
+        return translations
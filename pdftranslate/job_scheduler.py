@@ -0,0 +1,199 @@
+"""
+Per-process scheduler for background translation jobs.
+
+At most TRANSLATION_MAX_CONCURRENT_JOBS jobs run at once, each on one of
+that many worker threads, so a burst of uploads cannot flood the web
+process with PDF parses. Jobs are queued per user and the users take
+turns: a user who uploads a whole shelf gets one job started, then
+everyone else waiting gets one, and so on. A job's priority only orders
+it among its own user's waiting jobs, so nobody can jump ahead of other
+users by marking their jobs High.
+
+New jobs are refused with QueueFull once TRANSLATION_MAX_QUEUED_JOBS jobs
+are waiting, or TRANSLATION_MAX_QUEUED_JOBS_PER_USER for the same user;
+views check ``admits`` before accepting an upload.
+
+The queue lives in memory, so all of these limits are per process: with
+several server processes, each runs up to TRANSLATION_MAX_CONCURRENT_JOBS
+jobs and only knows the queue positions of its own jobs. Waiting and
+running jobs are lost when the process exits; their documents stay
+pending or in progress, and ``tracks`` is how views tell such documents
+apart from ones this process is still working on.
+"""
+import logging
+import os
+import threading
+import traceback
+from collections import OrderedDict, deque
+from django.conf import settings
+from django.db import close_old_connections
+
+logger = logging.getLogger(__name__)
+
+
+class QueueFull(Exception):
+    pass
+
+
+class JobScheduler:
+    def __init__(self):
+        self.lock = threading.Condition()
+        # user id -> priority -> that user's waiting jobs; the user whose
+        # turn is next comes first
+        self.queues = OrderedDict()
+        # Documents whose jobs the workers are running
+        self.running = set()
+        self.workers = []
+        self.pid = None
+
+    def queued(self, user_id=None):
+        return sum(
+            len(jobs)
+            for queued_for, priorities in self.queues.items()
+            if user_id is None or queued_for == user_id
+            for jobs in priorities.values()
+        )
+
+    def refusal(self, user_id):
+        """Why a new job for ``user_id`` would be refused, or None."""
+        if self.queued(user_id) >= settings.TRANSLATION_MAX_QUEUED_JOBS_PER_USER:
+            return 'You have too many documents waiting to be processed'
+        if self.queued() >= settings.TRANSLATION_MAX_QUEUED_JOBS:
+            return 'Too many documents are waiting to be processed'
+        return None
+
+    def admits(self, user_id):
+        """Whether a new job for ``user_id`` would be accepted right now."""
+        with self.lock:
+            return self.refusal(user_id) is None
+
+    def submit(self, task, user_id, priority=0):
+        """
+        Queue ``task`` (anything with ``run()`` and ``document_id``) for
+        ``user_id``. Raises QueueFull if it cannot be accepted.
+        """
+        with self.lock:
+            reason = self.refusal(user_id)
+            if reason:
+                raise QueueFull(reason)
+            self.start()
+            self.enqueue(task, user_id, priority)
+            self.lock.notify()
+        return task
+
+    def enqueue(self, task, user_id, priority):
+        self.queues.setdefault(user_id, {}).setdefault(priority, deque()).append(task)
+
+    def remove(self, document_id):
+        """Take a document's job out of the queue, returning it and its user, or None."""
+        for user_id, priorities in self.queues.items():
+            for priority, jobs in priorities.items():
+                for task in jobs:
+                    if task.document_id == document_id:
+                        jobs.remove(task)
+                        if not jobs:
+                            del priorities[priority]
+                        if not priorities:
+                            del self.queues[user_id]
+                        return task, user_id
+        return None
+
+    def cancel(self, document_id):
+        """Drop a document's job if it is still waiting. Returns whether it was."""
+        with self.lock:
+            return self.remove(document_id) is not None
+
+    def reprioritize(self, document_id, priority):
+        """
+        Move a document's waiting job to ``priority``, behind that user's
+        other jobs there. The user keeps their place in the rotation.
+        Returns whether the job was waiting.
+        """
+        with self.lock:
+            turns = list(self.queues)
+            removed = self.remove(document_id)
+            if removed:
+                task, user_id = removed
+                self.enqueue(task, user_id, priority)
+                # Put the user back in their turn if this was their only job
+                for later in turns[turns.index(user_id) + 1:]:
+                    self.queues.move_to_end(later)
+            return removed is not None
+
+    def order(self):
+        """Waiting jobs in the order they will start."""
+        queues = [
+            [task for priority in sorted(priorities, reverse=True) for task in priorities[priority]]
+            for priorities in self.queues.values()
+        ]
+        return [
+            jobs[turn]
+            for turn in range(max(map(len, queues), default=0))
+            for jobs in queues
+            if turn < len(jobs)
+        ]
+
+    def position(self, document_id):
+        """1-based place of a document's job in the queue, or None if it is not waiting."""
+        with self.lock:
+            for position, task in enumerate(self.order(), 1):
+                if task.document_id == document_id:
+                    return position
+        return None
+
+    def tracks(self, document_id):
+        """Whether a document's job is waiting or running in this process."""
+        with self.lock:
+            return document_id in self.running or any(
+                task.document_id == document_id
+                for priorities in self.queues.values()
+                for jobs in priorities.values()
+                for task in jobs
+            )
+
+    def start(self):
+        # Called with the lock held. Threads do not survive a fork, so
+        # worker processes start their own
+        if self.pid != os.getpid():
+            self.pid = os.getpid()
+            self.queues = OrderedDict()
+            self.running = set()
+            self.workers = []
+        while len(self.workers) < settings.TRANSLATION_MAX_CONCURRENT_JOBS:
+            worker = threading.Thread(
+                target=self.work, name=f'translation-worker-{len(self.workers)}', daemon=True
+            )
+            self.workers.append(worker)
+            worker.start()
+
+    def next_task(self):
+        with self.lock:
+            while not self.queues:
+                self.lock.wait()
+            user_id, priorities = self.queues.popitem(last=False)
+            priority = max(priorities)
+            task = priorities[priority].popleft()
+            if not priorities[priority]:
+                del priorities[priority]
+            if priorities:
+                # Back of the line until every other waiting user has had a turn
+                self.queues[user_id] = priorities
+            self.running.add(task.document_id)
+            return task
+
+    def work(self):
+        while True:
+            task = self.next_task()
+            close_old_connections()
+            try:
+                task.run()
+            except Exception as e:
+                logger.error(f"Job for document {task.document_id} failed: {str(e)}")
+                logger.error(traceback.format_exc())
+            finally:
+                with self.lock:
+                    self.running.discard(task.document_id)
+                close_old_connections()
+
+
+job_scheduler = JobScheduler()
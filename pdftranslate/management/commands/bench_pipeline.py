@@ -0,0 +1,297 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.test.utils import override_settings
+from PyPDF2 import PageObject, PdfWriter
+from PyPDF2.generic import DecodedStreamObject, DictionaryObject, NameObject
+from pdftranslate.metrics import backend_call
+from pdftranslate.models import PDFDocument
+from pdftranslate.pdf_utils import current_rss_mb
+from pdftranslate.tasks import TranslationTask
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+import glob
+import json
+import logging
+import platform
+import random
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+
+
+SYLLABLES = [
+    'ka', 'lo', 'mi', 'ne', 'ru', 'sa', 'to', 'vi', 'be', 'da',
+    'fo', 'gu', 'ha', 'ji', 'ke', 'la', 'mo', 'nu', 'pi', 're',
+]
+
+
+class FakeTranslationService:
+    """Deterministic, instant translation backend for benchmarks."""
+
+    def __init__(self):
+        self.calls = 0
+
+    def translate_words(self, words, target_language='ru', source_language='en'):
+        with backend_call(type(self).__name__):
+            self.calls += 1
+            return [f'{word}-{target_language}' for word in words]
+
+
+class QueryCounter:
+    """Database execute wrapper counting all queries and the writes among them."""
+
+    WRITE_PREFIXES = ('INSERT', 'UPDATE', 'DELETE', 'REPLACE')
+
+    def __init__(self):
+        self.queries = 0
+        self.writes = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.queries += 1
+        if sql.lstrip().upper().startswith(self.WRITE_PREFIXES):
+            self.writes += 1
+        return execute(sql, params, many, context)
+
+
+class RssSampler:
+    """
+    Sample the process RSS every ``interval`` seconds in a background
+    thread and keep the peak reached during the job and during each
+    pipeline stage (see track()).
+    """
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.active = Counter()
+        self.stage_peaks = {}
+        self.peak = 0
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def sample(self):
+        rss = current_rss_mb()
+        with self.lock:
+            self.peak = max(self.peak, rss)
+            for stage, depth in self.active.items():
+                if depth:
+                    self.stage_peaks[stage] = max(self.stage_peaks.get(stage, 0), rss)
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.sample()
+
+    def __enter__(self):
+        self.sample()
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stopped.set()
+        self.thread.join()
+        self.sample()
+
+    @contextmanager
+    def track(self, stage):
+        """Charge the RSS sampled during the ``with`` block to ``stage``."""
+        with self.lock:
+            self.active[stage] += 1
+        self.sample()
+        try:
+            yield
+        finally:
+            self.sample()
+            with self.lock:
+                self.active[stage] -= 1
+
+
+class Rollback(Exception):
+    pass
+
+
+def write_synthetic_pdf(path, pages, seed=0, lines_per_page=40, words_per_line=10):
+    """
+    Write a text PDF of ``pages`` pages with a Zipf-like word distribution,
+    so the number of unique words keeps growing with the length of the book.
+    """
+    rng = random.Random(seed)
+    vocabulary = [
+        ''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4)))
+        for _ in range(50000)
+    ]
+    weights = [1 / rank for rank in range(1, len(vocabulary) + 1)]
+
+    writer = PdfWriter()
+    font = writer._add_object(DictionaryObject({
+        NameObject('/Type'): NameObject('/Font'),
+        NameObject('/Subtype'): NameObject('/Type1'),
+        NameObject('/BaseFont'): NameObject('/Helvetica'),
+    }))
+    for _ in range(pages):
+        lines = [
+            ' '.join(rng.choices(vocabulary, weights, k=words_per_line))
+            for _ in range(lines_per_page)
+        ]
+        content = DecodedStreamObject()
+        content.set_data(
+            b'BT /F1 11 Tf 72 750 Td 16 TL '
+            + b' '.join(f'({line}) Tj T*'.encode() for line in lines)
+            + b' ET'
+        )
+        page = PageObject.create_blank_page(width=612, height=792)
+        page[NameObject('/Contents')] = writer._add_object(content)
+        page[NameObject('/Resources')] = DictionaryObject({
+            NameObject('/Font'): DictionaryObject({NameObject('/F1'): font}),
+        })
+        writer.add_page(page)
+    with open(path, 'wb') as f:
+        writer.write(f)
+
+
+def current_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmarks the TranslationTask pipeline on the sample PDFs and synthetic '
+        'books with a fake translation backend and prints the results as JSON'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'pdfs',
+            nargs='*',
+            help='PDF files to benchmark (defaults to the sample PDFs in media/pdfs)'
+        )
+        parser.add_argument(
+            '--synthetic-pages',
+            type=int,
+            nargs='*',
+            default=[100, 500],
+            help='Also benchmark generated books with these page counts'
+        )
+        parser.add_argument('--repeat', type=int, default=1)
+        parser.add_argument('--output', help='Write the JSON report to this file')
+
+    def handle(self, *args, **options):
+        from django.conf import settings
+
+        pdfs = options['pdfs'] or sorted(
+            glob.glob(str(Path(settings.MEDIA_ROOT) / 'pdfs' / '**' / '*.pdf'), recursive=True)
+        )
+        work_dir = tempfile.mkdtemp(prefix='bench-pipeline-')
+        app_logger = logging.getLogger('pdftranslate')
+        log_level = app_logger.level
+        try:
+            inputs = []
+            for pdf in pdfs:
+                name = Path(pdf).name
+                target = Path(work_dir) / f'{len(inputs)}-{name}'
+                shutil.copyfile(pdf, target)
+                inputs.append((name, target.name))
+            for pages in options['synthetic_pages'] or []:
+                name = f'synthetic-{pages}p.pdf'
+                self.stderr.write(f'Generating {name}...')
+                write_synthetic_pdf(Path(work_dir) / name, pages)
+                inputs.append((name, name))
+
+            if not inputs:
+                raise CommandError('Nothing to benchmark')
+
+            # Keep the per-batch log lines from dominating the timings
+            app_logger.setLevel(logging.WARNING)
+            results = []
+            with override_settings(MEDIA_ROOT=work_dir):
+                for name, file_name in inputs:
+                    for run in range(options['repeat']):
+                        self.stderr.write(f'Benchmarking {name} (run {run + 1})...')
+                        results.append(self.bench(name, file_name))
+        finally:
+            app_logger.setLevel(log_level)
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+        report = json.dumps({
+            'commit': current_commit(),
+            'python': platform.python_version(),
+            'database': connection.vendor,
+            'results': results,
+        }, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(report + '\n')
+        self.stdout.write(report)
+
+    def bench(self, name, file_name):
+        """Run one job inside a transaction that is rolled back afterwards."""
+        counter = QueryCounter()
+        backend = FakeTranslationService()
+        result = {}
+        try:
+            with transaction.atomic():
+                user, _ = User.objects.get_or_create(username='bench-pipeline')
+                document = PDFDocument.objects.create(user=user, title=name)
+                document.pdf_file.name = file_name
+                document.save()
+
+                task = TranslationTask(document.id, translation_service=backend)
+                sampler = RssSampler()
+                task_stage = task.stage
+
+                @contextmanager
+                def stage(name):
+                    with sampler.track(name), task_stage(name):
+                        yield
+
+                task.stage = stage
+                with connection.execute_wrapper(counter), sampler:
+                    started = time.perf_counter()
+                    task.run()
+                    wall = time.perf_counter() - started
+
+                document.refresh_from_db()
+                if document.translation_status != 'completed':
+                    raise CommandError(
+                        f'{name}: job ended as {document.translation_status} '
+                        f'({document.failure_reason})'
+                    )
+                pages = task.counters['pages']
+                words = task.counters['words']
+                result = {
+                    'name': name,
+                    'pages': pages,
+                    'unique_words': words,
+                    'wall_seconds': round(wall, 4),
+                    'pages_per_second': round(pages / wall, 2),
+                    'unique_words_per_second': round(words / wall, 2),
+                    'backend_calls': backend.calls,
+                    'cache_hits': task.counters['cache_hits'],
+                    'db_queries': counter.queries,
+                    'db_writes': counter.writes,
+                    'rows_written': task.counters['rows_written'],
+                    # Sampled while this job ran, not the process-wide
+                    # high-water mark of earlier inputs
+                    'peak_rss_mb': round(sampler.peak, 1),
+                    'stage_peak_rss_mb': {
+                        stage: round(peak, 1)
+                        for stage, peak in sorted(sampler.stage_peaks.items())
+                    },
+                    'stage_seconds': {
+                        stage: round(seconds, 4)
+                        for stage, seconds in sorted(task.stage_seconds.items())
+                    },
+                }
+                raise Rollback
+        except Rollback:
+            pass
+        return result
@@ -1,20 +1,66 @@
-from django.core.management.base import BaseCommand
-from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from pdftranslate.models import PDFDocument
+from pdftranslate.tasks import iter_word_list, word_list_delimiter
+from pdftranslate.translation_usage import invalidate_translations
 import logging
 
 logger = logging.getLogger(__name__)
 
 class Command(BaseCommand):
-    help = 'Clears all translation caches'
+    help = (
+        'Invalidates cached translations, optionally only for one backend, '
+        'target language or list of words'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--backend', help='Backend class name, e.g. GoogleTranslateService')
+        parser.add_argument('--language', help='Target language code')
+        parser.add_argument(
+            '--word',
+            action='append',
+            dest='words',
+            help='Only invalidate this word (repeatable)'
+        )
+        parser.add_argument(
+            '--word-list',
+            help='Only invalidate the words in this .txt, .csv or .tsv file'
+        )
 
     def handle(self, *args, **options):
+        language = options['language']
+        if language and language not in dict(PDFDocument.LANGUAGE_CHOICES):
+            raise CommandError(f'Unknown language: {language}')
+
+        words = None
+        if options['words'] or options['word_list']:
+            words = {word.strip().lower() for word in options['words'] or []}
+            if options['word_list']:
+                path = options['word_list']
+                try:
+                    with open(path, encoding='utf-8-sig', newline='') as lines:
+                        words.update(
+                            word for word, _ in iter_word_list(lines, word_list_delimiter(path))
+                        )
+                except OSError as e:
+                    raise CommandError(f'Cannot read word list: {str(e)}')
+
+        scope = ', '.join(
+            f'{name} {value}'
+            for name, value in (('backend', options['backend']), ('language', language))
+            if value
+        ) or 'all backends and languages'
         try:
-            # Clear all caches since we're using local memory cache
-            cache.clear()
-            self.stdout.write(
-                self.style.SUCCESS('Successfully cleared all caches')
+            deleted = invalidate_translations(
+                backend=options['backend'],
+                target_language=language,
+                words=sorted(words) if words is not None else None
             )
         except Exception as e:
-            self.stdout.write(
-                self.style.ERROR(f'Error clearing caches: {str(e)}')
-            ) 
\ No newline at end of file
+            raise CommandError(f'Error invalidating translations: {str(e)}')
+
+        if words is None:
+            message = f'Invalidated cached translations for {scope}'
+        else:
+            message = f'Invalidated {len(words)} words ({deleted} cache entries) for {scope}'
+        logger.info(message)
+        self.stdout.write(self.style.SUCCESS(message))
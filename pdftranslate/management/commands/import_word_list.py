@@ -0,0 +1,79 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.contrib.auth.models import User
+from pdftranslate.models import PDFDocument
+from pdftranslate.translation_usage import TrackedTranslator
+from pdftranslate.write_queue import write_queue
+from pdftranslate.tasks import (
+    get_translation_service,
+    import_word_list,
+    word_list_delimiter,
+)
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+class Command(BaseCommand):
+    help = 'Imports a CSV/TSV or plain word list as a new document'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Path to a .csv, .tsv or .txt word list')
+        parser.add_argument('--user', required=True, help='Username of the owner')
+        parser.add_argument('--language', default='ru', help='Target language code')
+        parser.add_argument('--title', help='Document title (defaults to the file name)')
+        parser.add_argument(
+            '--flashcards',
+            action='store_true',
+            help='Create a flashcard for every imported word'
+        )
+        parser.add_argument('--batch-size', type=int, default=100)
+
+    def handle(self, *args, **options):
+        path = options['path']
+        languages = dict(PDFDocument.LANGUAGE_CHOICES)
+        if options['language'] not in languages:
+            raise CommandError(f"Unknown language: {options['language']}")
+        try:
+            user = User.objects.get(username=options['user'])
+        except User.DoesNotExist:
+            raise CommandError(f"User not found: {options['user']}")
+
+        document = PDFDocument.objects.create(
+            user=user,
+            title=options['title'] or os.path.basename(path),
+            source_type='word_list',
+            target_language=options['language'],
+            translation_status='in_progress'
+        )
+        translator = TrackedTranslator(get_translation_service())
+        try:
+            with open(path, encoding='utf-8-sig', newline='') as lines:
+                imported = import_word_list(
+                    document,
+                    lines,
+                    translator,
+                    delimiter=word_list_delimiter(path),
+                    create_flashcards=options['flashcards'],
+                    batch_size=options['batch_size']
+                )
+        except Exception as e:
+            document.translation_status = 'failed'
+            document.failure_reason = 'Word list import failed'
+            document.save()
+            raise CommandError(f'Error importing word list: {str(e)}')
+        finally:
+            translator.save_usage(document.id)
+            write_queue.flush()
+
+        document.translation_status = 'completed' if imported else 'failed'
+        document.translation_progress = 100 if imported else 0
+        document.total_words = imported
+        document.translated_words = imported
+        if not imported:
+            document.failure_reason = 'No words found in the word list'
+        document.save()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Imported {imported} words into "{document.title}" (id {document.id})'
+            )
+        )
@@ -0,0 +1,176 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.contrib.auth.models import User
+from django.conf import settings
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from pdftranslate.models import Flashcard, PDFDocument, WordEntry, attach_lexemes
+from .bench_pipeline import current_commit
+from datetime import timedelta
+import json
+import random
+import time
+
+INSERT_BATCH_SIZE = 5000
+# Rows per synthetic book, so bigger accounts also have more documents
+WORDS_PER_DOCUMENT = 2000
+
+
+class Rollback(Exception):
+    pass
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def create_synthetic_account(username, rows, seed=0):
+    """
+    Create a user owning ``rows`` WordEntry rows, each with a flashcard,
+    spread over books of WORDS_PER_DOCUMENT words. Review state is
+    randomised so that due, reviewed-today and mastered cards all exist.
+    """
+    rng = random.Random(seed)
+    now = timezone.now()
+    user = User.objects.create_user(username)
+    document_count = max(1, -(-rows // WORDS_PER_DOCUMENT))
+    documents = PDFDocument.objects.bulk_create([
+        PDFDocument(
+            user=user,
+            title=f'Synthetic book {number + 1}',
+            translation_status='completed',
+            translation_progress=100,
+        )
+        for number in range(document_count)
+    ])
+
+    for start in range(0, rows, INSERT_BATCH_SIZE):
+        entries = [
+            WordEntry(
+                document=documents[index // WORDS_PER_DOCUMENT],
+                original_text=f'word{index}',
+                target_language=documents[index // WORDS_PER_DOCUMENT].target_language,
+                translated_text=f'translation{index}',
+                page_number=index % WORDS_PER_DOCUMENT // 300 + 1,
+                position=index % 300,
+            )
+            for index in range(start, min(rows, start + INSERT_BATCH_SIZE))
+        ]
+        attach_lexemes(entries)
+        WordEntry.objects.bulk_create(entries)
+        cards = []
+        for entry in entries:
+            reviews = rng.choice([0, 0, 1, 2, 3, 5, 8])
+            reviewed = now - timedelta(days=rng.randint(0, 10)) if reviews else None
+            cards.append(Flashcard(
+                word_entry=entry,
+                user=user,
+                review_count=reviews,
+                last_reviewed=reviewed,
+                next_review=now + timedelta(hours=rng.randint(-72, 240)),
+            ))
+        Flashcard.objects.bulk_create(cards)
+
+    for document in documents:
+        document.total_words = document.translated_words = document.words.count()
+    PDFDocument.objects.bulk_update(documents, ['total_words', 'translated_words'])
+    return user, documents
+
+
+class Command(BaseCommand):
+    help = (
+        'Generates synthetic accounts of several sizes and reports p50/p99 '
+        'latency and query counts of the main views as JSON'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes',
+            type=int,
+            nargs='+',
+            default=[100, 10000, 100000],
+            help='Number of WordEntry and Flashcard rows per synthetic account'
+        )
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=20,
+            help='Timed requests per view and size, after one warm-up request'
+        )
+        parser.add_argument('--output', help='Write the JSON report to this file')
+
+    def handle(self, *args, **options):
+        if options['requests'] < 1:
+            raise CommandError('--requests must be at least 1')
+
+        results = []
+        with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+            for size in options['sizes']:
+                self.stderr.write(f'Generating an account with {size} rows...')
+                results.extend(self.run_size(size, options['requests']))
+
+        report = json.dumps({
+            'commit': current_commit(),
+            'database': connection.vendor,
+            'results': results,
+        }, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(report + '\n')
+        self.stdout.write(report)
+
+    def run_size(self, size, requests):
+        """Measure every view against one account, then roll the account back."""
+        results = []
+        try:
+            with transaction.atomic():
+                user, documents = create_synthetic_account(f'loadtest-{size}', size)
+                client = Client()
+                client.force_login(user)
+                views = [
+                    ('pdf_list', reverse('pdf_list')),
+                    ('flashcard_list', reverse('flashcard_list')),
+                    ('flashcard_dashboard', reverse('flashcard_dashboard')),
+                    ('flashcard_review', reverse('flashcard_review_base')),
+                    (
+                        'translated_words_list',
+                        reverse('translated_words_list', args=[documents[0].id])
+                    ),
+                ]
+                for name, url in views:
+                    self.stderr.write(f'  {name}')
+                    results.append(self.measure(client, name, url, size, requests))
+                raise Rollback
+        except Rollback:
+            pass
+        return results
+
+    def measure(self, client, name, url, size, requests):
+        client.get(url)
+        timings = []
+        queries = []
+        status_codes = set()
+        for _ in range(requests):
+            with CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                response = client.get(url)
+                # Streaming responses do their work while being consumed
+                if response.streaming:
+                    b''.join(response.streaming_content)
+                timings.append(time.perf_counter() - started)
+            queries.append(len(captured.captured_queries))
+            status_codes.add(response.status_code)
+        return {
+            'view': name,
+            'rows': size,
+            'requests': requests,
+            'status_codes': sorted(status_codes),
+            'p50_ms': round(percentile(timings, 0.5) * 1000, 2),
+            'p99_ms': round(percentile(timings, 0.99) * 1000, 2),
+            'max_ms': round(max(timings) * 1000, 2),
+            'queries': max(queries),
+        }
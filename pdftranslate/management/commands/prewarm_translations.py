@@ -0,0 +1,173 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.conf import settings
+from django.core.cache import caches
+from pdftranslate.models import PDFDocument
+from pdftranslate.tasks import get_translation_service, iter_word_list, word_list_delimiter
+from pdftranslate.translation_usage import TrackedTranslator, namespace_version
+from pdftranslate.write_queue import write_queue
+import hashlib
+import logging
+import re
+
+logger = logging.getLogger(__name__)
+
+WORD_RE = re.compile(r'[a-z]+')
+
+
+def iter_frequency_list(lines):
+    """
+    Yield the words of a frequency list, most frequent first.
+
+    Accepts one word per line, optionally followed by a count separated by
+    whitespace, a comma or a tab. Only words the PDF tokenizer can produce
+    are kept.
+    """
+    seen = set()
+    for line in lines:
+        fields = re.split(r'[\s,;]+', line.strip(), maxsplit=1)
+        word = fields[0].lower()
+        if WORD_RE.fullmatch(word) and word not in seen:
+            seen.add(word)
+            yield word
+
+
+def parse_bilingual(value):
+    language, separator, path = value.partition('=')
+    if not separator or not path:
+        raise CommandError(f'--bilingual expects LANGUAGE=PATH, got "{value}"')
+    return language, path
+
+
+def checkpoint_key(backend, language, words):
+    """Progress key, reset whenever the list or the cache namespace changes."""
+    fingerprint = hashlib.sha1('\n'.join(words).encode()).hexdigest()[:16]
+    version = namespace_version(backend, language)
+    return f'prewarm:{version}:{backend}:{language}:{fingerprint}'
+
+
+class Command(BaseCommand):
+    help = (
+        'Loads translations of the most frequent words into the translation '
+        'cache for every target language. Safe to re-run and resumes where '
+        'an interrupted run stopped'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('frequency_list', help='Word frequency list, most frequent first')
+        parser.add_argument('--top', type=int, default=5000, help='Number of words to load')
+        parser.add_argument(
+            '--language',
+            action='append',
+            dest='languages',
+            help='Target language to warm (repeatable, defaults to all supported languages)'
+        )
+        parser.add_argument(
+            '--bilingual',
+            action='append',
+            default=[],
+            metavar='LANGUAGE=PATH',
+            help='CSV/TSV file of word,translation pairs to use before asking the backend'
+        )
+        parser.add_argument(
+            '--offline',
+            action='store_true',
+            help='Only load translations from --bilingual files, never call the backend'
+        )
+        parser.add_argument(
+            '--backend',
+            help='Backend whose cache to warm in --offline mode (defaults to the configured one)'
+        )
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument(
+            '--restart',
+            action='store_true',
+            help='Ignore saved progress and check every word again'
+        )
+
+    def handle(self, *args, **options):
+        supported = dict(PDFDocument.LANGUAGE_CHOICES)
+        languages = options['languages'] or list(supported)
+        unknown = [language for language in languages if language not in supported]
+        if unknown:
+            raise CommandError(f"Unknown language: {', '.join(unknown)}")
+        if options['top'] < 1 or options['batch_size'] < 1:
+            raise CommandError('--top and --batch-size must be at least 1')
+
+        try:
+            with open(options['frequency_list'], encoding='utf-8-sig') as lines:
+                words = []
+                for word in iter_frequency_list(lines):
+                    words.append(word)
+                    if len(words) >= options['top']:
+                        break
+        except OSError as e:
+            raise CommandError(f'Cannot read frequency list: {str(e)}')
+        if not words:
+            raise CommandError('No words found in the frequency list')
+        wanted = set(words)
+
+        known = {}
+        for value in options['bilingual']:
+            language, path = parse_bilingual(value)
+            try:
+                with open(path, encoding='utf-8-sig', newline='') as lines:
+                    pairs = known.setdefault(language, {})
+                    for word, translation in iter_word_list(lines, word_list_delimiter(path)):
+                        if translation and word in wanted:
+                            pairs.setdefault(word, translation)
+            except OSError as e:
+                raise CommandError(f'Cannot read bilingual file: {str(e)}')
+
+        if options['offline']:
+            translator = TrackedTranslator(
+                None,
+                backend=options['backend'] or settings.TRANSLATION_BACKEND.rsplit('.', 1)[-1]
+            )
+        else:
+            try:
+                translator = TrackedTranslator(get_translation_service())
+            except Exception as e:
+                raise CommandError(f'Translation service is unavailable: {str(e)}')
+            if options['backend'] and options['backend'] != translator.backend:
+                raise CommandError(
+                    f"--backend {options['backend']} does not match the configured "
+                    f"backend {translator.backend}"
+                )
+
+        try:
+            for language in languages:
+                self.warm_language(translator, language, words, known.get(language, {}), options)
+        finally:
+            translator.save_usage()
+            write_queue.flush()
+
+    def warm_language(self, translator, language, words, known, options):
+        cache = caches['translations']
+        key = checkpoint_key(translator.backend, language, words)
+        start = 0 if options['restart'] else cache.get(key, 0)
+        if start >= len(words):
+            self.stdout.write(f'{language}: already warm ({len(words)} words)')
+            return
+
+        totals = [0, 0, 0]
+        batch_size = options['batch_size']
+        for i in range(start, len(words), batch_size):
+            counts = translator.warm(
+                words[i:i + batch_size], language, known=known, offline=options['offline']
+            )
+            totals = [total + count for total, count in zip(totals, counts)]
+            # Record progress after every batch so a rerun continues here
+            cache.set(key, min(i + batch_size, len(words)), timeout=None)
+            logger.info(f"Warmed {min(i + batch_size, len(words))}/{len(words)} words for {language}")
+
+        cached, provided, translated = totals
+        skipped = len(words) - start - sum(totals)
+        message = (
+            f'{language}: {translated} translated, {provided} from bilingual file, '
+            f'{cached} already cached'
+        )
+        if start:
+            message += f', resumed at word {start + 1}'
+        if skipped:
+            message += f', {skipped} left untranslated'
+        self.stdout.write(self.style.SUCCESS(message))
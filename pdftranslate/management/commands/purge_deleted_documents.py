@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+from pdftranslate.models import PDFDocument
+from pdftranslate.tasks import purge_document
+
+
+class Command(BaseCommand):
+    help = (
+        'Purges documents that were deleted but whose rows are still in the '
+        'database, for example because the server stopped during the purge'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            help='Rows per DELETE (defaults to PURGE_CHUNK_SIZE)'
+        )
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] is not None and options['chunk_size'] < 1:
+            raise CommandError('--chunk-size must be at least 1')
+
+        document_ids = list(
+            PDFDocument.all_objects.filter(deleted_at__isnull=False)
+            .order_by('deleted_at')
+            .values_list('id', flat=True)
+        )
+        for document_id in document_ids:
+            purge_document(document_id, chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(f'Purged {len(document_ids)} deleted documents'))
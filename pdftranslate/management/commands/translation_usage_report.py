@@ -0,0 +1,85 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.conf import settings
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from pdftranslate.models import TranslationUsage
+from datetime import timedelta
+import json
+
+COUNTED_FIELDS = ['backend_calls', 'words_requested', 'characters', 'cache_hits', 'retries']
+
+
+def summarize(rows):
+    """Add the estimated cost and cache hit rate to aggregated usage rows."""
+    prices = settings.TRANSLATION_COST_PER_MILLION_CHARACTERS
+    for row in rows:
+        price = prices.get(row['backend'], 0)
+        row['cost'] = round(row['characters'] * price / 1_000_000, 4)
+        row['cache_hit_rate'] = round(
+            row['cache_hits'] / row['words_requested'], 3
+        ) if row['words_requested'] else 0
+        if 'day' in row:
+            row['day'] = row['day'].isoformat()
+    return rows
+
+
+class Command(BaseCommand):
+    help = 'Reports translation spend and cache effectiveness per day and target language'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=30, help='How many days back to report')
+        parser.add_argument('--language', help='Only report this target language')
+        parser.add_argument('--json', action='store_true', help='Print the report as JSON')
+
+    def handle(self, *args, **options):
+        if options['days'] < 1:
+            raise CommandError('--days must be at least 1')
+
+        usage = TranslationUsage.objects.filter(
+            created_at__gte=timezone.now() - timedelta(days=options['days'])
+        )
+        if options['language']:
+            usage = usage.filter(target_language=options['language'])
+        totals = {field: Sum(field) for field in COUNTED_FIELDS}
+
+        by_day = summarize(list(
+            usage.annotate(day=TruncDate('created_at'))
+            .values('day', 'target_language', 'backend')
+            .annotate(jobs=Count('id'), **totals)
+            .order_by('day', 'target_language', 'backend')
+        ))
+        by_language = summarize(list(
+            usage.values('target_language', 'backend')
+            .annotate(jobs=Count('id'), **totals)
+            .order_by('target_language', 'backend')
+        ))
+
+        if options['json']:
+            self.stdout.write(json.dumps(
+                {'by_day': by_day, 'by_language': by_language}, indent=2
+            ))
+            return
+
+        if not by_day:
+            self.stdout.write('No translation usage recorded in this period')
+            return
+        self.write_table('Per day', ['day', 'target_language', 'backend'], by_day)
+        self.write_table('Per target language', ['target_language', 'backend'], by_language)
+        self.stdout.write(
+            f"Total estimated spend: {sum(row['cost'] for row in by_language):.2f}"
+        )
+
+    def write_table(self, title, keys, rows):
+        columns = keys + ['jobs'] + COUNTED_FIELDS + ['cache_hit_rate', 'cost']
+        widths = {
+            column: max(len(column), *(len(str(row[column])) for row in rows))
+            for column in columns
+        }
+        self.stdout.write(self.style.MIGRATE_HEADING(title))
+        self.stdout.write('  '.join(column.ljust(widths[column]) for column in columns))
+        for row in rows:
+            self.stdout.write(
+                '  '.join(str(row[column]).ljust(widths[column]) for column in columns)
+            )
+        self.stdout.write('')
@@ -0,0 +1,127 @@
+"""
+Prometheus metrics for background translation jobs.
+
+When the PROMETHEUS_MULTIPROC_DIR environment variable points to a
+writable directory (it must be set before the server starts), every
+process writes its samples there and the metrics endpoint aggregates
+them, so gunicorn/daphne workers report as one. Without it, each process
+only exposes its own metrics.
+"""
+import contextvars
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+logger = logging.getLogger(__name__)
+
+STAGE_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800)
+BACKEND_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 20, 60)
+
+JOB_STAGE_SECONDS = Histogram(
+    'bookland_job_stage_seconds',
+    'Time a translation job spent in each pipeline stage',
+    ['job', 'stage'],
+    buckets=STAGE_BUCKETS,
+)
+JOBS = Counter(
+    'bookland_jobs',
+    'Finished translation jobs by outcome',
+    ['job', 'status'],
+)
+JOB_ITEMS = Counter(
+    'bookland_job_items',
+    'Pages, words, backend calls and rows processed by translation jobs',
+    ['job', 'item'],
+)
+BACKEND_LATENCY = Histogram(
+    'bookland_backend_request_seconds',
+    'Latency of translation and transcription backend calls',
+    ['backend'],
+    buckets=BACKEND_BUCKETS,
+)
+BACKEND_RETRIES = Counter(
+    'bookland_backend_retries',
+    'Backend calls retried after an error',
+    ['backend'],
+)
+
+
+# Counters of the job whose backend requests are being made, if any.
+# Threads only see them when started with contextvars.copy_context()
+_usage_counters = contextvars.ContextVar('usage_counters', default=None)
+_usage_counters_lock = threading.Lock()
+
+
+@contextmanager
+def count_backend_usage(counters):
+    """
+    Add the backend requests and retries made inside the block to
+    ``counters['backend_calls']`` and ``counters['retries']``.
+    """
+    token = _usage_counters.set(counters)
+    try:
+        yield
+    finally:
+        _usage_counters.reset(token)
+
+
+def count_usage(name):
+    counters = _usage_counters.get()
+    if counters is not None:
+        with _usage_counters_lock:
+            counters[name] += 1
+
+
+@contextmanager
+def backend_call(backend):
+    """Time and count a backend request, recording it even when it raises."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        BACKEND_LATENCY.labels(backend).observe(time.perf_counter() - started)
+        count_usage('backend_calls')
+
+
+def note_retry(backend, attempt, error):
+    """Count a retry of ``backend`` in the metrics and the current job's counters."""
+    BACKEND_RETRIES.labels(backend).inc()
+    count_usage('retries')
+    logger.warning(f"Retrying {backend} after attempt {attempt}: {error}")
+
+
+def record_retry(retry_state):
+    """tenacity ``before_sleep`` hook counting retries per backend class."""
+    backend = retry_state.fn.__qualname__.split('.')[0] if retry_state.fn else 'unknown'
+    note_retry(backend, retry_state.attempt_number, retry_state.outcome.exception())
+
+
+def record_job(job, status, stage_seconds, counters):
+    """Publish a finished job's stage timings and counters."""
+    JOBS.labels(job, status).inc()
+    for stage, seconds in stage_seconds.items():
+        JOB_STAGE_SECONDS.labels(job, stage).observe(seconds)
+    for item, count in counters.items():
+        if count:
+            JOB_ITEMS.labels(job, item).inc(count)
+
+
+def render_latest():
+    """Return the Prometheus text exposition of all processes' metrics."""
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
@@ -0,0 +1,57 @@
+# Generated by Django 5.1.6 on 2026-10-19 14:00
+
+from django.db import migrations, models
+from django.db.models import Count, F, Min
+
+
+def remove_duplicate_words(apps, schema_editor):
+    """Keep one entry per (document, word) so the unique constraint applies.
+
+    The oldest entry is kept. An entry holds a single flashcard, so the
+    most reviewed flashcard of the duplicates is moved onto it before the
+    others are deleted, instead of going with its entry.
+    """
+    WordEntry = apps.get_model('pdftranslate', 'WordEntry')
+    Flashcard = apps.get_model('pdftranslate', 'Flashcard')
+    duplicates = (
+        WordEntry.objects
+        .values('document_id', 'original_text')
+        .annotate(entries=Count('id'), first_id=Min('id'))
+        .filter(entries__gt=1)
+    )
+    for group in duplicates.iterator():
+        entries = WordEntry.objects.filter(
+            document_id=group['document_id'],
+            original_text=group['original_text']
+        )
+        keep_id = group['first_id']
+        card = (
+            Flashcard.objects
+            .filter(word_entry__in=entries)
+            .order_by('-review_count', F('last_reviewed').desc(nulls_last=True), 'id')
+            .first()
+        )
+        if card and card.word_entry_id != keep_id:
+            Flashcard.objects.filter(word_entry_id=keep_id).delete()
+            card.word_entry_id = keep_id
+            card.save(update_fields=['word_entry'])
+        entries.exclude(id=keep_id).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pdftranslate', '0007_pdfdocument_target_language'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_words, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='wordentry',
+            index=models.Index(fields=['document', 'page_number', 'position'], name='pdftranslat_documen_e76b33_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='wordentry',
+            constraint=models.UniqueConstraint(fields=('document', 'original_text'), name='unique_word_per_document'),
+        ),
+    ]
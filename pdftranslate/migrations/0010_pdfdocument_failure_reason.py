@@ -0,0 +1,18 @@
+# Generated by Django 5.1.6 on 2026-10-19 14:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pdftranslate', '0009_pdfdocument_content_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pdfdocument',
+            name='failure_reason',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+    ]
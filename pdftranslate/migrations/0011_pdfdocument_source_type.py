@@ -0,0 +1,18 @@
+# Generated by Django 5.1.6 on 2026-10-19 14:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pdftranslate', '0010_pdfdocument_failure_reason'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pdfdocument',
+            name='source_type',
+            field=models.CharField(choices=[('pdf', 'PDF'), ('word_list', 'Word list')], default='pdf', max_length=20),
+        ),
+    ]
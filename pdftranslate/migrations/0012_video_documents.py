@@ -0,0 +1,23 @@
+# Generated by Django 5.1.6 on 2026-10-19 14:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pdftranslate', '0011_pdfdocument_source_type'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='wordentry',
+            name='timestamp',
+            field=models.FloatField(blank=True, help_text='Seconds into the video where the word is first heard', null=True),
+        ),
+        migrations.AlterField(
+            model_name='pdfdocument',
+            name='source_type',
+            field=models.CharField(choices=[('pdf', 'PDF'), ('word_list', 'Word list'), ('video', 'Video')], default='pdf', max_length=20),
+        ),
+    ]
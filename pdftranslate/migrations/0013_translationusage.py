@@ -0,0 +1,36 @@
+# Generated by Django 5.1.6 on 2026-10-19 14:18
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pdftranslate', '0012_video_documents'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TranslationUsage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('backend', models.CharField(max_length=100)),
+                ('source_language', models.CharField(default='en', max_length=5)),
+                ('target_language', models.CharField(max_length=5)),
+                ('backend_calls', models.IntegerField(default=0)),
+                ('words_requested', models.IntegerField(default=0, help_text='Words looked up, whether served from the cache or the backend')),
+                ('characters', models.IntegerField(default=0, help_text='Characters sent to the backend (what we are billed for)')),
+                ('cache_hits', models.IntegerField(default=0)),
+                ('retries', models.IntegerField(default=0)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('document', models.ForeignKey(blank=True, help_text='Kept as NULL after the document is deleted so spend is not lost', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='translation_usage', to='pdftranslate.pdfdocument')),
+            ],
+            options={
+                'verbose_name_plural': 'Translation usage',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['created_at', 'target_language'], name='pdftranslat_created_f42299_idx')],
+            },
+        ),
+    ]
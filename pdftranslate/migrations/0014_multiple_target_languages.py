@@ -0,0 +1,54 @@
+# Generated by Django 5.1.6 on 2026-10-19 14:26
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def copy_document_language(apps, schema_editor):
+    """Existing entries were translated into their document's target language."""
+    PDFDocument = apps.get_model('pdftranslate', 'PDFDocument')
+    WordEntry = apps.get_model('pdftranslate', 'WordEntry')
+    WordEntry.objects.update(
+        target_language=Subquery(
+            PDFDocument.objects
+            .filter(pk=OuterRef('document_id'))
+            .values('target_language')[:1]
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pdftranslate', '0013_translationusage'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='wordentry',
+            name='unique_word_per_document',
+        ),
+        migrations.RemoveIndex(
+            model_name='wordentry',
+            name='pdftranslat_documen_e76b33_idx',
+        ),
+        migrations.AddField(
+            model_name='pdfdocument',
+            name='extra_languages',
+            field=models.JSONField(blank=True, default=list, help_text='Further target languages the document is translated into'),
+        ),
+        migrations.AddField(
+            model_name='wordentry',
+            name='target_language',
+            field=models.CharField(blank=True, max_length=5),
+        ),
+        migrations.RunPython(copy_document_language, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='wordentry',
+            index=models.Index(fields=['document', 'target_language', 'page_number', 'position'], name='pdftranslat_documen_8c3cf5_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='wordentry',
+            constraint=models.UniqueConstraint(fields=('document', 'target_language', 'original_text'), name='unique_word_per_document_language'),
+        ),
+    ]
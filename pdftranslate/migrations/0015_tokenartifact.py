@@ -0,0 +1,29 @@
+# Generated by Django 5.1.6 on 2026-10-19 14:30
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pdftranslate', '0014_multiple_target_languages'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TokenArtifact',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('content_hash', models.CharField(max_length=64)),
+                ('extractor_version', models.IntegerField()),
+                ('page_count', models.IntegerField()),
+                ('word_count', models.IntegerField()),
+                ('tokens', models.BinaryField(help_text='zlib-compressed JSON list of [word, page, position, count]')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('content_hash', 'extractor_version'), name='unique_token_artifact')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.6 on 2026-10-19 14:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pdftranslate', '0015_tokenartifact'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pdfdocument',
+            name='deleted_at',
+            field=models.DateTimeField(blank=True, db_index=True, help_text='Set when the document is deleted; its rows are purged in the background', null=True),
+        ),
+    ]
@@ -0,0 +1,115 @@
+# Generated by Django 5.1.6 on 2026-10-19 14:52
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Max, OuterRef, Subquery
+
+BATCH_SIZE = 2000
+
+
+def create_lexemes(apps, schema_editor):
+    """
+    Create one lexeme per word and target language and point the existing
+    entries at it. Where documents disagreed on a translation one of them
+    is kept.
+    """
+    Lexeme = apps.get_model('pdftranslate', 'Lexeme')
+    WordEntry = apps.get_model('pdftranslate', 'WordEntry')
+    words = (
+        WordEntry.objects
+        .values('original_text', 'target_language')
+        .annotate(translation=Max('translated_text'))
+        .order_by()
+    )
+    batch = []
+    for row in words.iterator(chunk_size=BATCH_SIZE):
+        batch.append(Lexeme(
+            word=row['original_text'],
+            source_language='en',
+            target_language=row['target_language'],
+            translation=row['translation'],
+        ))
+        if len(batch) >= BATCH_SIZE:
+            Lexeme.objects.bulk_create(batch)
+            batch = []
+    Lexeme.objects.bulk_create(batch)
+    WordEntry.objects.update(
+        lexeme=Subquery(
+            Lexeme.objects.filter(
+                word=OuterRef('original_text'),
+                source_language='en',
+                target_language=OuterRef('target_language'),
+            ).values('pk')[:1]
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pdftranslate', '0016_pdfdocument_deleted_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Lexeme',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('word', models.CharField(max_length=255)),
+                ('source_language', models.CharField(default='en', max_length=5)),
+                ('target_language', models.CharField(max_length=5)),
+                ('translation', models.CharField(blank=True, max_length=255, null=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('word', 'source_language', 'target_language'), name='unique_lexeme')],
+            },
+        ),
+        migrations.AddField(
+            model_name='wordentry',
+            name='lexeme',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, related_name='occurrences', to='pdftranslate.lexeme'),
+        ),
+        migrations.AddField(
+            model_name='wordentry',
+            name='count',
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.RunPython(create_lexemes, migrations.RunPython.noop),
+        migrations.RemoveConstraint(
+            model_name='wordentry',
+            name='unique_word_per_document_language',
+        ),
+        migrations.RemoveIndex(
+            model_name='wordentry',
+            name='pdftranslat_documen_8c3cf5_idx',
+        ),
+        migrations.RemoveField(
+            model_name='wordentry',
+            name='created_at',
+        ),
+        migrations.RemoveField(
+            model_name='wordentry',
+            name='original_text',
+        ),
+        migrations.RemoveField(
+            model_name='wordentry',
+            name='target_language',
+        ),
+        migrations.RemoveField(
+            model_name='wordentry',
+            name='translated_text',
+        ),
+        migrations.AlterField(
+            model_name='wordentry',
+            name='lexeme',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='occurrences', to='pdftranslate.lexeme'),
+        ),
+        migrations.AddIndex(
+            model_name='wordentry',
+            index=models.Index(fields=['document', 'page_number', 'position'], name='pdftranslat_documen_e76b33_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='wordentry',
+            constraint=models.UniqueConstraint(fields=('document', 'lexeme'), name='unique_lexeme_per_document'),
+        ),
+    ]
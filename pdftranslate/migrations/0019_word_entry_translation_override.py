@@ -0,0 +1,18 @@
+# Generated by Django 5.1.6 on 2026-10-19 15:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pdftranslate', '0018_job_priority'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='wordentry',
+            name='translation_override',
+            field=models.CharField(blank=True, help_text="The user's own translation from a word list; only this document shows it", max_length=255, null=True),
+        ),
+    ]
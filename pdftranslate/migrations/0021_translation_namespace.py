@@ -0,0 +1,46 @@
+# Generated by Django 5.1.6 on 2026-10-19 15:21
+
+from django.core.cache import caches
+from django.db import migrations, models
+
+
+def copy_cached_counters(apps, schema_editor):
+    """Keep the namespace versions bumped so far, which lived in the translations cache."""
+    TranslationNamespace = apps.get_model('pdftranslate', 'TranslationNamespace')
+    cache = caches['translations']
+    connection = schema_editor.connection
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT %s FROM %s WHERE %s LIKE %%s' % (
+                connection.ops.quote_name('cache_key'),
+                connection.ops.quote_name(cache._table),
+                connection.ops.quote_name('cache_key'),
+            ),
+            [cache.make_key('translation-ns') + '%'],
+        )
+        stored = [row[0] for row in cursor.fetchall()]
+    prefix = cache.make_key('')
+    for cache_key in stored:
+        key = cache_key[len(prefix):]
+        version = cache.get(key)
+        if isinstance(version, int):
+            TranslationNamespace.objects.update_or_create(key=key, defaults={'version': version})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pdftranslate', '0020_translation_cache_table'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TranslationNamespace',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=200, unique=True)),
+                ('version', models.PositiveIntegerField(default=1)),
+            ],
+        ),
+        migrations.RunPython(copy_cached_counters, migrations.RunPython.noop),
+    ]
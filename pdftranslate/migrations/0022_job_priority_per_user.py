@@ -0,0 +1,18 @@
+# Generated by Django 5.1.6 on 2026-10-19 15:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pdftranslate', '0021_translation_namespace'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='pdfdocument',
+            name='priority',
+            field=models.SmallIntegerField(choices=[(-1, 'Low'), (0, 'Normal'), (1, 'High')], default=0, help_text="Among the user's own waiting jobs, those with a higher priority start first"),
+        ),
+    ]
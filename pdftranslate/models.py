@@ -1,16 +1,48 @@
+from django.conf import settings
 from django.db import models
+from django.db.models.functions import Coalesce
 from django.utils import timezone
 from django.contrib.auth.models import User
 from datetime import timedelta
+import json
 import math
-from django.db.models import Count
 import re
-from django.core.validators import FileExtensionValidator
-from django.urls import reverse
-import os
+import zlib
+from functools import lru_cache
+
+
+class ActiveDocumentManager(models.Manager):
+    """Documents that have not been deleted."""
+
+    def get_queryset(self):
+        return super().get_queryset().filter(deleted_at__isnull=True)
+
+
+class ActiveWordEntryManager(models.Manager):
+    """Word entries of documents that have not been deleted, with their lexeme."""
+
+    def get_queryset(self):
+        return (
+            super().get_queryset()
+            .filter(document__deleted_at__isnull=True)
+            .select_related('lexeme')
+        )
+
+
+class ActiveFlashcardManager(models.Manager):
+    """Flashcards of documents that have not been deleted."""
+
+    def get_queryset(self):
+        return super().get_queryset().filter(word_entry__document__deleted_at__isnull=True)
 
 
 class PDFDocument(models.Model):
+    SOURCE_CHOICES = [
+        ('pdf', 'PDF'),
+        ('word_list', 'Word list'),
+        ('video', 'Video'),
+    ]
+
     LANGUAGE_CHOICES = [
         ('ru', 'Russian'),
         ('es', 'Spanish'),
@@ -28,6 +60,12 @@ class PDFDocument(models.Model):
         ('ko', 'Korean'),
     ]
 
+    PRIORITY_CHOICES = [
+        (-1, 'Low'),
+        (0, 'Normal'),
+        (1, 'High'),
+    ]
+
     user = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -37,6 +75,12 @@ class PDFDocument(models.Model):
     )
     title = models.CharField(max_length=255)
     pdf_file = models.FileField(upload_to='pdfs/')
+    source_type = models.CharField(
+        max_length=20,
+        choices=SOURCE_CHOICES,
+        default='pdf'
+    )
+    content_hash = models.CharField(max_length=64, blank=True, db_index=True)
     uploaded_at = models.DateTimeField(default=timezone.now)
     extracted_text = models.TextField(blank=True, null=True)
     target_language = models.CharField(
@@ -44,30 +88,84 @@ class PDFDocument(models.Model):
         choices=LANGUAGE_CHOICES,
         default='ru'
     )
+    extra_languages = models.JSONField(
+        default=list,
+        blank=True,
+        help_text='Further target languages the document is translated into'
+    )
     translation_status = models.CharField(
         max_length=20,
         choices=[
             ('pending', 'Pending'),
             ('in_progress', 'In Progress'),
             ('completed', 'Completed'),
-            ('failed', 'Failed')
+            ('failed', 'Failed'),
+            ('cancelled', 'Cancelled')
         ],
         default='pending'
     )
+    priority = models.SmallIntegerField(
+        choices=PRIORITY_CHOICES,
+        default=0,
+        help_text="Among the user's own waiting jobs, those with a higher priority start first"
+    )
     translation_progress = models.IntegerField(default=0)
+    failure_reason = models.CharField(max_length=255, blank=True)
     total_words = models.IntegerField(default=0)
     translated_words = models.IntegerField(default=0)
+    deleted_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        db_index=True,
+        help_text='Set when the document is deleted; its rows are purged in the background'
+    )
+
+    objects = ActiveDocumentManager()
+    all_objects = models.Manager()
 
     def __str__(self):
         return f"{self.user.username if self.user else 'No User'} - {self.title}"
 
+    def save(self, *args, **kwargs):
+        # deleted_at is only written by soft_delete(), so a job still
+        # holding the document cannot bring it back by saving it
+        if not self._state.adding and not args and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != 'deleted_at'
+            ]
+        super().save(*args, **kwargs)
+
+    def soft_delete(self):
+        """Hide the document and everything in it; purge_document() removes the rows."""
+        self.deleted_at = timezone.now()
+        PDFDocument.all_objects.filter(pk=self.pk).update(deleted_at=self.deleted_at)
+
     class Meta:
         ordering = ['-uploaded_at']
 
-    def create_all_flashcards(self, user):
+    @property
+    def languages(self):
+        """All target languages, the primary target_language first."""
+        return [self.target_language] + [
+            language for language in self.extra_languages
+            if language != self.target_language
+        ]
+
+    def get_languages_display(self):
+        names = dict(self.LANGUAGE_CHOICES)
+        return ', '.join(names.get(language, language) for language in self.languages)
+
+    def words_in(self, language=None):
+        """Word entries translated into ``language`` (the primary one by default)."""
+        return self.words.filter(lexeme__target_language=language or self.target_language)
+
+    def create_all_flashcards(self, user, language=None):
+        """Create flashcards for every translated word the user does not know yet."""
+        known = known_words(user, language or self.target_language)
         created_count = 0
-        for word in self.words.all():
-            if word.translated_text and not word.has_flashcard:
+        for word in self.words_in(language):
+            if word.translated_text and not word.has_flashcard and word.original_text not in known:
                 word.create_flashcard(user)
                 created_count += 1
         return created_count
@@ -78,8 +176,8 @@ class PDFDocument(models.Model):
 
     @property
     def available_words(self):
-        return self.words.filter(
-            translated_text__isnull=False,
+        return self.words_in().alias(translation=translation_of()).filter(
+            translation__isnull=False,
             flashcard__isnull=True
         )
 
@@ -95,32 +193,24 @@ class PDFDocument(models.Model):
         Returns:
             QuerySet of WordEntry objects sorted by priority
         """
-        # Get word frequency
-        word_frequency = (
-            self.words
-            .values('original_text')
-            .annotate(frequency=Count('original_text'))
-            .filter(frequency__gte=min_frequency)
-        )
-        
-        # Filter words by length and content
+        # Filter words by frequency, length and content
         priority_words = (
-            self.words
+            self.words_in()
+            .alias(translation=translation_of())
             .filter(
-                original_text__in=[w['original_text'] for w in word_frequency],
-                translated_text__isnull=False,  # Must have translation
+                count__gte=min_frequency,
+                translation__isnull=False,  # Must have translation
                 flashcard__isnull=True,  # No flashcard yet
             )
             .exclude(
                 # Exclude words that are too short/long or contain numbers/special chars
-                original_text__regex=(
+                lexeme__word__regex=(
                     r'^.{0,' + str(min_length-1) + r'}$|'  # too short
                     r'^.{' + str(max_length+1) + r',}$|'   # too long
                     r'^[0-9]+$|'                           # only numbers
                     r'[^a-zA-Z]'                           # non-letters
                 )
             )
-            .distinct('original_text')  # One entry per unique word
         )
         
         return priority_words
@@ -148,21 +238,118 @@ class PDFDocument(models.Model):
         return created_count
 
 
+class Lexeme(models.Model):
+    """
+    A word and its translation into one language, shared by every
+    document it occurs in.
+    """
+
+    word = models.CharField(max_length=255)
+    source_language = models.CharField(max_length=5, default='en')
+    target_language = models.CharField(max_length=5)
+    translation = models.CharField(max_length=255, blank=True, null=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['word', 'source_language', 'target_language'],
+                name='unique_lexeme'
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.word} -> {self.translation}"
+
+
+def translation_of(prefix=''):
+    """
+    The translation a word entry shows in queries: the document's own
+    override, else the shared lexeme's. ``prefix`` is the path to the entry,
+    e.g. 'word_entry__'.
+    """
+    return Coalesce(f'{prefix}translation_override', f'{prefix}lexeme__translation')
+
+
+def lexeme_property(field):
+    """
+    Expose a Lexeme field on WordEntry. Assigning it, or passing it to the
+    constructor, makes the entry point at the matching lexeme once it is
+    saved (see attach_lexemes).
+    """
+    def getter(self):
+        unsaved = self.__dict__.get('_unsaved_lexeme')
+        if unsaved and field in unsaved:
+            return unsaved[field]
+        if self.lexeme_id is None:
+            return None
+        return getattr(self.lexeme, field)
+
+    def setter(self, value):
+        self.__dict__.setdefault('_unsaved_lexeme', {})[field] = value
+
+    return property(getter, setter)
+
+
 class WordEntry(models.Model):
+    """Where a lexeme first occurs in a document, and how often it occurs."""
+
     document = models.ForeignKey(PDFDocument, on_delete=models.CASCADE, related_name='words')
-    original_text = models.CharField(max_length=255)
-    translated_text = models.CharField(max_length=255, blank=True, null=True)
+    lexeme = models.ForeignKey(Lexeme, on_delete=models.PROTECT, related_name='occurrences')
     page_number = models.IntegerField()
     position = models.IntegerField()
-    created_at = models.DateTimeField(auto_now_add=True)
+    count = models.PositiveIntegerField(default=1)
+    timestamp = models.FloatField(
+        null=True,
+        blank=True,
+        help_text='Seconds into the video where the word is first heard'
+    )
+    translation_override = models.CharField(
+        max_length=255,
+        blank=True,
+        null=True,
+        help_text="The user's own translation from a word list; only this document shows it"
+    )
+
+    objects = ActiveWordEntryManager()
+    all_objects = models.Manager()
+
+    original_text = lexeme_property('word')
+    lexeme_translation = lexeme_property('translation')
+    target_language = lexeme_property('target_language')
+
+    @property
+    def translated_text(self):
+        return self.translation_override or self.lexeme_translation
+
+    @translated_text.setter
+    def translated_text(self, value):
+        self.lexeme_translation = value
 
     class Meta:
         ordering = ['page_number', 'position']
         verbose_name_plural = 'Word entries'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['document', 'lexeme'],
+                name='unique_lexeme_per_document'
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['document', 'page_number', 'position']),
+        ]
 
     def __str__(self):
         return f"{self.original_text} -> {self.translated_text}"
 
+    @property
+    def has_unsaved_lexeme(self):
+        return bool(self.__dict__.get('_unsaved_lexeme'))
+
+    def save(self, *args, **kwargs):
+        if self.has_unsaved_lexeme:
+            attach_lexemes([self])
+        super().save(*args, **kwargs)
+
     def create_flashcard(self, user):
         if not hasattr(self, 'flashcard'):
             from .models import Flashcard
@@ -180,10 +367,7 @@ class WordEntry(models.Model):
     @property
     def frequency(self):
         """Get the frequency of this word in the document."""
-        return WordEntry.objects.filter(
-            document=self.document,
-            original_text=self.original_text
-        ).count()
+        return self.count
 
     @property
     def is_priority(self):
@@ -207,6 +391,65 @@ class WordEntry(models.Model):
         return True
 
 
+# Words per query when looking lexemes up, below SQLite's parameter limit
+LEXEME_LOOKUP_BATCH_SIZE = 500
+
+
+def attach_lexemes(entries):
+    """
+    Point word entries built from original_text / translated_text /
+    target_language at their Lexeme rows, creating missing lexemes and
+    updating translations in bulk. A missing translation never replaces
+    an existing one. The target language defaults to the document's.
+
+    Lexemes are shared by every user, so only machine translations go
+    through here; a user's own translation is kept in the entry's
+    translation_override.
+    """
+    pending = [entry for entry in entries if entry.has_unsaved_lexeme]
+    if not pending:
+        return
+    translations = {}
+    for entry in pending:
+        unsaved = entry.__dict__['_unsaved_lexeme']
+        if not unsaved.get('target_language'):
+            unsaved['target_language'] = entry.document.target_language
+        key = (unsaved['word'], unsaved['target_language'])
+        if unsaved.get('translation') or key not in translations:
+            translations[key] = unsaved.get('translation') or None
+
+    lexemes = [
+        Lexeme(word=word, target_language=language, translation=translation)
+        for (word, language), translation in translations.items()
+    ]
+    Lexeme.objects.bulk_create(
+        [lexeme for lexeme in lexemes if lexeme.translation],
+        update_conflicts=True,
+        unique_fields=['word', 'source_language', 'target_language'],
+        update_fields=['translation'],
+    )
+    Lexeme.objects.bulk_create(
+        [lexeme for lexeme in lexemes if not lexeme.translation],
+        ignore_conflicts=True,
+    )
+
+    by_language = {}
+    for word, language in translations:
+        by_language.setdefault(language, []).append(word)
+    found = {}
+    for language, words in by_language.items():
+        for start in range(0, len(words), LEXEME_LOOKUP_BATCH_SIZE):
+            for lexeme in Lexeme.objects.filter(
+                source_language='en',
+                target_language=language,
+                word__in=words[start:start + LEXEME_LOOKUP_BATCH_SIZE]
+            ):
+                found[lexeme.word, language] = lexeme
+    for entry in pending:
+        unsaved = entry.__dict__.pop('_unsaved_lexeme')
+        entry.lexeme = found[unsaved['word'], unsaved['target_language']]
+
+
 class Flashcard(models.Model):
     INTERVAL_CHOICES = [
         ('again', '<10m'),
@@ -245,6 +488,9 @@ class Flashcard(models.Model):
         help_text='Current review interval'
     )
 
+    objects = ActiveFlashcardManager()
+    all_objects = models.Manager()
+
     class Meta:
         ordering = ['next_review']
         indexes = [
@@ -308,3 +554,138 @@ class Flashcard(models.Model):
         self.review_count = 0
         self.interval = 'good'  # Reset to standard interval
         self.save()
+
+
+@lru_cache(maxsize=None)
+def read_stopwords(path):
+    with open(path, encoding='utf-8-sig') as lines:
+        return frozenset(
+            word for word in (line.strip().lower() for line in lines)
+            if word and not word.startswith('#')
+        )
+
+
+def stopwords():
+    """Words that are never translated or turned into flashcards, see TRANSLATION_STOPWORDS_FILE."""
+    if not settings.TRANSLATION_STOPWORDS_FILE:
+        return frozenset()
+    return read_stopwords(settings.TRANSLATION_STOPWORDS_FILE)
+
+
+def known_words(user, target_language):
+    """
+    Words ``user`` does not need translated into ``target_language``:
+    the stopwords plus every word of a flashcard they have mastered
+    (reviewed KNOWN_WORD_MIN_REVIEWS times) in that language, in any
+    document. Load it once per job and check words against the set.
+    """
+    known = set(stopwords())
+    if user is not None:
+        known.update(
+            Lexeme.objects.filter(
+                target_language=target_language,
+                occurrences__flashcard__user=user,
+                occurrences__flashcard__review_count__gte=settings.KNOWN_WORD_MIN_REVIEWS,
+            ).values_list('word', flat=True)
+        )
+    return known
+
+
+class TranslationUsage(models.Model):
+    """What one job's translations cost with one backend."""
+
+    document = models.ForeignKey(
+        PDFDocument,
+        on_delete=models.SET_NULL,
+        related_name='translation_usage',
+        null=True,
+        blank=True,
+        help_text='Kept as NULL after the document is deleted so spend is not lost'
+    )
+    backend = models.CharField(max_length=100)
+    source_language = models.CharField(max_length=5, default='en')
+    target_language = models.CharField(max_length=5)
+    backend_calls = models.IntegerField(default=0)
+    words_requested = models.IntegerField(
+        default=0,
+        help_text='Words looked up, whether served from the cache or the backend'
+    )
+    characters = models.IntegerField(
+        default=0,
+        help_text='Characters sent to the backend (what we are billed for)'
+    )
+    cache_hits = models.IntegerField(default=0)
+    retries = models.IntegerField(default=0)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name_plural = 'Translation usage'
+        indexes = [
+            models.Index(fields=['created_at', 'target_language']),
+        ]
+
+    def __str__(self):
+        return f"{self.backend} {self.target_language}: {self.characters} characters"
+
+    @property
+    def cache_hit_rate(self):
+        if not self.words_requested:
+            return 0
+        return self.cache_hits / self.words_requested
+
+
+class TokenArtifact(models.Model):
+    """
+    The tokenized words of a PDF, so it can be translated again without
+    parsing it. Shared by every document with the same file content, and
+    rebuilt whenever the extractor version changes.
+    """
+
+    content_hash = models.CharField(max_length=64)
+    extractor_version = models.IntegerField()
+    page_count = models.IntegerField()
+    word_count = models.IntegerField()
+    tokens = models.BinaryField(
+        help_text='zlib-compressed JSON list of [word, page, position, count]'
+    )
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['content_hash', 'extractor_version'],
+                name='unique_token_artifact'
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.content_hash[:12]} v{self.extractor_version}: {self.word_count} words"
+
+    @staticmethod
+    def pack(words, first_locations, counts):
+        rows = [[word, *first_locations[word], counts[word]] for word in words]
+        return zlib.compress(json.dumps(rows, separators=(',', ':')).encode())
+
+    def unpack(self):
+        """Return the words in reading order, their first (page, position) and counts."""
+        rows = json.loads(zlib.decompress(bytes(self.tokens)))
+        words = [row[0] for row in rows]
+        first_locations = {word: (page, position) for word, page, position, count in rows}
+        counts = {row[0]: row[3] for row in rows}
+        return words, first_locations, counts
+
+
+class TranslationNamespace(models.Model):
+    """
+    Version counter naming a namespace of the translation cache (see
+    translation_usage.namespace_keys). Kept out of the cache itself,
+    whose culling would otherwise reset it and bring invalidated
+    translations back.
+    """
+
+    key = models.CharField(max_length=200, unique=True)
+    version = models.PositiveIntegerField(default=1)
+
+    def __str__(self):
+        return f"{self.key} v{self.version}"
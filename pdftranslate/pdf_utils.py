@@ -0,0 +1,151 @@
+import gc
+import hashlib
+import logging
+import mmap
+import os
+import resource
+from contextlib import contextmanager
+
+from django.core.files import File
+from PyPDF2 import PdfReader
+
+logger = logging.getLogger(__name__)
+
+PDF_HEADER = b'%PDF-'
+PDF_EOF_MARKER = b'%%EOF'
+# PDF readers accept the header anywhere in the first 1024 bytes and the
+# EOF marker is allowed to be followed by some trailing garbage.
+HEADER_SCAN_BYTES = 1024
+TRAILER_SCAN_BYTES = 2048
+
+
+class HashingFile(File):
+    """
+    Wrap an uploaded file so that storage backends copy it chunk by chunk
+    while a SHA-256 content hash is computed on the fly.
+    """
+
+    def __init__(self, file, name=None):
+        super().__init__(file, name or getattr(file, 'name', None))
+        self.hasher = hashlib.sha256()
+
+    def chunks(self, chunk_size=None):
+        for chunk in super().chunks(chunk_size):
+            self.hasher.update(chunk)
+            yield chunk
+
+    @property
+    def content_hash(self):
+        return self.hasher.hexdigest()
+
+
+def looks_like_pdf(file):
+    """
+    Cheap sanity check that only reads the header and the trailer.
+
+    Full structural validation is left to the background translation job.
+    """
+    try:
+        file.seek(0)
+        header = file.read(HEADER_SCAN_BYTES)
+        if PDF_HEADER not in header:
+            return False
+
+        size = file.size
+        file.seek(max(0, size - TRAILER_SCAN_BYTES))
+        trailer = file.read(TRAILER_SCAN_BYTES)
+        return PDF_EOF_MARKER in trailer
+    except Exception as e:
+        logger.error(f"Error checking PDF header: {str(e)}")
+        return False
+    finally:
+        file.seek(0)
+
+
+class MemoryLimitExceeded(Exception):
+    """Raised when a job grows past its memory ceiling."""
+
+
+class MemoryGuard:
+    """
+    Enforce a per-job memory ceiling.
+
+    The process RSS is sampled when the guard is created and the job is
+    only charged for the growth since then, so other jobs that were
+    already running on the same worker do not count against it.
+    """
+
+    def __init__(self, limit_mb):
+        self.limit_mb = limit_mb
+        self.baseline_mb = current_rss_mb()
+
+    @property
+    def used_mb(self):
+        return max(0, current_rss_mb() - self.baseline_mb)
+
+    def check(self):
+        if self.limit_mb and self.used_mb > self.limit_mb:
+            raise MemoryLimitExceeded(
+                f"Memory limit of {self.limit_mb} MB exceeded "
+                f"({self.used_mb:.0f} MB used)"
+            )
+
+
+def current_rss_mb():
+    """Return the current resident set size of this process in MB."""
+    try:
+        with open('/proc/self/statm') as statm:
+            pages = int(statm.read().split()[1])
+        return pages * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except (OSError, ValueError, IndexError):
+        # Not on Linux: fall back to the peak, which is still an upper bound
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+@contextmanager
+def open_pdf(field_file):
+    """
+    Open a stored PDF for reading.
+
+    Files on the local filesystem are memory-mapped, so pages are read
+    from the OS page cache on demand instead of through Python buffers.
+    Other storages fall back to a regular file object.
+    """
+    try:
+        path = field_file.path
+    except NotImplementedError:
+        path = None
+
+    if path is None:
+        with field_file.open('rb') as pdf_file:
+            yield PdfReader(pdf_file)
+        return
+
+    with open(path, 'rb') as pdf_file:
+        with mmap.mmap(pdf_file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            yield PdfReader(mapped)
+
+
+def iter_page_texts(pdf_reader, window=25):
+    """
+    Yield ``(page_number, text)`` for every page, ``window`` pages at a time.
+
+    After each window the reader's cache of parsed objects (content
+    streams, fonts, images) is dropped, so memory stays bounded by the
+    window size instead of growing with the whole book.
+    """
+    page_count = len(pdf_reader.pages)
+    for start in range(0, page_count, window):
+        for index in range(start, min(start + window, page_count)):
+            page = pdf_reader.pages[index]
+            try:
+                text = page.extract_text()
+            except Exception as e:
+                logger.error(
+                    f"Error extracting text from page {index + 1}: {str(e)}"
+                )
+                text = ''
+            del page
+            yield index + 1, text
+        pdf_reader.resolved_objects.clear()
+        gc.collect()
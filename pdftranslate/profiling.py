@@ -0,0 +1,180 @@
+"""
+Opt-in profiling of requests and background translation jobs.
+
+Profiles are taken with pyinstrument's sampling profiler (written as
+speedscope JSON, open them at https://www.speedscope.app). Without it,
+sync requests and jobs fall back to cProfile (written as pstats, open
+them with ``python -m pstats`` or snakeviz) and async requests are not
+profiled. Only the newest PROFILING_MAX_FILES profiles are kept in
+PROFILING_DIR.
+"""
+import cProfile
+import logging
+import os
+import random
+import re
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from functools import wraps
+from pathlib import Path
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+try:
+    from pyinstrument import Profiler as SamplingProfiler
+    from pyinstrument.renderers import SpeedscopeRenderer
+except ImportError:
+    SamplingProfiler = None
+
+logger = logging.getLogger(__name__)
+
+PROFILE_SUFFIXES = ('.speedscope.json', '.pstats')
+
+
+def profile_path(name):
+    slug = re.sub(r'[^A-Za-z0-9]+', '-', name).strip('-')[:80] or 'profile'
+    suffix = PROFILE_SUFFIXES[0] if SamplingProfiler else PROFILE_SUFFIXES[1]
+    unique = f'{os.getpid()}-{uuid.uuid4().hex[:8]}'
+    return Path(settings.PROFILING_DIR) / f'{time.strftime("%Y%m%d-%H%M%S")}-{slug}-{unique}{suffix}'
+
+
+def rotate_profiles(directory, max_files):
+    """Delete the oldest profiles so at most ``max_files`` remain."""
+    profiles = sorted(
+        (path for path in Path(directory).iterdir() if path.name.endswith(PROFILE_SUFFIXES)),
+        key=lambda path: path.stat().st_mtime
+    )
+    for path in profiles[:max(0, len(profiles) - max_files)]:
+        try:
+            path.unlink()
+        except FileNotFoundError:
+            # Removed by another process rotating at the same time
+            pass
+
+
+# One profile at a time per process: profilers hook the whole interpreter
+# (cProfile refuses to start a second one from Python 3.12 on)
+_profiling = threading.Lock()
+
+
+def start_profiler():
+    if SamplingProfiler:
+        profiler = SamplingProfiler(interval=settings.PROFILING_INTERVAL)
+        profiler.start()
+    else:
+        profiler = cProfile.Profile()
+        profiler.enable()
+    return profiler
+
+
+@contextmanager
+def profile(name):
+    """
+    Profile the ``with`` block and write the result to PROFILING_DIR.
+
+    Yields the path the profile will be written to, or None if the block
+    runs unprofiled because another profile is being taken or the
+    profiler could not start. Profiling never breaks the code being
+    profiled.
+    """
+    if not _profiling.acquire(blocking=False):
+        yield None
+        return
+    try:
+        path = profile_path(name)
+        try:
+            profiler = start_profiler()
+        except Exception as e:
+            logger.warning(f"Could not start profiling {name}: {str(e)}")
+            profiler = None
+        if profiler is None:
+            yield None
+            return
+        try:
+            yield path
+        finally:
+            if SamplingProfiler:
+                profiler.stop()
+            else:
+                profiler.disable()
+            try:
+                path.parent.mkdir(parents=True, exist_ok=True)
+                if SamplingProfiler:
+                    path.write_text(profiler.output(renderer=SpeedscopeRenderer()))
+                else:
+                    profiler.dump_stats(path)
+                rotate_profiles(path.parent, settings.PROFILING_MAX_FILES)
+                logger.info(f"Wrote profile {path}")
+            except Exception as e:
+                logger.error(f"Failed to write profile {path}: {str(e)}")
+    finally:
+        _profiling.release()
+
+
+def sampled(rate):
+    return rate > 0 and random.random() < rate
+
+
+def profiled_task(run):
+    """Profile a sample of background job runs, see PROFILING_TASK_SAMPLE_RATE."""
+    @wraps(run)
+    def wrapper(self):
+        if not (settings.PROFILING_ENABLED and sampled(settings.PROFILING_TASK_SAMPLE_RATE)):
+            return run(self)
+        with profile(f'{self.job_type}-job-{self.document_id}'):
+            return run(self)
+    return wrapper
+
+
+class ProfilingMiddleware:
+    """
+    Profile a sample of requests (PROFILING_SAMPLE_RATE), or any request
+    from a staff user that sends the PROFILING_HEADER header.
+
+    Must come after AuthenticationMiddleware. Staff users get the name of
+    the written profile back in the same header. Works both sync and
+    async, so async views are not pushed onto a thread under ASGI.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        user = getattr(request, 'user', None)
+        if not self.should_profile(request, lambda: bool(user and user.is_staff)):
+            return self.get_response(request)
+        with profile(f'{request.method}-{request.path}') as path:
+            response = self.get_response(request)
+        if path and user and user.is_staff:
+            response[settings.PROFILING_HEADER] = path.name
+        return response
+
+    async def __acall__(self, request):
+        staff = False
+        if settings.PROFILING_HEADER in request.headers and hasattr(request, 'auser'):
+            staff = (await request.auser()).is_staff
+        if not self.should_profile(request, lambda: staff) or not SamplingProfiler:
+            # cProfile would also record every other coroutine the event
+            # loop runs meanwhile; only pyinstrument follows the request's
+            return await self.get_response(request)
+        with profile(f'{request.method}-{request.path}') as path:
+            response = await self.get_response(request)
+        if not staff and hasattr(request, 'auser'):
+            staff = (await request.auser()).is_staff
+        if path and staff:
+            response[settings.PROFILING_HEADER] = path.name
+        return response
+
+    def should_profile(self, request, is_staff):
+        if settings.PROFILING_HEADER in request.headers and is_staff():
+            return True
+        return settings.PROFILING_ENABLED and sampled(settings.PROFILING_SAMPLE_RATE)
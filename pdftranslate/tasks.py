@@ -1,21 +1,55 @@
 import threading
-from PyPDF2 import PdfReader
+import csv
 import io
+import os
 import re
 import logging
 import traceback
-from .translation_service import TranslationService
-from .models import PDFDocument, WordEntry
-from django.db import transaction
+from collections import Counter, defaultdict
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import closing, contextmanager
+from .models import (
+    Flashcard,
+    PDFDocument,
+    TokenArtifact,
+    TranslationUsage,
+    WordEntry,
+    attach_lexemes,
+    known_words,
+    translation_of,
+)
+from .job_scheduler import QueueFull, job_scheduler
+from .pdf_utils import MemoryGuard, MemoryLimitExceeded, iter_page_texts, open_pdf
+from .metrics import record_job
+from .profiling import profiled_task
+from .translation_usage import TrackedTranslator, translate_words
+from .write_queue import write_queue
+from django.conf import settings
+from django.utils.module_loading import import_string
 import time
 from channels.layers import get_channel_layer
 from asgiref.sync import async_to_sync
-from celery import shared_task
 
 logger = logging.getLogger(__name__)
 channel_layer = get_channel_layer()
 
 
+# Bump whenever parsing or tokenizing changes the words a PDF yields, so
+# stored token artifacts are rebuilt instead of reused
+EXTRACTOR_VERSION = 1
+
+WORD_RE = re.compile(r'\b[a-zA-Z]+\b')
+
+
+class JobCancelled(Exception):
+    """Raised inside a job whose document was cancelled or deleted."""
+
+
+def tokenize(text):
+    """Every word of ``text``, lowercased, in reading order."""
+    return WORD_RE.findall(text.lower())
+
+
 def clean_text(text):
     """Clean and split text into words.
     
@@ -23,20 +57,8 @@ def clean_text(text):
     - Numbers and special characters
     - Non-alphabetic strings
     """
-    # Convert to lowercase and split into words
-    words = re.findall(r'\b[a-zA-Z]+\b', text.lower())
-    
-    # Filter words and remove duplicates while preserving order
-    filtered_words = []
-    seen = set()
-    for word in words:
-        if (word.isalpha() and  # Only keep alphabetic words
-            not any(c.isdigit() for c in word) and  # Remove words with numbers
-            word not in seen):  # Remove duplicates
-            filtered_words.append(word)
-            seen.add(word)
-    
-    return filtered_words
+    # Remove duplicates while preserving order
+    return list(dict.fromkeys(tokenize(text)))
 
 
 def send_progress_update(document_id, progress, translated_words, total_words):
@@ -52,149 +74,813 @@ def send_progress_update(document_id, progress, translated_words, total_words):
     )
 
 
-class TranslationTask(threading.Thread):
-    def __init__(self, document_id):
-        super().__init__()
+def store_word_entries(word_entries):
+    """Upsert word entries on (document, lexeme).
+
+    The entries' words and translations are first upserted into the
+    shared Lexeme table. Retried or duplicated batches, and workers
+    writing chunks of the same document in parallel, update the existing
+    row instead of inserting a duplicate, so no locking or dedup pass is
+    needed.
+    """
+    if not word_entries:
+        return
+    attach_lexemes(word_entries)
+    WordEntry.objects.bulk_create(
+        word_entries,
+        update_conflicts=True,
+        unique_fields=['document', 'lexeme'],
+        update_fields=['count', 'translation_override'],
+    )
+
+
+def store_counts(document, word_counts):
+    """Set the occurrence counts of the document's words."""
+    entries = list(document.words_in())
+    for entry in entries:
+        entry.count = word_counts[entry.original_text]
+    WordEntry.objects.bulk_update(entries, ['count'], batch_size=500)
+
+
+def get_translation_service():
+    """Return the translation backend used by background jobs."""
+    return import_string(settings.TRANSLATION_BACKEND)()
+
+
+def iter_word_list(lines, delimiter=None):
+    """
+    Yield ``(word, translation)`` pairs from the lines of a word list.
+
+    With a delimiter the lines are read as CSV/TSV rows: the first column
+    is the word and an optional second column is a ready-made translation
+    (None when missing). Without one, every non-empty line is a word.
+    """
+    if delimiter is None:
+        rows = ([line] for line in lines)
+    else:
+        rows = csv.reader(lines, delimiter=delimiter)
+    for row in rows:
+        if not row:
+            continue
+        word = row[0].strip().lower()
+        if not word or word.startswith('#') or word in ('word', 'original'):
+            continue
+        translation = row[1].strip() if len(row) > 1 and row[1].strip() else None
+        yield word[:255], translation
+
+
+def word_list_delimiter(file_name):
+    extension = os.path.splitext(file_name)[1].lower()
+    return {'.csv': ',', '.tsv': '\t'}.get(extension)
+
+
+def import_word_list(document, lines, translation_service, delimiter=None,
+                     create_flashcards=False, batch_size=100, check_cancelled=None):
+    """
+    Import a word list into ``document`` without going through PDF parsing.
+
+    ``lines`` is consumed lazily, so a file object can be passed in
+    directly. Words without a translation in the file are translated
+    ``batch_size`` at a time and every batch is upserted as soon as it is
+    ready; ``check_cancelled`` is called before each batch and may raise
+    to stop the import. Returns the number of words imported.
+    """
+    seen = set()
+    imported = 0
+    batch = []
+
+    def store_batch(entries, words):
+        store_word_entries(entries)
+        if create_flashcards and document.user:
+            new_words = document.words_in().alias(translation=translation_of()).filter(
+                lexeme__word__in=words,
+                translation__isnull=False,
+                flashcard__isnull=True
+            )
+            Flashcard.objects.bulk_create(
+                [Flashcard(word_entry=word, user=document.user) for word in new_words],
+                ignore_conflicts=True
+            )
+
+    def flush(batch):
+        if check_cancelled:
+            check_cancelled()
+        missing = [word for word, translation, _ in batch if not translation]
+        translated = dict(zip(
+            missing,
+            translate_words(translation_service, missing, document.target_language)
+        )) if missing else {}
+        entries = [
+            WordEntry(
+                document=document,
+                original_text=word,
+                target_language=document.target_language,
+                translated_text=translated.get(word),
+                # The file's translation is this user's; it must not
+                # replace the lexeme's, which every document shares
+                translation_override=translation or None,
+                page_number=1,
+                position=position
+            )
+            for word, translation, position in batch
+        ]
+        write_queue.write(store_batch, entries, [word for word, _, _ in batch])
+        return len(entries)
+
+    for position, (word, translation) in enumerate(iter_word_list(lines, delimiter)):
+        if word in seen:
+            continue
+        seen.add(word)
+        batch.append((word, translation, position))
+        if len(batch) >= batch_size:
+            imported += flush(batch)
+            batch = []
+            write_queue.write(
+                PDFDocument.objects.filter(pk=document.pk).update,
+                total_words=imported,
+                translated_words=imported
+            )
+            send_progress_update(document.id, 0, imported, imported)
+    if batch:
+        imported += flush(batch)
+    return imported
+
+
+class TranslationTask:
+    """A translation job; start_translation() queues it with the job scheduler."""
+
+    # Label of this kind of job in the metrics
+    job_type = 'pdf'
+
+    def __init__(self, document_id, translation_service=None):
         self.document_id = document_id
-        self.daemon = True
+        self.translation_service = translation_service
+        self.translator = None
+        # Wall time per pipeline stage and job counters, for benchmarks
+        # and metrics
+        self.stage_seconds = defaultdict(float)
+        self.counters = defaultdict(int)
+
+    @contextmanager
+    def stage(self, name):
+        """Add the time spent in the ``with`` block to ``stage_seconds[name]``."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stage_seconds[name] += time.perf_counter() - started
+
+    def extract_words(self, document):
+        """
+        Extract unique words in reading order from the document's PDF.
+
+        Returns the words, the (page, position) where each first appears,
+        how often each occurs and the page texts. Documents with at least
+        PDF_LARGE_DOCUMENT_PAGES pages are processed in large-document
+        mode: page texts are not kept (None is returned instead) and the
+        job fails once it grows past PDF_JOB_MEMORY_LIMIT_MB.
+        """
+        all_words = []
+        word_first_location = {}
+        word_counts = Counter()
+        extracted_text = []
+        with open_pdf(document.pdf_file) as pdf_reader:
+            page_count = len(pdf_reader.pages)
+            if page_count == 0:
+                raise ValueError("The PDF file appears to be empty")
+            logger.info(f"PDF has {page_count} pages")
+
+            memory_guard = None
+            if page_count >= settings.PDF_LARGE_DOCUMENT_PAGES:
+                logger.info(f"Processing document {self.document_id} in large-document mode")
+                memory_guard = MemoryGuard(settings.PDF_JOB_MEMORY_LIMIT_MB)
+                extracted_text = None
+
+            page_texts = iter_page_texts(pdf_reader, window=settings.PDF_PAGE_WINDOW)
+            while True:
+                with self.stage('parse'):
+                    page = next(page_texts, None)
+                if page is None:
+                    break
+                page_num, text = page
+                self.counters['pages'] += 1
+                if extracted_text is not None:
+                    extracted_text.append(text)
+                with self.stage('tokenize'):
+                    tokens = tokenize(text)
+                    word_counts.update(tokens)
+                    for pos, word in enumerate(dict.fromkeys(tokens)):
+                        if word not in word_first_location:
+                            word_first_location[word] = (page_num, pos)
+                            all_words.append(word)
+                if memory_guard:
+                    memory_guard.check()
+        return all_words, word_first_location, word_counts, extracted_text
+
+    def load_words(self, document):
+        """
+        Return the document's words, first locations, counts and page
+        texts, reusing the token artifact of an earlier run on the same file
+        when there is one (page texts are None then, they are already
+        saved). Otherwise the PDF is parsed and the artifact stored.
+        """
+        if document.content_hash:
+            with self.stage('load_tokens'):
+                artifact = TokenArtifact.objects.filter(
+                    content_hash=document.content_hash,
+                    extractor_version=EXTRACTOR_VERSION
+                ).first()
+            if artifact:
+                logger.info(f"Reusing token artifact for document {self.document_id}")
+                self.counters['token_artifact_hits'] += 1
+                all_words, word_first_location, word_counts = artifact.unpack()
+                return all_words, word_first_location, word_counts, None
+
+        all_words, word_first_location, word_counts, extracted_text = self.extract_words(document)
+        if document.content_hash and all_words:
+            with self.stage('store'):
+                write_queue.submit(
+                    TokenArtifact.objects.update_or_create,
+                    content_hash=document.content_hash,
+                    extractor_version=EXTRACTOR_VERSION,
+                    defaults={
+                        'page_count': self.counters['pages'],
+                        'word_count': len(all_words),
+                        'tokens': TokenArtifact.pack(all_words, word_first_location, word_counts),
+                    }
+                )
+        return all_words, word_first_location, word_counts, extracted_text
 
+    def get_translator(self):
+        """Wrap the backend so the job's cache hits and spend are recorded."""
+        self.translator = TrackedTranslator(
+            self.translation_service or get_translation_service()
+        )
+        return self.translator
+
+    def translate(self, translation_service, words, target_language):
+        with self.stage('translate'):
+            return translate_words(translation_service, words, target_language)
+
+    def translate_batches(self, translator, batches):
+        """
+        Translate ``(language, words)`` batches, yielding
+        ``(language, words, translations)`` as each one completes.
+
+        Only the backend requests for words missing from the cache run in
+        a thread pool, at most TRANSLATION_MAX_CONCURRENT_REQUESTS at a
+        time for the whole job, so several target languages share one
+        budget of backend connections. Cache lookups and writes stay on
+        this thread. A batch whose request failed is logged and yielded
+        with ``translations`` set to None.
+        """
+        workers = settings.TRANSLATION_MAX_CONCURRENT_REQUESTS
+        in_flight = {}
+
+        def completed(futures):
+            for future in futures:
+                language, words, keys, cached = in_flight.pop(future)
+                try:
+                    translated = future.result()
+                except Exception as e:
+                    logger.error(f"Error translating batch: {str(e)}")
+                    logger.error(traceback.format_exc())
+                    yield language, words, None
+                    continue
+                with self.stage('translate'):
+                    translations = translator.remember(words, keys, cached, translated)
+                yield language, words, translations
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            try:
+                for language, words in batches:
+                    with self.stage('translate'):
+                        keys, cached, missing = translator.lookup(words, language)
+                    if missing:
+                        future = pool.submit(translator.fetch, missing, language)
+                        in_flight[future] = (language, words, keys, cached)
+                    else:
+                        yield language, words, translator.remember(words, keys, cached, {})
+                    # Keep a bounded number of batches queued behind the workers
+                    while len(in_flight) >= workers * 2:
+                        with self.stage('translate'):
+                            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                        yield from completed(done)
+                while in_flight:
+                    with self.stage('translate'):
+                        done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                    yield from completed(done)
+            finally:
+                # The job stopped early (cancelled): do not send the
+                # requests that have not started yet
+                for future in in_flight:
+                    future.cancel()
+
+    def store(self, word_entries):
+        with self.stage('store'):
+            write_queue.write(store_word_entries, word_entries)
+        self.counters['rows_written'] += len(word_entries)
+
+    def save_progress(self, document, *fields):
+        """
+        Queue a progress update without waiting for it. Later saves of the
+        document go through the same writer, so they land after it.
+        """
+        fields = ('translation_progress', 'translated_words') + fields
+        write_queue.submit(
+            PDFDocument.objects.filter(pk=document.pk).update,
+            **{field: getattr(document, field) for field in fields}
+        )
+
+    def finish(self, status):
+        """Record the job's translation usage and publish its metrics."""
+        if self.translator:
+            for target_language, usage in self.translator.usage.items():
+                for name in ('backend_calls', 'characters', 'cache_hits', 'retries'):
+                    self.counters[name] += usage[name]
+            try:
+                self.translator.save_usage(self.document_id)
+            except Exception as e:
+                logger.error(f"Failed to save translation usage: {str(e)}")
+        # New cache entries are written without waiting; they should land
+        # before the job counts as finished
+        write_queue.flush()
+        record_job(self.job_type, status, self.stage_seconds, self.counters)
+
+    def check_cancelled(self):
+        """Raise JobCancelled if the document was cancelled or deleted since the job started."""
+        document = PDFDocument.all_objects.filter(id=self.document_id).values(
+            'translation_status', 'deleted_at'
+        ).first()
+        if (
+            document is None
+            or document['deleted_at'] is not None
+            or document['translation_status'] == 'cancelled'
+        ):
+            raise JobCancelled(f"Job for document {self.document_id} was cancelled")
+
+    def cancelled(self):
+        """Stop after a cancellation; the document's status was already set by cancel_job()."""
+        logger.info(f"Stopped the job for document {self.document_id}, it was cancelled")
+        self.finish('cancelled')
+
+    def mark_failed(self, document, reason=''):
+        document.translation_status = 'failed'
+        document.failure_reason = reason
+        write_queue.write(document.save)
+        send_progress_update(self.document_id, 0, 0, 0)
+        self.finish('failed')
+
+    @profiled_task
     def run(self):
         document = None
         try:
             logger.info(f"Starting translation for document {self.document_id}")
+            self.check_cancelled()
             document = PDFDocument.objects.select_for_update().get(id=self.document_id)
             
             # Set status to in_progress and send initial progress
             document.translation_status = 'in_progress'
             document.translation_progress = 0
-            document.save()
+            document.failure_reason = ''
+            write_queue.write(document.save)
             send_progress_update(self.document_id, 0, 0, 0)
             
             # Initialize translation service
             logger.info(f"Initializing translation service for document {self.document_id}")
             try:
-                from .google_translate_service import GoogleTranslateService
-                translation_service = GoogleTranslateService()
-                logger.info(f"Google Translation service initialized successfully")
+                translation_service = self.get_translator()
+                logger.info("Translation service initialized successfully")
             except Exception as e:
                 logger.error(f"Failed to initialize translation service: {str(e)}")
-                document.translation_status = 'failed'
-                document.save()
-                send_progress_update(self.document_id, 0, 0, 0)
+                self.mark_failed(document, 'Translation service is unavailable')
                 return
             
             # Read PDF content
             logger.info(f"Reading PDF content for document {self.document_id}")
             try:
-                pdf_reader = PdfReader(document.pdf_file)
-                logger.info(f"PDF has {len(pdf_reader.pages)} pages")
+                all_words, word_first_location, word_counts, extracted_text = self.load_words(document)
+            except MemoryLimitExceeded as e:
+                logger.error(f"Stopped reading PDF for document {self.document_id}: {str(e)}")
+                self.mark_failed(document, str(e))
+                return
             except Exception as e:
                 logger.error(f"Failed to read PDF: {str(e)}")
-                document.translation_status = 'failed'
-                document.save()
-                send_progress_update(self.document_id, 0, 0, 0)
+                self.mark_failed(document, 'The PDF file could not be read')
                 return
             
-            # Extract all words and remember first page/position for each unique word
-            all_words = []
-            word_first_location = {}
-            extracted_text = []
-            for page_num, page in enumerate(pdf_reader.pages, 1):
-                try:
-                    text = page.extract_text()
-                    extracted_text.append(text)
-                    words = clean_text(text)
-                    for pos, word in enumerate(words):
-                        if word not in word_first_location:
-                            word_first_location[word] = (page_num, pos)
-                            all_words.append(word)
-                except Exception as e:
-                    logger.error(f"Error extracting text from page {page_num}: {str(e)}")
-            
             if not all_words:
                 logger.error(f"No words found in document {self.document_id}")
-                document.translation_status = 'failed'
-                document.save()
-                send_progress_update(self.document_id, 0, 0, 0)
+                self.mark_failed(document, 'No words found in the document')
                 return
             
+            # Parsing can take a while; do not undo a cancellation made meanwhile
+            self.check_cancelled()
             document.total_words = len(all_words)
-            document.save()
+            write_queue.write(document.save, update_fields=['total_words'])
+            self.counters['words'] = len(all_words)
             logger.info(f"Total unique words in document: {len(all_words)}")
             
-            # Translate unique words
-            translated_words = 0
+            # Translate unique words into every target language, skipping
+            # the words the reader already knows in that language
+            languages = document.languages
             BATCH_SIZE = 100
+            batches = []
+            for language in languages:
+                known = known_words(document.user, language)
+                words = [word for word in all_words if word not in known]
+                self.counters['known_words_skipped'] += len(all_words) - len(words)
+                batches.extend(
+                    (language, words[i:i + BATCH_SIZE])
+                    for i in range(0, len(words), BATCH_SIZE)
+                )
+            translated_words = 0
+            batches_done = 0
             word_entries = []
-            for i in range(0, len(all_words), BATCH_SIZE):
-                batch = all_words[i:i+BATCH_SIZE]
-                try:
-                    translations = [translation_service.translate_word(word, target_language=document.target_language) for word in batch]
-                    logger.info(f"Successfully translated batch: {translations}")
-                    for word, trans in zip(batch, translations):
-                        if trans:
-                            page_num, pos = word_first_location[word]
-                            word_entries.append(
-                                WordEntry(
-                                    document=document,
-                                    original_text=word,
-                                    translated_text=trans,
-                                    page_number=page_num,
-                                    position=pos
+            with closing(self.translate_batches(translation_service, batches)) as results:
+                for language, batch, translations in results:
+                    self.check_cancelled()
+                    batches_done += 1
+                    if translations is not None:
+                        for word, trans in zip(batch, translations):
+                            if trans:
+                                page_num, pos = word_first_location[word]
+                                word_entries.append(
+                                    WordEntry(
+                                        document=document,
+                                        original_text=word,
+                                        target_language=language,
+                                        translated_text=trans,
+                                        page_number=page_num,
+                                        position=pos,
+                                        count=word_counts[word]
+                                    )
                                 )
-                            )
-                            translated_words += 1
+                                translated_words += 1
                     # Bulk create entries periodically
                     if len(word_entries) >= BATCH_SIZE * 2:
-                        WordEntry.objects.bulk_create(word_entries)
+                        self.store(word_entries)
                         word_entries = []
                     # Update progress and send update
-                    progress = int((translated_words / len(all_words)) * 100)
-                    document.translation_progress = min(progress, 99)
-                    document.translated_words = translated_words
-                    document.save()
-                    send_progress_update(
-                        self.document_id,
-                        document.translation_progress,
-                        translated_words,
-                        len(all_words)
-                    )
-                except Exception as e:
-                    logger.error(f"Error translating batch: {str(e)}")
-                    logger.error(traceback.format_exc())
+                    with self.stage('progress'):
+                        progress = int((batches_done / len(batches)) * 100)
+                        document.translation_progress = min(progress, 99)
+                        # Words translated into every language, on average
+                        document.translated_words = translated_words // len(languages)
+                        self.save_progress(document)
+                        send_progress_update(
+                            self.document_id,
+                            document.translation_progress,
+                            document.translated_words,
+                            len(all_words)
+                        )
             # Create any remaining word entries
-            if word_entries:
-                WordEntry.objects.bulk_create(word_entries)
-            # Save the complete extracted text
-            document.extracted_text = '\n'.join(extracted_text)
+            self.store(word_entries)
+            # Save the complete extracted text (not kept for large documents)
+            if extracted_text is not None:
+                document.extracted_text = '\n'.join(extracted_text)
             # Update final status and progress
             document.translation_status = 'completed'
             document.translation_progress = 100
-            document.translated_words = translated_words
-            document.save()
+            document.translated_words = translated_words // len(languages)
+            write_queue.write(document.save)
             # Send final progress update
-            send_progress_update(self.document_id, 100, translated_words, len(all_words))
+            send_progress_update(
+                self.document_id, 100, document.translated_words, len(all_words)
+            )
+            self.finish('completed')
             logger.info(f"Translation completed for document {self.document_id}")
+        except JobCancelled:
+            self.cancelled()
         except Exception as e:
             error_message = f"Translation task error for document {self.document_id}: {str(e)}"
             logger.error(error_message)
             logger.error(traceback.format_exc())
             try:
-                if document:
-                    document.translation_status = 'failed'
-                    document.save()
-                    send_progress_update(self.document_id, 0, 0, 0)
-                else:
+                if not document:
                     document = PDFDocument.objects.get(id=self.document_id)
-                    document.translation_status = 'failed'
-                    document.save()
-                    send_progress_update(self.document_id, 0, 0, 0)
+                self.mark_failed(document, 'Unexpected error during translation')
             except Exception as inner_e:
                 logger.error(f"Failed to update document status: {str(inner_e)}")
 
 
+def schedule(task):
+    """
+    Queue a job with the job scheduler. If the queue is full the document
+    is marked as failed with the reason and QueueFull is raised.
+    """
+    documents = PDFDocument.objects.filter(id=task.document_id)
+    user_id, priority = documents.values_list('user_id', 'priority').get()
+    try:
+        return job_scheduler.submit(task, user_id, priority)
+    except QueueFull as e:
+        documents.update(translation_status='failed', failure_reason=f'{e}, please try again later')
+        raise
+
+
+def cancel_job(document_id):
+    """
+    Cancel a document's job. A waiting job is dropped from the queue and a
+    running one stops before its next batch. Returns whether there was a
+    job to cancel.
+    """
+    job_scheduler.cancel(document_id)
+    return bool(PDFDocument.objects.filter(
+        id=document_id, translation_status__in=['pending', 'in_progress']
+    ).update(translation_status='cancelled'))
+
+
+def set_priority(document_id, priority):
+    """Change a document's priority, moving its job if it is still waiting."""
+    PDFDocument.objects.filter(id=document_id).update(priority=priority)
+    job_scheduler.reprioritize(document_id, priority)
+
+
 def start_translation(document_id):
-    """Start the translation process in a background thread."""
-    task = TranslationTask(document_id)
+    """Queue the translation of a document to run in the background."""
+    return schedule(TranslationTask(document_id))
+
+
+class WordListImportTask(TranslationTask):
+    """Import an uploaded CSV/TSV or plain word list in the background."""
+
+    job_type = 'word_list'
+
+    def __init__(self, document_id, create_flashcards=False, translation_service=None):
+        super().__init__(document_id, translation_service=translation_service)
+        self.create_flashcards = create_flashcards
+
+    @profiled_task
+    def run(self):
+        document = None
+        try:
+            logger.info(f"Starting word list import for document {self.document_id}")
+            self.check_cancelled()
+            document = PDFDocument.objects.get(id=self.document_id)
+            document.translation_status = 'in_progress'
+            document.translation_progress = 0
+            document.failure_reason = ''
+            write_queue.write(document.save)
+            send_progress_update(self.document_id, 0, 0, 0)
+
+            try:
+                translation_service = self.get_translator()
+            except Exception as e:
+                logger.error(f"Failed to initialize translation service: {str(e)}")
+                self.mark_failed(document, 'Translation service is unavailable')
+                return
+
+            with document.pdf_file.open('rb') as word_file:
+                lines = io.TextIOWrapper(word_file, encoding='utf-8-sig', newline='')
+                imported = import_word_list(
+                    document,
+                    lines,
+                    translation_service,
+                    delimiter=word_list_delimiter(document.pdf_file.name),
+                    create_flashcards=self.create_flashcards,
+                    check_cancelled=self.check_cancelled
+                )
+
+            if not imported:
+                self.mark_failed(document, 'No words found in the word list')
+                return
+
+            document.translation_status = 'completed'
+            document.translation_progress = 100
+            document.total_words = imported
+            document.translated_words = imported
+            write_queue.write(document.save)
+            send_progress_update(self.document_id, 100, imported, imported)
+            self.counters['words'] = imported
+            self.counters['rows_written'] = imported
+            self.finish('completed')
+            logger.info(f"Imported {imported} words into document {self.document_id}")
+        except JobCancelled:
+            self.cancelled()
+        except Exception as e:
+            logger.error(f"Word list import error for document {self.document_id}: {str(e)}")
+            logger.error(traceback.format_exc())
+            try:
+                if not document:
+                    document = PDFDocument.objects.get(id=self.document_id)
+                self.mark_failed(document, 'Unexpected error during import')
+            except Exception as inner_e:
+                logger.error(f"Failed to update document status: {str(inner_e)}")
+
+
+def in_index_order(chunks):
+    """
+    Yield ``(index, item)`` pairs in index order, holding back the ones
+    that arrive before their predecessors.
+    """
+    waiting = {}
+    next_index = 0
+    for index, item in chunks:
+        waiting[index] = item
+        while next_index in waiting:
+            yield next_index, waiting.pop(next_index)
+            next_index += 1
+    for index in sorted(waiting):
+        yield index, waiting[index]
+
+
+class VideoTranslationTask(TranslationTask):
+    """
+    Transcribe an uploaded video and feed its words into the same
+    tokenize -> translate -> WordEntry stages as PDFs.
+
+    Each transcript chunk is translated and stored as soon as it has been
+    transcribed, so words show up while the rest of the video is still
+    being processed. Words are located by transcript chunk (page_number),
+    position within the chunk and the timestamp of their segment. Chunks
+    are transcribed concurrently but handled in order, so a word is
+    located where it is first heard.
+    """
+
+    job_type = 'video'
+
+    @profiled_task
+    def run(self):
+        document = None
+        try:
+            logger.info(f"Starting video translation for document {self.document_id}")
+            self.check_cancelled()
+            document = PDFDocument.objects.get(id=self.document_id)
+            document.translation_status = 'in_progress'
+            document.translation_progress = 0
+            document.failure_reason = ''
+            write_queue.write(document.save)
+            send_progress_update(self.document_id, 0, 0, 0)
+
+            try:
+                from .transcription_service import TranscriptionService
+                translation_service = self.get_translator()
+                transcription_service = TranscriptionService()
+            except Exception as e:
+                logger.error(f"Failed to initialize services: {str(e)}")
+                self.mark_failed(document, 'Transcription or translation service is unavailable')
+                return
+
+            seen = set()
+            known = known_words(document.user, document.target_language)
+            word_counts = Counter()
+            translated_words = 0
+            chunk_progress = [0, 1]
+
+            def on_chunk(done, total):
+                chunk_progress[:] = [done, total]
+
+            chunks = transcription_service.iter_video_chunks(
+                document.pdf_file.path,
+                language='en',
+                progress_callback=on_chunk,
+                content_hash=document.content_hash
+            )
+            for index, segments in in_index_order(chunks):
+                words = []
+                locations = {}
+                position = 0
+                for segment in segments:
+                    word_counts.update(tokenize(segment['text']))
+                    for word in clean_text(segment['text']):
+                        if word not in seen:
+                            seen.add(word)
+                            words.append(word)
+                            locations[word] = (position, segment['start'])
+                        position += 1
+
+                unknown = [word for word in words if word not in known]
+                self.counters['known_words_skipped'] += len(words) - len(unknown)
+                words = unknown
+                word_entries = []
+                for i in range(0, len(words), 100):
+                    self.check_cancelled()
+                    batch = words[i:i + 100]
+                    translations = self.translate(translation_service, batch, document.target_language)
+                    for word, trans in zip(batch, translations):
+                        if trans:
+                            position, timestamp = locations[word]
+                            word_entries.append(
+                                WordEntry(
+                                    document=document,
+                                    original_text=word,
+                                    target_language=document.target_language,
+                                    translated_text=trans,
+                                    page_number=index + 1,
+                                    position=position,
+                                    count=word_counts[word],
+                                    timestamp=timestamp
+                                )
+                            )
+                self.store(word_entries)
+                translated_words += len(word_entries)
+
+                done, total = chunk_progress
+                document.translation_progress = min(int(done / total * 100), 99)
+                document.total_words = len(seen)
+                document.translated_words = translated_words
+                self.save_progress(document, 'total_words')
+                send_progress_update(
+                    self.document_id,
+                    document.translation_progress,
+                    translated_words,
+                    len(seen)
+                )
+
+            if not seen:
+                self.mark_failed(document, 'No speech found in the video')
+                return
+
+            # Words stored with an earlier chunk kept occurring in later ones
+            with self.stage('store'):
+                write_queue.write(store_counts, document, word_counts)
+            document.translation_status = 'completed'
+            document.translation_progress = 100
+            write_queue.write(document.save)
+            send_progress_update(self.document_id, 100, translated_words, len(seen))
+            self.counters['words'] = len(seen)
+            self.finish('completed')
+            logger.info(f"Video translation completed for document {self.document_id}")
+        except JobCancelled:
+            self.cancelled()
+        except Exception as e:
+            logger.error(f"Video translation error for document {self.document_id}: {str(e)}")
+            logger.error(traceback.format_exc())
+            try:
+                if not document:
+                    document = PDFDocument.objects.get(id=self.document_id)
+                self.mark_failed(document, 'Unexpected error during video processing')
+            except Exception as inner_e:
+                logger.error(f"Failed to update document status: {str(inner_e)}")
+
+
+def start_video_translation(document_id):
+    """Queue transcribing and translating a video to run in the background."""
+    return schedule(VideoTranslationTask(document_id))
+
+
+def start_word_list_import(document_id, create_flashcards=False):
+    """Queue a word list import to run in the background."""
+    return schedule(WordListImportTask(document_id, create_flashcards=create_flashcards))
+
+
+def delete_chunk(queryset, chunk_size):
+    """
+    Delete up to ``chunk_size`` rows of ``queryset`` with a single
+    DELETE, without loading them or walking their relations. Returns the
+    number of rows deleted.
+    """
+    ids = list(queryset.values_list('id', flat=True)[:chunk_size])
+    if not ids:
+        return 0
+    # Dependents are deleted first, so the cascade Django would run is empty
+    return queryset.model.all_objects.filter(id__in=ids)._raw_delete(queryset.db)
+
+
+def purge_document(document_id, chunk_size=None):
+    """
+    Remove a soft-deleted document: its flashcards and word entries in
+    chunks of PURGE_CHUNK_SIZE rows, one short transaction per chunk so
+    other writers are never blocked for long, then its file and row.
+    Safe to run again after an interruption.
+    """
+    chunk_size = chunk_size or settings.PURGE_CHUNK_SIZE
+    document = PDFDocument.all_objects.get(id=document_id, deleted_at__isnull=False)
+    for queryset in (
+        Flashcard.all_objects.filter(word_entry__document_id=document_id),
+        WordEntry.all_objects.filter(document_id=document_id),
+    ):
+        while write_queue.write(delete_chunk, queryset, chunk_size):
+            pass
+    # Spend stays in the reports after the document is gone
+    write_queue.write(
+        TranslationUsage.objects.filter(document_id=document_id).update, document=None
+    )
+    if document.pdf_file:
+        document.pdf_file.delete(save=False)
+    rows = PDFDocument.all_objects.filter(id=document_id)
+    write_queue.write(rows._raw_delete, rows.db)
+    logger.info(f"Purged document {document_id}")
+
+
+class PurgeTask(threading.Thread):
+    """Purge a soft-deleted document in the background."""
+
+    def __init__(self, document_id):
+        super().__init__()
+        self.document_id = document_id
+        self.daemon = True
+
+    def run(self):
+        try:
+            purge_document(self.document_id)
+        except Exception as e:
+            logger.error(f"Failed to purge document {self.document_id}: {str(e)}")
+            logger.error(traceback.format_exc())
+
+
+def start_purge(document_id):
+    """Start purging a soft-deleted document in a background thread."""
+    task = PurgeTask(document_id)
     task.start()
-    return task 
\ No newline at end of file
+    return task
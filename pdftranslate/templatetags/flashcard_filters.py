@@ -8,4 +8,17 @@ def multiply(value, arg):
     try:
         return int(value) * int(arg)
     except (ValueError, TypeError):
-        return 0 
\ No newline at end of file
+        return 0 
+
+@register.filter
+def as_timestamp(seconds):
+    """Format a number of seconds as m:ss or h:mm:ss"""
+    try:
+        seconds = int(seconds)
+    except (ValueError, TypeError):
+        return ''
+    hours, rest = divmod(seconds, 3600)
+    minutes, seconds = divmod(rest, 60)
+    if hours:
+        return f'{hours}:{minutes:02d}:{seconds:02d}'
+    return f'{minutes}:{seconds:02d}'
@@ -1,6 +1,42 @@
-from django.test import TestCase
-from django.core.cache import cache
-from .translation_service import TranslationService
+import hashlib
+import io
+import itertools
+import json
+import os
+import queue
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+import zipfile
+from concurrent.futures import Future
+from unittest import mock
+from asgiref.sync import async_to_sync, iscoroutinefunction
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.core.cache import cache, caches
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.conf import settings
+from pathlib import Path
+from django.contrib.auth.models import User
+from .models import Flashcard, Lexeme, PDFDocument, TokenArtifact, TranslationUsage, WordEntry
+from .tasks import (
+    TranslationTask,
+    VideoTranslationTask,
+    WordListImportTask,
+    cancel_job,
+    purge_document,
+    store_word_entries,
+)
+from .google_translate_service import GoogleTranslateService
+from .transcription_service import TranscriptionService, transcript_cache_key
+from .profiling import profile
+from .write_queue import WriteQueue
+from .job_scheduler import JobScheduler, QueueFull
+from .translation_usage import TrackedTranslator
+from .translation_service import TranslationService, parse_translations, reply_tokens, token_batches
 
 
 class CacheTest(TestCase):
@@ -38,3 +74,1336 @@ class CacheTest(TestCase):
         # Verify the translations are not None
         self.assertNotIn(None, translations1)
         self.assertNotIn(None, translations2)
+
+
+class TranslationCacheTableTest(TestCase):
+    def test_migration_creates_missing_cache_table(self):
+        from importlib import import_module
+        from django.apps import apps
+        from django.core.cache import caches
+        from django.db import connection
+        migration = import_module('pdftranslate.migrations.0020_translation_cache_table')
+        with connection.cursor() as cursor:
+            cursor.execute('DROP TABLE translation_cache')
+
+        migration.create_cache_tables(apps, mock.Mock(connection=connection))
+
+        self.assertIn('translation_cache', connection.introspection.table_names())
+        caches['translations'].set_many({'moon': 'luna'})
+        self.assertEqual(caches['translations'].get_many(['moon']), {'moon': 'luna'})
+
+
+def chat_reply(content, finish_reason='stop'):
+    message = mock.Mock(content=content)
+    return mock.Mock(choices=[mock.Mock(message=message, finish_reason=finish_reason)])
+
+
+@override_settings(OPENAI_TRANSLATION_BATCH_TOKENS=40)
+class OpenAITranslationServiceTest(TestCase):
+    def setUp(self):
+        patcher = mock.patch('pdftranslate.translation_service.OpenAI')
+        self.client = patcher.start().return_value
+        self.addCleanup(patcher.stop)
+        self.client.api_key = 'test'
+        sleep = mock.patch('pdftranslate.translation_service.time.sleep')
+        sleep.start()
+        self.addCleanup(sleep.stop)
+        self.requests = []
+
+    def reply(self, skip_once=()):
+        skipped = set()
+
+        def create(messages, **kwargs):
+            words = json.loads(messages[-1]['content'])
+            self.requests.append(words)
+            missing = {word for word in words if word in skip_once and word not in skipped}
+            skipped.update(missing)
+            # Keys in another order and case than asked, minus the skipped words
+            return chat_reply(json.dumps({
+                word.upper(): f'{word}-es' for word in reversed(words) if word not in missing
+            }))
+        return create
+
+    def test_words_are_batched_by_token_budget_and_mapped_by_key(self):
+        self.client.chat.completions.create.side_effect = self.reply()
+        words = ['moon', 'window', 'extraordinarily', 'cat', 'sky', 'house']
+        translations = TranslationService().translate_words(words, target_language='es')
+
+        self.assertEqual(translations, [f'{word}-es' for word in words])
+        self.assertGreater(len(self.requests), 1)
+        self.assertEqual(sorted(sum(self.requests, [])), sorted(words))
+        kwargs = self.client.chat.completions.create.call_args.kwargs
+        self.assertEqual(kwargs['model'], settings.OPENAI_TRANSLATION_MODEL)
+        self.assertEqual(kwargs['response_format'], {'type': 'json_object'})
+
+    def test_only_missing_words_are_retried(self):
+        self.client.chat.completions.create.side_effect = self.reply(skip_once={'window'})
+        words = ['moon', 'window', 'cat']
+        translations = TranslationService().translate_words(words, target_language='es')
+
+        self.assertEqual(translations, ['moon-es', 'window-es', 'cat-es'])
+        self.assertEqual(len(self.requests), len(list(token_batches(words, 40))) + 1)
+        self.assertEqual(self.requests[-1], ['window'])
+
+    def test_capitalized_words_match_reply_keys(self):
+        self.assertEqual(
+            parse_translations('{"Hello": "Privet", "world": "mir"}', ['Hello', 'world']),
+            {'Hello': 'Privet', 'world': 'mir'}
+        )
+        self.client.chat.completions.create.side_effect = self.reply()
+        translations = TranslationService().translate_words(['Moon', 'cat'], target_language='es')
+
+        self.assertEqual(translations, ['Moon-es', 'cat-es'])
+        self.assertEqual(len(self.requests), 1)
+        kwargs = self.client.chat.completions.create.call_args.kwargs
+        self.assertEqual(kwargs['max_tokens'], reply_tokens(['Moon', 'cat']))
+
+    def test_failed_requests_raise_when_nothing_was_translated(self):
+        self.client.chat.completions.create.side_effect = RuntimeError('rate limited')
+        with self.assertRaises(RuntimeError):
+            TranslationService().translate_words(['moon'], target_language='es')
+        self.assertEqual(self.client.chat.completions.create.call_count, 3)
+
+    def test_usage_counts_every_request_and_retry(self):
+        self.client.chat.completions.create.side_effect = self.reply(skip_once={'window'})
+        translator = TrackedTranslator(TranslationService())
+        translator.translate_words(['moon', 'window', 'extraordinarily', 'cat'], 'es')
+
+        usage = translator.usage['es']
+        self.assertGreater(len(self.requests), 2)
+        self.assertEqual(usage['backend_calls'], len(self.requests))
+        self.assertEqual(usage['retries'], 1)
+
+
+class GoogleTranslateServiceTest(TestCase):
+    def setUp(self):
+        patcher = mock.patch('pdftranslate.google_translate_service.translate.Client')
+        self.client = patcher.start().return_value
+        self.addCleanup(patcher.stop)
+        sleep = mock.patch.object(GoogleTranslateService.request.retry, 'sleep')
+        sleep.start()
+        self.addCleanup(sleep.stop)
+
+    def test_usage_counts_every_request_and_retry(self):
+        failed = []
+
+        def translate(values, target_language, **kwargs):
+            if not failed:
+                failed.append(values)
+                raise ConnectionError('reset')
+            return [{'translatedText': f'{value}-{target_language}'} for value in values]
+        self.client.translate.side_effect = translate
+        words = [f'word{i}' for i in range(200)]
+        translator = TrackedTranslator(GoogleTranslateService())
+
+        translations = translator.translate_words(words, 'es')
+
+        self.assertEqual(translations, [f'{word}-es' for word in words])
+        usage = translator.usage['es']
+        # Two requests of up to 128 words, the first one sent twice
+        self.assertEqual(self.client.translate.call_count, 3)
+        self.assertEqual((usage['backend_calls'], usage['retries']), (3, 1))
+
+
+class WordEntryUpsertTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('reader', password='secret')
+        self.document = PDFDocument.objects.create(
+            user=self.user,
+            title='book.pdf'
+        )
+
+    def make_entries(self, translation):
+        return [
+            WordEntry(
+                document=self.document,
+                original_text=word,
+                translated_text=translation,
+                page_number=1,
+                position=pos
+            )
+            for pos, word in enumerate(['moon', 'earth'])
+        ]
+
+    def test_retried_batch_does_not_duplicate_words(self):
+        """Storing the same batch twice keeps one row per word"""
+        store_word_entries(self.make_entries('old'))
+        store_word_entries(self.make_entries('new'))
+
+        words = WordEntry.objects.filter(document=self.document)
+        self.assertEqual(words.count(), 2)
+        self.assertEqual(
+            set(words.values_list('lexeme__translation', flat=True)),
+            {'new'}
+        )
+
+    def test_documents_share_lexemes(self):
+        other = PDFDocument.objects.create(user=self.user, title='other.pdf')
+        store_word_entries(self.make_entries('luna'))
+        store_word_entries([
+            WordEntry(
+                document=other,
+                original_text='moon',
+                translated_text=None,
+                page_number=3,
+                position=1,
+                count=4
+            )
+        ])
+
+        self.assertEqual(Lexeme.objects.count(), 2)
+        moon = Lexeme.objects.get(word='moon', target_language='ru')
+        # A missing translation does not erase the shared one
+        self.assertEqual(moon.translation, 'luna')
+        self.assertEqual(
+            sorted(moon.occurrences.values_list('document__title', 'count')),
+            [('book.pdf', 1), ('other.pdf', 4)]
+        )
+
+
+@override_settings(INGESTION_QUEUE_BATCH_WINDOW=0.5)
+class WriteQueueTest(TransactionTestCase):
+    def test_writes_are_batched_and_failures_isolated(self):
+        writes = WriteQueue()
+        batches = []
+
+        def create(username):
+            batches.append(writes.thread.name)
+            return User.objects.create_user(username).username
+
+        futures = [
+            writes.submit(create, 'first'),
+            writes.submit(create, 'first'),
+            writes.submit(create, 'second'),
+        ]
+        self.assertEqual(futures[0].result(timeout=5), 'first')
+        self.assertEqual(futures[2].result(timeout=5), 'second')
+        with self.assertRaises(Exception):
+            futures[1].result(timeout=5)
+        self.assertEqual(
+            sorted(User.objects.values_list('username', flat=True)), ['first', 'second']
+        )
+        # The batch stops at the duplicate, then each write is retried alone
+        self.assertEqual(len(batches), 2 + 3)
+        self.assertEqual(set(batches), {'ingestion-writer'})
+
+    def test_writer_errors_fail_the_writes_instead_of_hanging(self):
+        writes = WriteQueue()
+        broken = mock.Mock(in_atomic_block=False)
+        broken.close_if_unusable_or_obsolete.side_effect = RuntimeError('connection gone')
+        with mock.patch('pdftranslate.write_queue.connection', broken):
+            future = writes.submit(User.objects.create_user, 'lost')
+            with self.assertRaises(RuntimeError):
+                future.result(timeout=5)
+        self.assertEqual(writes.write(User.objects.create_user, 'kept').username, 'kept')
+
+    def test_writes_left_by_a_dead_writer_thread_fail_on_restart(self):
+        writes = WriteQueue()
+        writes.pid = os.getpid()
+        orphan = Future()
+        writes.thread = threading.Thread(target=lambda: None)
+        writes.thread.start()
+        writes.thread.join()
+        writes.pending = queue.Queue()
+        writes.pending.put((orphan, User.objects.create_user, ('orphan',), {}))
+
+        self.assertEqual(writes.write(User.objects.create_user, 'after').username, 'after')
+        with self.assertRaises(RuntimeError):
+            orphan.result(timeout=5)
+        self.assertFalse(User.objects.filter(username='orphan').exists())
+
+    def test_flush_waits_for_submitted_writes(self):
+        writes = WriteQueue()
+        writes.submit(time.sleep, 0.2)
+        future = writes.submit(User.objects.create_user, 'late')
+        writes.flush()
+        self.assertTrue(future.done())
+
+    def test_writes_inside_a_transaction_run_inline(self):
+        from django.db import transaction
+        writes = WriteQueue()
+        with transaction.atomic():
+            writes.write(User.objects.create_user, 'inline')
+        self.assertIsNone(writes.thread)
+
+
+class FakeJob:
+    def __init__(self, document_id, ran, release=None):
+        self.document_id = document_id
+        self.ran = ran
+        self.release = release
+
+    def run(self):
+        self.ran.append(self.document_id)
+        if self.release:
+            self.release.wait(timeout=5)
+
+
+@override_settings(
+    TRANSLATION_MAX_CONCURRENT_JOBS=1,
+    TRANSLATION_MAX_QUEUED_JOBS=4,
+    TRANSLATION_MAX_QUEUED_JOBS_PER_USER=3,
+)
+class JobSchedulerTest(TestCase):
+    def setUp(self):
+        self.scheduler = JobScheduler()
+        self.ran = []
+        self.release = threading.Event()
+        self.addCleanup(self.release.set)
+        # Occupy the only worker so the next jobs have to wait
+        self.scheduler.submit(FakeJob(0, self.ran, self.release), user_id=1)
+        for _ in range(50):
+            if self.ran:
+                break
+            time.sleep(0.01)
+
+    @override_settings(TRANSLATION_MAX_QUEUED_JOBS=5)
+    def test_users_take_turns(self):
+        for document_id, user_id in [(1, 1), (2, 1), (3, 1), (4, 2), (5, 3)]:
+            self.scheduler.submit(FakeJob(document_id, self.ran), user_id)
+
+        self.assertIsNone(self.scheduler.position(0))
+        self.assertEqual(self.scheduler.position(4), 2)
+        self.assertEqual(self.scheduler.position(3), 5)
+
+        self.release.set()
+        for _ in range(50):
+            if len(self.ran) == 6:
+                break
+            time.sleep(0.01)
+        self.assertEqual(self.ran, [0, 1, 4, 5, 2, 3])
+
+    @override_settings(TRANSLATION_MAX_QUEUED_JOBS=5)
+    def test_priority_only_reorders_the_users_own_jobs(self):
+        for document_id, user_id, priority in [(1, 1, 0), (2, 1, 1), (3, 1, 1), (4, 2, 0)]:
+            self.scheduler.submit(FakeJob(document_id, self.ran), user_id, priority)
+
+        self.assertEqual(
+            [self.scheduler.position(document_id) for document_id in (2, 4, 3, 1)],
+            [1, 2, 3, 4]
+        )
+        # Reprioritizing a user's only job keeps their turn
+        self.assertTrue(self.scheduler.reprioritize(4, -1))
+        self.assertEqual(self.scheduler.position(4), 2)
+
+    def test_tracks_waiting_and_running_jobs(self):
+        self.scheduler.submit(FakeJob(1, self.ran), user_id=2)
+
+        self.assertTrue(self.scheduler.tracks(0))
+        self.assertTrue(self.scheduler.tracks(1))
+        self.assertFalse(self.scheduler.tracks(2))
+
+    def test_refuses_jobs_once_the_queue_is_full(self):
+        for document_id in (1, 2, 3):
+            self.scheduler.submit(FakeJob(document_id, self.ran), user_id=1)
+        self.assertFalse(self.scheduler.admits(1))
+        with self.assertRaises(QueueFull):
+            self.scheduler.submit(FakeJob(4, self.ran), user_id=1)
+
+        self.assertTrue(self.scheduler.admits(2))
+        self.scheduler.submit(FakeJob(5, self.ran), user_id=2)
+        self.assertFalse(self.scheduler.admits(3))
+        self.assertEqual(self.ran, [0])
+
+    def test_priority_and_cancellation(self):
+        self.scheduler.submit(FakeJob(1, self.ran), user_id=1)
+        self.scheduler.submit(FakeJob(2, self.ran), user_id=1)
+        self.scheduler.submit(FakeJob(3, self.ran), user_id=2, priority=1)
+        # Priority does not let a user skip other users' turns
+        self.assertEqual(self.scheduler.position(3), 2)
+
+        self.assertTrue(self.scheduler.reprioritize(2, 2))
+        self.assertEqual(self.scheduler.position(2), 1)
+        self.assertTrue(self.scheduler.cancel(1))
+        self.assertFalse(self.scheduler.cancel(0))
+
+        self.release.set()
+        for _ in range(50):
+            if len(self.ran) == 3:
+                break
+            time.sleep(0.01)
+        self.assertEqual(self.ran, [0, 2, 3])
+
+
+class UploadPDFTest(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        self.user = User.objects.create_user('reader', password='secret')
+        self.client.force_login(self.user)
+
+    def upload(self, name, content):
+        with override_settings(MEDIA_ROOT=self.media_root), \
+                mock.patch('pdftranslate.views.start_translation') as start:
+            response = self.client.post('/upload/', {
+                'pdf_file': SimpleUploadedFile(name, content),
+                'target_language': 'es',
+            })
+        return response, start
+
+    def test_upload_stores_file_and_content_hash(self):
+        content = b'%PDF-1.4\n1 0 obj << >> endobj\ntrailer << >>\n%%EOF\n'
+        response, start = self.upload('book.pdf', content)
+
+        self.assertRedirects(response, '/', fetch_redirect_response=False)
+        document = PDFDocument.objects.get(user=self.user)
+        self.assertEqual(
+            document.content_hash,
+            hashlib.sha256(content).hexdigest()
+        )
+        start.assert_called_once_with(document.id)
+
+    def test_upload_rejects_file_without_pdf_header(self):
+        response, start = self.upload('book.pdf', b'not a pdf at all')
+
+        self.assertRedirects(
+            response, '/upload/', fetch_redirect_response=False
+        )
+        self.assertFalse(PDFDocument.objects.exists())
+        start.assert_not_called()
+
+    def test_upload_is_turned_away_while_the_job_queue_is_full(self):
+        with mock.patch('pdftranslate.views.job_scheduler.admits', return_value=False):
+            response, start = self.upload('book.pdf', b'%PDF-1.4\n%%EOF\n')
+
+        self.assertRedirects(response, '/', fetch_redirect_response=False)
+        self.assertFalse(PDFDocument.objects.exists())
+        start.assert_not_called()
+
+    def test_upload_reports_queue_full_raised_after_the_check(self):
+        with override_settings(MEDIA_ROOT=self.media_root), \
+                mock.patch('pdftranslate.views.start_translation',
+                           side_effect=QueueFull('Too many documents are waiting to be processed')):
+            response = self.client.post('/upload/', {
+                'pdf_file': SimpleUploadedFile('book.pdf', b'%PDF-1.4\n%%EOF\n'),
+                'target_language': 'es',
+            }, follow=True)
+
+        self.assertContains(response, 'Too many documents are waiting to be processed. Please try again')
+        self.assertNotContains(response, 'An unexpected error occurred')
+
+    def test_retranslate_reports_queue_full_instead_of_failing(self):
+        document = PDFDocument.objects.create(
+            user=self.user, title='book.pdf', translation_status='completed'
+        )
+        with mock.patch('pdftranslate.views.start_translation',
+                        side_effect=QueueFull('Too many documents are waiting to be processed')):
+            response = self.client.post(
+                f'/retranslate/{document.id}/', {'target_language': 'de'}, follow=True
+            )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Too many documents are waiting to be processed. Please try again')
+
+    def test_retranslate_restarts_a_job_lost_in_a_restart(self):
+        document = PDFDocument.objects.create(
+            user=self.user, title='book.pdf', translation_status='pending'
+        )
+        with mock.patch('pdftranslate.views.job_scheduler.tracks', return_value=True), \
+                mock.patch('pdftranslate.views.start_translation') as start:
+            self.client.post(f'/retranslate/{document.id}/', {'target_language': 'es'})
+        start.assert_not_called()
+
+        with mock.patch('pdftranslate.views.start_translation') as start:
+            self.client.post(f'/retranslate/{document.id}/', {'target_language': 'es'})
+        start.assert_called_once_with(document.id)
+
+    def test_progress_reports_queue_position(self):
+        document = PDFDocument.objects.create(user=self.user, title='book.pdf')
+        with mock.patch('pdftranslate.views.job_scheduler.position', return_value=3):
+            response = self.client.get(f'/translation-progress/{document.id}/')
+
+        self.assertEqual(response.json()['status'], 'pending')
+        self.assertEqual(response.json()['queue_position'], 3)
+
+    def test_progress_stream_ends_for_cancelled_document(self):
+        document = PDFDocument.objects.create(
+            user=self.user, title='book.pdf', translation_status='cancelled'
+        )
+        response = self.client.get(f'/sse/progress/{document.id}/')
+
+        # One state event and a heartbeat, then the stream closes
+        events = list(itertools.islice(response.streaming_content, 3))
+        self.assertEqual(len(events), 2)
+        self.assertIn(b'"status": "cancelled"', events[0])
+
+
+SAMPLE_PDF = Path(settings.BASE_DIR) / 'media' / 'pdfs' / 'All_Around_The_Moon-9.pdf'
+
+
+class FakeTranslateService:
+    def translate_word(self, word, target_language='ru', source_language='en'):
+        return f'{word}-{target_language}'
+
+
+@mock.patch(
+    'pdftranslate.google_translate_service.GoogleTranslateService',
+    FakeTranslateService
+)
+class TranslationTaskTest(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        media = override_settings(MEDIA_ROOT=media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+
+        self.user = User.objects.create_user('reader', password='secret')
+        self.document = PDFDocument.objects.create(
+            user=self.user,
+            title='moon.pdf',
+            target_language='es'
+        )
+        self.document.pdf_file.save(
+            'moon.pdf',
+            ContentFile(SAMPLE_PDF.read_bytes())
+        )
+
+    def test_translates_unique_words(self):
+        TranslationTask(self.document.id).run()
+
+        self.document.refresh_from_db()
+        self.assertEqual(self.document.translation_status, 'completed')
+        self.assertTrue(self.document.extracted_text)
+        self.assertEqual(
+            self.document.words.count(),
+            self.document.total_words
+        )
+        self.assertEqual(
+            self.document.words.get(lexeme__word='window').translated_text,
+            'window-es'
+        )
+
+    def test_usage_is_recorded_and_repeat_jobs_hit_the_cache(self):
+        TranslationTask(self.document.id).run()
+        TranslationTask(self.document.id).run()
+
+        first, second = self.document.translation_usage.order_by('id')
+        self.assertEqual(first.backend, 'FakeTranslateService')
+        self.assertEqual(first.target_language, 'es')
+        self.assertEqual(first.words_requested, self.document.words.count())
+        self.assertEqual(first.cache_hits, 0)
+        self.assertGreater(first.characters, 0)
+        self.assertEqual(second.cache_hits, second.words_requested)
+        self.assertEqual((second.backend_calls, second.characters), (0, 0))
+
+    @override_settings(TRANSLATION_MAX_CONCURRENT_REQUESTS=2)
+    def test_translates_into_every_language_from_one_extraction(self):
+        self.document.extra_languages = ['de', 'fr']
+        self.document.save()
+        task = TranslationTask(self.document.id)
+        task.run()
+
+        self.document.refresh_from_db()
+        self.assertEqual(self.document.translation_status, 'completed')
+        self.assertEqual(task.counters['pages'], 1)
+        for language in ('es', 'de', 'fr'):
+            words = self.document.words_in(language)
+            self.assertEqual(words.count(), self.document.total_words)
+            self.assertEqual(
+                words.get(lexeme__word='window').translated_text, f'window-{language}'
+            )
+        self.assertEqual(
+            sorted(self.document.translation_usage.values_list('target_language', flat=True)),
+            ['de', 'es', 'fr']
+        )
+
+        self.client.force_login(self.user)
+        response = self.client.get(
+            f'/translated-words/{self.document.id}/', {'language': 'fr'}
+        )
+        self.assertContains(response, 'window-fr')
+        self.assertNotContains(response, 'window-de')
+
+    def test_cancel_stops_the_job_before_its_next_batch(self):
+        def progress(document_id, progress, *args):
+            if progress:
+                cancel_job(document_id)
+
+        with mock.patch('pdftranslate.tasks.send_progress_update', side_effect=progress):
+            TranslationTask(self.document.id).run()
+
+        self.document.refresh_from_db()
+        self.assertEqual(self.document.translation_status, 'cancelled')
+        self.assertEqual(self.document.words.count(), 0)
+
+    def test_cancelled_job_does_not_start(self):
+        self.client.force_login(self.user)
+        self.client.post(f'/cancel/{self.document.id}/')
+        with mock.patch('pdftranslate.tasks.open_pdf') as open_pdf:
+            TranslationTask(self.document.id).run()
+
+        open_pdf.assert_not_called()
+        self.document.refresh_from_db()
+        self.assertEqual(self.document.translation_status, 'cancelled')
+
+    def test_known_words_are_not_translated_or_carded(self):
+        book_one = PDFDocument.objects.create(user=self.user, title='one.pdf', target_language='es')
+        store_word_entries([
+            WordEntry(document=book_one, original_text='window', translated_text='ventana',
+                      page_number=1, position=0),
+        ])
+        Flashcard.objects.create(
+            word_entry=book_one.words.get(), user=self.user, review_count=5
+        )
+        with tempfile.NamedTemporaryFile('w', suffix='.txt', delete=False) as stopword_file:
+            stopword_file.write('# articles\nthe\n')
+        self.addCleanup(os.remove, stopword_file.name)
+
+        with override_settings(TRANSLATION_STOPWORDS_FILE=stopword_file.name):
+            task = TranslationTask(self.document.id)
+            task.run()
+            created = self.document.create_all_flashcards(self.user)
+
+        self.document.refresh_from_db()
+        self.assertEqual(task.counters['known_words_skipped'], 2)
+        words = set(self.document.words.values_list('lexeme__word', flat=True))
+        self.assertNotIn('window', words)
+        self.assertNotIn('the', words)
+        self.assertEqual(
+            self.document.translation_usage.get().words_requested,
+            self.document.total_words - 2
+        )
+        self.assertEqual(created, len(words))
+
+        # A word mastered in Spanish is still new in German
+        self.document.extra_languages = ['de']
+        self.document.save()
+        TranslationTask(self.document.id).run()
+        self.assertTrue(self.document.words_in('de').filter(lexeme__word='window').exists())
+
+    def test_retranslate_reuses_token_artifact(self):
+        self.document.content_hash = 'a' * 64
+        self.document.save()
+        TranslationTask(self.document.id).run()
+        artifact = TokenArtifact.objects.get(content_hash='a' * 64)
+        words, first_locations, counts = artifact.unpack()
+        self.assertEqual(artifact.word_count, self.document.words.count())
+        self.assertEqual(
+            first_locations['window'],
+            (self.document.words.get(lexeme__word='window').page_number,
+             self.document.words.get(lexeme__word='window').position)
+        )
+        self.assertGreaterEqual(counts['window'], 1)
+        self.assertEqual(self.document.words.get(lexeme__word='window').count, counts['window'])
+
+        self.client.force_login(self.user)
+        with mock.patch('pdftranslate.views.start_translation') as start, \
+                mock.patch('pdftranslate.tasks.open_pdf') as open_pdf:
+            self.client.post(
+                f'/retranslate/{self.document.id}/', {'target_language': 'fr'}
+            )
+            start.assert_called_once_with(self.document.id)
+            task = TranslationTask(self.document.id)
+            task.run()
+        open_pdf.assert_not_called()
+        self.assertEqual(task.counters['token_artifact_hits'], 1)
+
+        self.document.refresh_from_db()
+        self.assertEqual(self.document.translation_status, 'completed')
+        self.assertTrue(self.document.extracted_text)
+        self.assertEqual(
+            self.document.words_in('fr').get(lexeme__word='window').translated_text,
+            'window-fr'
+        )
+
+    @override_settings(PDF_LARGE_DOCUMENT_PAGES=1, PDF_PAGE_WINDOW=1)
+    def test_large_document_mode_does_not_keep_page_texts(self):
+        TranslationTask(self.document.id).run()
+
+        self.document.refresh_from_db()
+        self.assertEqual(self.document.translation_status, 'completed')
+        self.assertIsNone(self.document.extracted_text)
+        self.assertTrue(self.document.words.exists())
+
+    @override_settings(PDF_LARGE_DOCUMENT_PAGES=1, PDF_JOB_MEMORY_LIMIT_MB=64)
+    def test_large_document_fails_past_memory_limit(self):
+        with mock.patch(
+            'pdftranslate.pdf_utils.current_rss_mb',
+            side_effect=[100, 1000, 1000]
+        ):
+            TranslationTask(self.document.id).run()
+
+        self.document.refresh_from_db()
+        self.assertEqual(self.document.translation_status, 'failed')
+        self.assertIn('Memory limit', self.document.failure_reason)
+        self.assertFalse(self.document.words.exists())
+
+
+class ExportTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('reader', password='secret')
+        self.client.force_login(self.user)
+        self.document = PDFDocument.objects.create(
+            user=self.user,
+            title='moon.pdf'
+        )
+        store_word_entries([
+            WordEntry(
+                document=self.document,
+                original_text=word,
+                translated_text=translation,
+                page_number=1,
+                position=pos
+            )
+            for pos, (word, translation) in enumerate([
+                ('moon', 'luna'),
+                ('earth', 'tierra'),
+            ])
+        ])
+        self.document.create_all_flashcards(self.user)
+
+    def test_export_words_as_csv(self):
+        response = self.client.get(f'/export/words/{self.document.id}/csv/')
+
+        self.assertTrue(response.streaming)
+        content = b''.join(response.streaming_content).decode()
+        self.assertEqual(content.splitlines(), [
+            'original,translation,page,position',
+            'moon,luna,1,0',
+            'earth,tierra,1,1',
+        ])
+
+    def test_export_flashcards_as_anki_package(self):
+        response = self.client.get('/export/flashcards/apkg/')
+
+        self.assertEqual(response.status_code, 200)
+        package = zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content)))
+        with tempfile.NamedTemporaryFile(suffix='.anki2') as collection:
+            collection.write(package.read('collection.anki2'))
+            collection.flush()
+            connection = sqlite3.connect(collection.name)
+            fields = [row[0] for row in connection.execute('SELECT flds FROM notes')]
+            cards = connection.execute('SELECT count(*) FROM cards').fetchone()[0]
+            connection.close()
+        self.assertCountEqual(fields, ['moon\x1fluna', 'earth\x1ftierra'])
+        self.assertEqual(cards, 2)
+
+    def test_export_filename_with_quotes_and_non_ascii_title(self):
+        self.document.title = 'Луна "и" земля.pdf'
+        self.document.save()
+
+        response = self.client.get(f'/export/words/{self.document.id}/csv/')
+
+        self.assertEqual(
+            response['Content-Disposition'],
+            "attachment; filename*=utf-8''%D0%9B%D1%83%D0%BD%D0%B0%20%22%D0%B8%22%20"
+            "%D0%B7%D0%B5%D0%BC%D0%BB%D1%8F.csv"
+        )
+
+        self.document.title = 'the "moon"\r\n.pdf'
+        self.document.save()
+
+        response = self.client.get(f'/export/words/{self.document.id}/csv/')
+
+        self.assertEqual(
+            response['Content-Disposition'], 'attachment; filename="the \\"moon\\".csv"'
+        )
+
+    def test_export_flashcards_rejects_non_integer_document_id(self):
+        response = self.client.get('/export/flashcards/csv/?document_id=moon')
+
+        self.assertEqual(response.status_code, 400)
+
+    def test_export_other_users_document_is_not_found(self):
+        other = User.objects.create_user('other', password='secret')
+        self.client.force_login(other)
+
+        response = self.client.get(f'/export/words/{self.document.id}/csv/')
+
+        self.assertEqual(response.status_code, 404)
+
+
+class FlashcardViewsTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('reader', password='secret')
+        self.client.force_login(self.user)
+        self.document = PDFDocument.objects.create(user=self.user, title='moon.pdf')
+        store_word_entries([
+            WordEntry(
+                document=self.document,
+                original_text=f'word{pos}',
+                translated_text=f'translation{pos}',
+                page_number=1,
+                position=pos
+            )
+            for pos in range(15)
+        ])
+        self.document.create_all_flashcards(self.user)
+
+    def test_list_pages_through_cards(self):
+        response = self.client.get('/flashcards/', {'page': 2})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['total_cards'], 15)
+        self.assertEqual(len(response.context['flashcards']), 3)
+        self.assertContains(response, 'moon.pdf')
+        self.assertContains(response, self.user.username)
+        self.assertEqual(
+            len(self.client.get('/flashcards/', {'page': 'last'}).context['flashcards']), 12
+        )
+
+    def test_review_moves_on_to_the_next_due_card(self):
+        response = self.client.get('/flashcards/review/')
+        card = response.context['flashcard']
+        self.assertEqual(response.context['total_due'], 15)
+        self.assertContains(response, card.word_entry.original_text)
+
+        response = self.client.post(
+            '/flashcards/review/', {'flashcard_id': card.pk, 'interval': 'good'}
+        )
+        card.refresh_from_db()
+        self.assertEqual(card.review_count, 1)
+        next_card = Flashcard.objects.get(pk=response.url.rstrip('/').rsplit('/', 1)[1])
+        self.assertNotEqual(next_card, card)
+
+        dashboard = self.client.get('/flashcards/dashboard/')
+        self.assertEqual(dashboard.context['cards_reviewed_today'], 1)
+        self.assertEqual(dashboard.context['cards_learned'], 1)
+        self.assertEqual(dashboard.context['current_streak'], 1)
+
+
+class DeleteDocumentTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('reader', password='secret')
+        self.client.force_login(self.user)
+        self.document = PDFDocument.objects.create(user=self.user, title='moon.pdf')
+        store_word_entries([
+            WordEntry(
+                document=self.document,
+                original_text=f'word{pos}',
+                translated_text=f'translation{pos}',
+                page_number=1,
+                position=pos
+            )
+            for pos in range(25)
+        ])
+        self.document.create_all_flashcards(self.user)
+        TranslationUsage.objects.create(
+            document=self.document, backend='FakeTranslateService', target_language='ru'
+        )
+
+    def test_delete_hides_document_and_purge_removes_rows(self):
+        with mock.patch('pdftranslate.views.start_purge') as start_purge:
+            self.client.post(f'/delete/{self.document.id}/')
+        start_purge.assert_called_once_with(self.document.id)
+
+        self.assertFalse(PDFDocument.objects.filter(id=self.document.id).exists())
+        self.assertFalse(WordEntry.objects.filter(document_id=self.document.id).exists())
+        self.assertFalse(Flashcard.objects.filter(user=self.user).exists())
+        self.assertEqual(WordEntry.all_objects.filter(document_id=self.document.id).count(), 25)
+        self.assertEqual(
+            self.client.get(f'/translated-words/{self.document.id}/').status_code, 404
+        )
+
+        # A job still holding the document cannot undelete it
+        self.document.translation_status = 'failed'
+        self.document.save()
+        self.assertFalse(PDFDocument.objects.filter(id=self.document.id).exists())
+
+        purge_document(self.document.id, chunk_size=10)
+        self.assertFalse(PDFDocument.all_objects.filter(id=self.document.id).exists())
+        self.assertFalse(WordEntry.all_objects.exists())
+        self.assertFalse(Flashcard.all_objects.exists())
+        self.assertIsNone(TranslationUsage.objects.get().document)
+
+
+@mock.patch(
+    'pdftranslate.google_translate_service.GoogleTranslateService',
+    FakeTranslateService
+)
+class WordListImportTest(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        media = override_settings(MEDIA_ROOT=media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+        self.user = User.objects.create_user('teacher', password='secret')
+
+    def test_import_csv_with_flashcards(self):
+        document = PDFDocument.objects.create(
+            user=self.user,
+            title='Unit 1',
+            source_type='word_list',
+            target_language='es'
+        )
+        document.pdf_file.save(
+            'unit1.csv',
+            ContentFile(b'word,translation\nHouse,casa\ntree,\nhouse,casa\n')
+        )
+
+        WordListImportTask(document.id, create_flashcards=True).run()
+
+        document.refresh_from_db()
+        self.assertEqual(document.translation_status, 'completed')
+        self.assertEqual(document.total_words, 2)
+        self.assertEqual(
+            {word.original_text: word.translated_text for word in document.words.all()},
+            {'house': 'casa', 'tree': 'tree-es'}
+        )
+        self.assertEqual(Flashcard.objects.filter(user=self.user).count(), 2)
+
+    def test_imported_translations_stay_in_the_importing_document(self):
+        reader = User.objects.create_user('reader', password='secret')
+        book = PDFDocument.objects.create(user=reader, title='moon.pdf', target_language='es')
+        store_word_entries([
+            WordEntry(document=book, original_text='bank', translated_text='banco',
+                      page_number=1, position=0),
+        ])
+        word_list = PDFDocument.objects.create(
+            user=self.user, title='Rivers', source_type='word_list', target_language='es'
+        )
+        word_list.pdf_file.save('rivers.csv', ContentFile(b'bank,orilla\nriver,\n'))
+
+        WordListImportTask(word_list.id).run()
+
+        self.assertEqual(book.words.get().translated_text, 'banco')
+        self.assertEqual(Lexeme.objects.get(word='bank').translation, 'banco')
+        self.assertEqual(
+            word_list.words.get(lexeme__word='bank').translated_text, 'orilla'
+        )
+        self.client.force_login(self.user)
+        response = self.client.get(f'/export/words/{word_list.id}/csv/')
+        self.assertIn('bank,orilla', b''.join(response.streaming_content).decode())
+
+    def test_import_command_reads_plain_word_list(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.txt', delete=False) as word_list:
+            word_list.write('moon\n\nstar\n')
+        self.addCleanup(os.remove, word_list.name)
+
+        call_command(
+            'import_word_list', word_list.name,
+            user='teacher', language='fr', stdout=io.StringIO()
+        )
+
+        document = PDFDocument.objects.get(user=self.user)
+        self.assertEqual(document.source_type, 'word_list')
+        self.assertEqual(document.translation_status, 'completed')
+        self.assertEqual(
+            sorted(document.words.values_list('lexeme__translation', flat=True)),
+            ['moon-fr', 'star-fr']
+        )
+
+
+class TranscriptionServiceTest(TestCase):
+    @override_settings(OPENAI_API_KEY='test-key')
+    def setUp(self):
+        self.service = TranscriptionService(chunk_seconds=600, max_workers=2)
+        self.transcripts = {
+            'chunk0.ogg': [{'start': 0.0, 'end': 2.0, 'text': 'hello'}],
+            'chunk1.ogg': [{'start': 1.0, 'end': 3.0, 'text': 'world'}],
+        }
+        split = mock.patch.object(
+            self.service, 'split_audio',
+            side_effect=lambda audio_path, chunk_dir: [(0, 'chunk0.ogg'), (600, 'chunk1.ogg')]
+        )
+        split.start()
+        self.addCleanup(split.stop)
+        self.audio = tempfile.NamedTemporaryFile(suffix='.ogg', delete=False)
+        self.audio.close()
+
+    def transcribe(self, path, language):
+        return self.transcripts[path]
+
+    def test_chunks_are_stitched_with_time_offsets(self):
+        progress = []
+        with mock.patch.object(self.service, 'transcribe_chunk', side_effect=self.transcribe):
+            segments = self.service.transcribe_segments(
+                self.audio.name,
+                progress_callback=lambda done, total: progress.append((done, total))
+            )
+
+        self.assertEqual(segments, [
+            {'start': 0.0, 'end': 2.0, 'text': 'hello'},
+            {'start': 601.0, 'end': 603.0, 'text': 'world'},
+        ])
+        self.assertEqual(progress, [(1, 2), (2, 2)])
+        self.assertFalse(os.path.exists(self.audio.name))
+
+    def test_transcript_is_cached_by_video_content(self):
+        with tempfile.NamedTemporaryFile(suffix='.mp4') as video, \
+                mock.patch.object(self.service, 'extract_audio', return_value=self.audio.name), \
+                mock.patch.object(self.service, 'transcribe_chunk', side_effect=self.transcribe) as transcribe:
+            video.write(b'lecture')
+            video.flush()
+            first = self.service.process_video(video.name)
+            second = self.service.process_video(video.name)
+
+        self.assertEqual(first, 'hello world')
+        self.assertEqual(second, first)
+        self.assertEqual(transcribe.call_count, 2)
+
+    def test_transcript_is_shared_and_keyed_by_the_documents_hash(self):
+        with mock.patch.object(self.service, 'extract_audio', return_value=self.audio.name), \
+                mock.patch.object(self.service, 'transcribe_chunk', side_effect=self.transcribe), \
+                mock.patch('pdftranslate.transcription_service.file_sha256') as file_sha256:
+            segments = self.service.transcribe_video('lecture.mp4', content_hash='abc123')
+
+        file_sha256.assert_not_called()
+        self.assertEqual(
+            caches['translations'].get(transcript_cache_key('abc123', None)),
+            [[segments[0]], [segments[1]]]
+        )
+
+
+class FakeTranscriptionService:
+    chunks = [
+        [{'start': 0.0, 'end': 2.0, 'text': 'The moon is bright.'}],
+        [{'start': 600.0, 'end': 602.0, 'text': 'The moon and the stars!'}],
+    ]
+
+    def iter_video_chunks(self, video_path, language=None, progress_callback=None,
+                          content_hash=None):
+        for index, segments in enumerate(self.chunks):
+            progress_callback(index + 1, len(self.chunks))
+            yield index, segments
+
+
+@mock.patch(
+    'pdftranslate.google_translate_service.GoogleTranslateService',
+    FakeTranslateService
+)
+@mock.patch(
+    'pdftranslate.transcription_service.TranscriptionService',
+    FakeTranscriptionService
+)
+class VideoTranslationTaskTest(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        media = override_settings(MEDIA_ROOT=media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+
+        self.user = User.objects.create_user('viewer', password='secret')
+        self.document = PDFDocument.objects.create(
+            user=self.user,
+            title='lecture.mp4',
+            source_type='video',
+            target_language='de'
+        )
+        self.document.pdf_file.save('lecture.mp4', ContentFile(b'video'))
+
+    def test_transcript_chunks_become_word_entries(self):
+        VideoTranslationTask(self.document.id).run()
+
+        self.document.refresh_from_db()
+        self.assertEqual(self.document.translation_status, 'completed')
+        self.assertEqual(self.document.total_words, 6)
+        words = {
+            word.original_text: (word.translated_text, word.page_number, word.timestamp)
+            for word in self.document.words.all()
+        }
+        self.assertEqual(words['moon'], ('moon-de', 1, 0.0))
+        self.assertEqual(words['stars'], ('stars-de', 2, 600.0))
+
+    def test_words_are_located_where_first_heard_when_chunks_finish_out_of_order(self):
+        def finish_last_chunk_first(service, video_path, language=None, progress_callback=None,
+                                    content_hash=None):
+            for index, segments in reversed(list(enumerate(service.chunks))):
+                yield index, segments
+
+        with mock.patch.object(FakeTranscriptionService, 'iter_video_chunks', finish_last_chunk_first):
+            VideoTranslationTask(self.document.id).run()
+
+        moon = self.document.words.get(lexeme__word='moon')
+        self.assertEqual((moon.page_number, moon.timestamp), (1, 0.0))
+
+
+class BenchPipelineCommandTest(TestCase):
+    def test_reports_stages_and_rolls_back(self):
+        output = io.StringIO()
+        call_command(
+            'bench_pipeline', str(SAMPLE_PDF),
+            '--synthetic-pages', '2',
+            stdout=output, stderr=io.StringIO()
+        )
+
+        report = json.loads(output.getvalue())
+        self.assertEqual(
+            [result['name'] for result in report['results']],
+            ['All_Around_The_Moon-9.pdf', 'synthetic-2p.pdf']
+        )
+        synthetic = report['results'][1]
+        self.assertEqual(synthetic['pages'], 2)
+        self.assertGreater(synthetic['unique_words'], 0)
+        self.assertGreater(synthetic['db_writes'], 0)
+        self.assertIn('translate', synthetic['stage_seconds'])
+        self.assertEqual(
+            synthetic['stage_peak_rss_mb'].keys(), synthetic['stage_seconds'].keys()
+        )
+        self.assertLessEqual(
+            max(synthetic['stage_peak_rss_mb'].values()), synthetic['peak_rss_mb']
+        )
+        self.assertFalse(PDFDocument.objects.exists())
+
+
+@mock.patch(
+    'pdftranslate.google_translate_service.GoogleTranslateService',
+    FakeTranslateService
+)
+class MetricsTest(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        media = override_settings(MEDIA_ROOT=media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+
+        user = User.objects.create_user('reader', password='secret')
+        self.document = PDFDocument.objects.create(user=user, title='moon.pdf')
+        self.document.pdf_file.save('moon.pdf', ContentFile(SAMPLE_PDF.read_bytes()))
+
+    def test_finished_job_is_exposed(self):
+        task = TranslationTask(self.document.id)
+        task.run()
+
+        self.assertEqual(task.counters['pages'], 1)
+        self.assertGreater(task.counters['backend_calls'], 0)
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        body = response.content.decode()
+        self.assertIn(
+            'bookland_job_stage_seconds_count{job="pdf",stage="translate"}', body
+        )
+        self.assertIn('bookland_jobs_total{job="pdf",status="completed"}', body)
+        self.assertIn(
+            'bookland_backend_request_seconds_count{backend="FakeTranslateService"}', body
+        )
+
+    @override_settings(METRICS_TOKEN='secret-token')
+    def test_token_is_required_when_configured(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+        response = self.client.get(
+            '/metrics', HTTP_AUTHORIZATION='Bearer secret-token'
+        )
+        self.assertEqual(response.status_code, 200)
+
+
+class LoadTestViewsCommandTest(TestCase):
+    def test_reports_every_view(self):
+        output = io.StringIO()
+        call_command(
+            'loadtest_views', '--sizes', '50', '--requests', '2',
+            stdout=output, stderr=io.StringIO()
+        )
+
+        results = json.loads(output.getvalue())['results']
+        self.assertEqual(
+            [result['view'] for result in results],
+            ['pdf_list', 'flashcard_list', 'flashcard_dashboard',
+             'flashcard_review', 'translated_words_list']
+        )
+        for result in results:
+            self.assertEqual(result['status_codes'], [200], result['view'])
+            self.assertGreater(result['queries'], 0)
+        self.assertFalse(User.objects.filter(username='loadtest-50').exists())
+
+
+class TranslationUsageReportTest(TestCase):
+    def test_reports_spend_and_hit_rate_per_language(self):
+        TranslationUsage.objects.create(
+            backend='GoogleTranslateService', target_language='es',
+            backend_calls=2, words_requested=200, characters=1_000_000, cache_hits=50
+        )
+        TranslationUsage.objects.create(
+            backend='GoogleTranslateService', target_language='es',
+            backend_calls=1, words_requested=100, characters=500_000, cache_hits=100
+        )
+        output = io.StringIO()
+        with override_settings(
+            TRANSLATION_COST_PER_MILLION_CHARACTERS={'GoogleTranslateService': 20}
+        ):
+            call_command('translation_usage_report', '--json', stdout=output)
+
+        [row] = json.loads(output.getvalue())['by_language']
+        self.assertEqual(row['jobs'], 2)
+        self.assertEqual(row['characters'], 1_500_000)
+        self.assertEqual(row['cost'], 30)
+        self.assertEqual(row['cache_hit_rate'], 0.5)
+
+
+class ProfilingTest(TestCase):
+    def setUp(self):
+        profile_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, profile_dir)
+        profiling = override_settings(PROFILING_DIR=profile_dir, PROFILING_MAX_FILES=2)
+        profiling.enable()
+        self.addCleanup(profiling.disable)
+        self.profile_dir = Path(profile_dir)
+
+    def test_staff_header_profiles_request(self):
+        staff = User.objects.create_user('admin', password='secret', is_staff=True)
+        self.client.force_login(staff)
+
+        response = self.client.get('/', HTTP_X_PROFILE='1')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue((self.profile_dir / response['X-Profile']).exists())
+
+    def test_header_is_ignored_for_other_users(self):
+        reader = User.objects.create_user('reader', password='secret')
+        self.client.force_login(reader)
+
+        response = self.client.get('/', HTTP_X_PROFILE='1')
+
+        self.assertNotIn('X-Profile', response)
+        self.assertEqual(list(self.profile_dir.iterdir()), [])
+
+    def test_nested_or_failing_profiles_run_unprofiled(self):
+        with profile('outer') as outer, profile('inner') as inner:
+            self.assertIsNotNone(outer)
+            self.assertIsNone(inner)
+        with mock.patch('pdftranslate.profiling.start_profiler', side_effect=ValueError('busy')):
+            with profile('job') as path:
+                self.assertIsNone(path)
+        self.assertEqual([p.name for p in self.profile_dir.iterdir()], [outer.name])
+
+    @override_settings(DEBUG=True)
+    def test_middleware_chain_stays_async_under_asgi(self):
+        from django.core.handlers.asgi import ASGIHandler
+        # Django logs every sync middleware it has to adapt (in DEBUG)
+        with self.assertNoLogs('django.request', level='DEBUG'):
+            handler = ASGIHandler()
+        self.assertTrue(iscoroutinefunction(handler._middleware_chain))
+
+    def test_staff_header_profiles_async_request(self):
+        staff = User.objects.create_user('admin', password='secret', is_staff=True)
+        self.async_client.force_login(staff)
+
+        response = async_to_sync(self.async_client.get)('/', headers={'X-Profile': '1'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue((self.profile_dir / response['X-Profile']).exists())
+
+    def test_async_request_is_not_profiled_with_cprofile(self):
+        staff = User.objects.create_user('admin', password='secret', is_staff=True)
+        self.async_client.force_login(staff)
+
+        with mock.patch('pdftranslate.profiling.SamplingProfiler', None):
+            response = async_to_sync(self.async_client.get)('/', headers={'X-Profile': '1'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('X-Profile', response)
+        self.assertEqual(list(self.profile_dir.iterdir()), [])
+
+    @override_settings(PROFILING_ENABLED=True, PROFILING_SAMPLE_RATE=1)
+    def test_sampled_profiles_are_rotated(self):
+        for _ in range(4):
+            self.client.get('/accounts/login/')
+
+        self.assertEqual(len(list(self.profile_dir.iterdir())), 2)
+
+
+@mock.patch(
+    'pdftranslate.google_translate_service.GoogleTranslateService',
+    FakeTranslateService
+)
+class PrewarmTranslationsTest(TestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.frequency_list = Path(directory) / 'frequency.txt'
+        self.frequency_list.write_text('the 100\nof 90\n42 80\nwindow 70\nthe 60\nmoon 50\n')
+        self.bilingual = Path(directory) / 'es.tsv'
+        self.bilingual.write_text('window\tventana\n')
+
+    def prewarm(self, *args):
+        output = io.StringIO()
+        call_command(
+            'prewarm_translations', str(self.frequency_list), *args, stdout=output
+        )
+        return output.getvalue()
+
+    def cached(self, language, word):
+        return TrackedTranslator(FakeTranslateService()).translate_words([word], language)[0]
+
+    def test_warms_top_words_using_bilingual_file_first(self):
+        output = self.prewarm(
+            '--top', '3', '--language', 'es', '--bilingual', f'es={self.bilingual}'
+        )
+
+        self.assertIn('2 translated, 1 from bilingual file', output)
+        self.assertEqual(self.cached('es', 'window'), 'ventana')
+        usage = TranslationUsage.objects.get()
+        # 'the' and 'of', one request each from a backend without translate_words
+        self.assertEqual((usage.backend_calls, usage.characters), (2, 5))
+
+    def test_rerun_is_a_no_op(self):
+        self.prewarm('--language', 'de', '--batch-size', '2')
+        output = self.prewarm('--language', 'de', '--batch-size', '2')
+        self.assertIn('already warm (4 words)', output)
+
+        output = self.prewarm('--language', 'de', '--restart')
+        self.assertIn('0 translated, 0 from bilingual file, 4 already cached', output)
+        self.assertEqual(TranslationUsage.objects.count(), 1)
+
+    def test_offline_mode_only_loads_bilingual_pairs(self):
+        output = self.prewarm(
+            '--offline', '--backend', 'FakeTranslateService',
+            '--language', 'es', '--bilingual', f'es={self.bilingual}'
+        )
+
+        self.assertIn('1 from bilingual file', output)
+        self.assertIn('3 left untranslated', output)
+        self.assertFalse(TranslationUsage.objects.exists())
+
+
+class ClearTranslationCacheTest(TestCase):
+    def setUp(self):
+        self.translator = TrackedTranslator(FakeTranslateService())
+        for language in ('es', 'de'):
+            self.translator.translate_words(['moon', 'window'], language)
+        self.translator.usage.clear()
+
+    def cache_hits(self, language, words=('moon', 'window')):
+        self.translator.translate_words(list(words), language)
+        hits = self.translator.usage[language]['cache_hits']
+        self.translator.usage.clear()
+        return hits
+
+    def test_language_filter_only_invalidates_that_language(self):
+        cache.set('session-like-key', 'kept')
+        call_command('clear_translation_cache', '--language', 'es', stdout=io.StringIO())
+
+        self.assertEqual(self.cache_hits('es'), 0)
+        self.assertEqual(self.cache_hits('de'), 2)
+        self.assertEqual(cache.get('session-like-key'), 'kept')
+
+    def test_backend_filter(self):
+        call_command(
+            'clear_translation_cache', '--backend', 'SomeOtherService', stdout=io.StringIO()
+        )
+        self.assertEqual(self.cache_hits('es'), 2)
+
+        call_command(
+            'clear_translation_cache', '--backend', 'FakeTranslateService', stdout=io.StringIO()
+        )
+        self.assertEqual(self.cache_hits('es'), 0)
+
+    def test_invalidated_translations_stay_gone_after_culling(self):
+        from django.core.cache import caches
+        from django.db import connection
+        from django.utils import timezone
+        call_command('clear_translation_cache', '--language', 'es', stdout=io.StringIO())
+
+        translations = caches['translations']
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT COUNT(*) FROM translation_cache')
+            count = cursor.fetchone()[0]
+            # Culls the lowest half of the keys, the 'de' entries among them
+            with mock.patch.object(translations, '_max_entries', 1), \
+                    mock.patch.object(translations, '_cull_frequency', 2):
+                translations._cull('default', cursor, timezone.now(), count)
+
+        self.assertEqual(self.cache_hits('es'), 0)
+
+    def test_word_filter_deletes_only_those_words(self):
+        call_command(
+            'clear_translation_cache', '--word', 'moon',
+            '--backend', 'FakeTranslateService', stdout=io.StringIO()
+        )
+
+        self.assertEqual(self.cache_hits('es', ['window']), 1)
+        self.assertEqual(self.cache_hits('de', ['moon']), 0)
@@ -1,57 +1,298 @@
 import os
+import csv
+import hashlib
 import logging
-import openai
-from moviepy.editor import VideoFileClip
+import shutil
+import subprocess
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from openai import OpenAI
+from tenacity import retry, stop_after_attempt, wait_exponential
+from .metrics import backend_call, record_retry
 import tempfile
 from django.conf import settings
+from django.core.cache import caches
+from .write_queue import write_queue
 
 logger = logging.getLogger(__name__)
 
+# Bump when extraction or chunking changes in a way that affects transcripts
+TRANSCRIPT_CACHE_VERSION = 1
+# Transcripts share the translation memory's cache, which every process
+# sees and which survives restarts
+TRANSCRIPT_CACHE = 'translations'
+READ_CHUNK_SIZE = 1024 * 1024
+
+
+def file_sha256(path):
+    """Hash a file without loading it into memory."""
+    hasher = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(READ_CHUNK_SIZE), b''):
+            hasher.update(block)
+    return hasher.hexdigest()
+
+
+def transcript_cache_key(content_hash, language, chunk=None):
+    key = f'transcript:v{TRANSCRIPT_CACHE_VERSION}:{content_hash}:{language or "auto"}'
+    if chunk is not None:
+        key += f':chunk{chunk}'
+    return key
+
+
 class TranscriptionService:
-    def __init__(self):
-        openai.api_key = settings.OPENAI_API_KEY
+    def __init__(self, chunk_seconds=None, max_workers=None):
+        self.client = OpenAI(api_key=settings.OPENAI_API_KEY)
+        self.chunk_seconds = chunk_seconds or settings.TRANSCRIPTION_CHUNK_SECONDS
+        self.max_workers = max_workers or settings.TRANSCRIPTION_MAX_WORKERS
 
     def extract_audio(self, video_path):
-        """Extract audio from video file."""
+        """
+        Extract the audio track as 16 kHz mono Opus, which is all speech
+        recognition needs and several times smaller than full-quality MP3.
+
+        Only the audio stream is decoded (``-vn``); ffmpeg writes the result
+        to a pipe that is copied to a temporary file block by block.
+        """
+        command = [
+            settings.FFMPEG_BINARY, '-nostdin', '-loglevel', 'error',
+            '-i', video_path,
+            '-vn', '-ac', '1', '-ar', '16000',
+            '-c:a', 'libopus', '-b:a', '24k',
+            '-f', 'ogg', 'pipe:1',
+        ]
         try:
-            video = VideoFileClip(video_path)
-            # Create a temporary file for the audio
-            with tempfile.NamedTemporaryFile(suffix='.mp3', delete=False) as temp_audio:
-                video.audio.write_audiofile(temp_audio.name, logger=None)
-                video.close()
+            with tempfile.NamedTemporaryFile(suffix='.ogg', delete=False) as temp_audio:
+                with subprocess.Popen(
+                    command, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+                ) as process:
+                    shutil.copyfileobj(process.stdout, temp_audio, READ_CHUNK_SIZE)
+                    errors = process.stderr.read().decode(errors='replace')
+                    if process.wait() != 0:
+                        os.remove(temp_audio.name)
+                        raise RuntimeError(f"ffmpeg failed: {errors.strip()}")
                 return temp_audio.name
         except Exception as e:
             logger.error(f"Error extracting audio: {str(e)}")
             raise
 
-    def transcribe_audio(self, audio_path, language=None):
-        """Transcribe audio file using OpenAI Whisper API."""
+    def split_audio(self, audio_path, chunk_dir):
+        """
+        Split an audio file into ``chunk_dir`` at ``chunk_seconds``
+        boundaries without re-encoding it.
+
+        Returns a list of ``(offset_seconds, chunk_path)`` tuples.
+        """
+        segment_list = os.path.join(chunk_dir, 'chunks.csv')
+        command = [
+            settings.FFMPEG_BINARY, '-nostdin', '-loglevel', 'error',
+            '-i', audio_path,
+            '-f', 'segment', '-segment_time', str(self.chunk_seconds),
+            '-segment_list', segment_list, '-segment_list_type', 'csv',
+            '-c', 'copy',
+            os.path.join(chunk_dir, 'chunk%04d.ogg'),
+        ]
+        result = subprocess.run(command, capture_output=True)
+        if result.returncode != 0:
+            raise RuntimeError(
+                f"ffmpeg failed: {result.stderr.decode(errors='replace').strip()}"
+            )
+        with open(segment_list, newline='') as f:
+            return [
+                (float(start), os.path.join(chunk_dir, file_name))
+                for file_name, start, _ in csv.reader(f)
+            ]
+
+    @retry(
+        stop=stop_after_attempt(3),
+        wait=wait_exponential(multiplier=1, min=4, max=10),
+        before_sleep=record_retry
+    )
+    def transcribe_chunk(self, audio_path, language=None):
+        """
+        Transcribe one audio chunk using OpenAI Whisper API.
+
+        Returns the chunk's segments as dicts with ``start``, ``end`` and
+        ``text``, timed relative to the start of the chunk. Failures are
+        retried for this chunk only.
+        """
+        with open(audio_path, 'rb') as audio_file:
+            params = {
+                'model': 'whisper-1',
+                'file': audio_file,
+                'response_format': 'verbose_json',
+            }
+            if language:
+                params['language'] = language
+            with backend_call('TranscriptionService'):
+                response = self.client.audio.transcriptions.create(**params)
+
+        segments = [
+            {
+                'start': segment.start,
+                'end': segment.end,
+                'text': segment.text.strip(),
+            }
+            for segment in (response.segments or [])
+        ]
+        if not segments and response.text:
+            segments = [{'start': 0, 'end': 0, 'text': response.text.strip()}]
+        return segments
+
+    def iter_transcribed_chunks(self, chunks, language=None, progress_callback=None,
+                                content_hash=None):
+        """
+        Transcribe ``(offset, path)`` chunks concurrently.
+
+        Yields ``(index, segments)`` as soon as each chunk is done, with the
+        segment times shifted by the chunk's offset. At most
+        ``max_workers`` chunks are uploaded at the same time.
+
+        With a ``content_hash`` every chunk's transcript is cached, so a
+        job that is retried after a failure only transcribes the chunks it
+        had not finished.
+        """
+        total = len(chunks)
+        completed = 0
+
+        def chunk_cache_key(index):
+            return transcript_cache_key(
+                content_hash, language, f'{self.chunk_seconds}s{index}'
+            )
+
+        def chunk_done(index, offset, segments):
+            nonlocal completed
+            completed += 1
+            logger.info(f"Transcribed chunk {completed}/{total}")
+            if progress_callback:
+                progress_callback(completed, total)
+            return index, [
+                {
+                    'start': segment['start'] + offset,
+                    'end': segment['end'] + offset,
+                    'text': segment['text'],
+                }
+                for segment in segments
+            ]
+
+        transcripts = caches[TRANSCRIPT_CACHE]
+        pending = []
+        for index, (offset, path) in enumerate(chunks):
+            cached = None
+            if content_hash:
+                cached = transcripts.get(chunk_cache_key(index))
+            if cached is None:
+                pending.append((index, offset, path))
+            else:
+                yield chunk_done(index, offset, cached)
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            futures = {
+                pool.submit(self.transcribe_chunk, path, language): (index, offset, path)
+                for index, offset, path in pending
+            }
+            try:
+                for future in as_completed(futures):
+                    index, offset, path = futures[future]
+                    segments = future.result()
+                    if content_hash:
+                        write_queue.write(
+                            transcripts.set,
+                            chunk_cache_key(index),
+                            segments,
+                            timeout=settings.TRANSCRIPT_CACHE_TTL
+                        )
+                    yield chunk_done(index, offset, segments)
+            finally:
+                for future in futures:
+                    future.cancel()
+
+    def transcribe_segments(self, audio_path, language=None, progress_callback=None,
+                            content_hash=None):
+        """Transcribe an audio file in parallel chunks and return its segments."""
         try:
-            with open(audio_path, 'rb') as audio_file:
-                response = openai.Audio.transcribe(
-                    "whisper-1",
-                    audio_file,
-                    language=language
-                )
-                return response['text']
-        except Exception as e:
-            logger.error(f"Error transcribing audio: {str(e)}")
-            raise
+            with tempfile.TemporaryDirectory(prefix='transcription-') as chunk_dir:
+                chunks = self.split_audio(audio_path, chunk_dir)
+                transcribed = dict(self.iter_transcribed_chunks(
+                    chunks, language, progress_callback, content_hash
+                ))
+            return [
+                segment
+                for index in sorted(transcribed)
+                for segment in transcribed[index]
+            ]
         finally:
             # Clean up the temporary audio file
             if os.path.exists(audio_path):
                 os.remove(audio_path)
 
-    def process_video(self, video_path, language=None):
+    def iter_video_chunks(self, video_path, language=None, progress_callback=None,
+                          content_hash=None):
+        """
+        Yield ``(index, segments)`` for a video's transcript chunk by chunk,
+        as soon as each chunk has been transcribed.
+
+        Transcripts are cached by the video's content hash (hashed here if
+        not given), so the same lecture uploaded again is not extracted or
+        transcribed twice.
+        """
+        content_hash = content_hash or file_sha256(video_path)
+        cache_key = transcript_cache_key(content_hash, language)
+        transcripts = caches[TRANSCRIPT_CACHE]
+        chunks = transcripts.get(cache_key)
+        if chunks is not None:
+            logger.info(f"Using cached transcript for video {content_hash}")
+            for index, segments in enumerate(chunks):
+                if progress_callback:
+                    progress_callback(index + 1, len(chunks))
+                yield index, segments
+            return
+
+        audio_path = self.extract_audio(video_path)
+        transcribed = {}
+        try:
+            with tempfile.TemporaryDirectory(prefix='transcription-') as chunk_dir:
+                chunks = self.split_audio(audio_path, chunk_dir)
+                for index, segments in self.iter_transcribed_chunks(
+                    chunks, language, progress_callback, content_hash
+                ):
+                    transcribed[index] = segments
+                    yield index, segments
+        finally:
+            if os.path.exists(audio_path):
+                os.remove(audio_path)
+        write_queue.write(
+            transcripts.set,
+            cache_key,
+            [transcribed[index] for index in sorted(transcribed)],
+            timeout=settings.TRANSCRIPT_CACHE_TTL
+        )
+
+    def transcribe_video(self, video_path, language=None, progress_callback=None,
+                         content_hash=None):
+        """Return the timed transcript segments of a video."""
+        transcribed = dict(self.iter_video_chunks(
+            video_path, language, progress_callback, content_hash
+        ))
+        return [
+            segment
+            for index in sorted(transcribed)
+            for segment in transcribed[index]
+        ]
+
+    def transcribe_audio(self, audio_path, language=None, progress_callback=None):
+        """Transcribe audio file using OpenAI Whisper API."""
+        try:
+            segments = self.transcribe_segments(audio_path, language, progress_callback)
+            return ' '.join(segment['text'] for segment in segments)
+        except Exception as e:
+            logger.error(f"Error transcribing audio: {str(e)}")
+            raise
+
+    def process_video(self, video_path, language=None, progress_callback=None):
         """Process video file and return transcribed text."""
         try:
-            # Extract audio from video
-            audio_path = self.extract_audio(video_path)
-            
-            # Transcribe the audio
-            transcribed_text = self.transcribe_audio(audio_path, language)
-            
-            return transcribed_text
+            segments = self.transcribe_video(video_path, language, progress_callback)
+            return ' '.join(segment['text'] for segment in segments)
         except Exception as e:
             logger.error(f"Error processing video: {str(e)}")
-            raise 
\ No newline at end of file
+            raise
@@ -1,18 +1,115 @@
 import logging
 import os
 import json
+import threading
+import time
+from contextvars import copy_context
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from openai import OpenAI
-from django.core.cache import cache
-from tenacity import retry, stop_after_attempt, wait_exponential
+from django.conf import settings
+from .metrics import backend_call, note_retry
 
 
-# Add an extra blank line here to satisfy the linter requirement
+logger = logging.getLogger(__name__)
 
+# Rough token cost of a word: its tokens in the prompt, as a key in the
+# reply and as the translation, plus the reply's quotes, colon and comma
+WORD_OVERHEAD_TOKENS = 4
+# Translations into non-Latin scripts take several times the tokens of
+# the English word; the reply limit allows for that per word, plus the
+# braces of the JSON object
+REPLY_TOKENS_PER_WORD_TOKEN = 4
+REPLY_OVERHEAD_TOKENS = 10
+MAX_ATTEMPTS = 3
+RETRY_MIN_WAIT = 4
+RETRY_MAX_WAIT = 10
 
-logger = logging.getLogger(__name__)
+SYSTEM_PROMPT = (
+    "You translate single words from {source} to {target}. Reply with a JSON "
+    "object whose keys are exactly the words you are given and whose values "
+    "are their most common translation."
+)
+
+_request_slots = None
+_request_slots_lock = threading.Lock()
+
+
+def request_slots():
+    """Process-wide limit of OPENAI_TRANSLATION_MAX_CONCURRENT_REQUESTS requests in flight."""
+    global _request_slots
+    with _request_slots_lock:
+        if _request_slots is None:
+            _request_slots = threading.BoundedSemaphore(
+                settings.OPENAI_TRANSLATION_MAX_CONCURRENT_REQUESTS
+            )
+        return _request_slots
+
+
+def estimate_tokens(word):
+    # English averages about four characters per token; err on the high side
+    return len(word) // 3 + 1
+
+
+def token_batches(words, budget):
+    """Split ``words`` into batches whose estimated request stays within ``budget`` tokens."""
+    batch = []
+    used = 0
+    for word in words:
+        cost = 3 * estimate_tokens(word) + WORD_OVERHEAD_TOKENS
+        if batch and used + cost > budget:
+            yield batch
+            batch = []
+            used = 0
+        batch.append(word)
+        used += cost
+    if batch:
+        yield batch
+
+
+def reply_tokens(words):
+    """Token limit for the reply to a batch of ``words``."""
+    return REPLY_OVERHEAD_TOKENS + sum(
+        (REPLY_TOKENS_PER_WORD_TOKEN + 1) * estimate_tokens(word) + WORD_OVERHEAD_TOKENS
+        for word in words
+    )
+
+
+def parse_translations(content, words):
+    """
+    Return the word -> translation pairs of a reply, keeping only requested
+    words. Reply keys are matched to the requested words ignoring case and
+    surrounding whitespace, and returned as they were requested.
+    """
+    try:
+        data = json.loads(content)
+    except (TypeError, json.JSONDecodeError):
+        raise ValueError("Invalid response format from translation API")
+    if not isinstance(data, dict):
+        raise ValueError("Translation API did not return a JSON object")
+    requested = defaultdict(list)
+    for word in words:
+        requested[word.strip().lower()].append(word)
+    translations = {}
+    for key, translation in data.items():
+        if not isinstance(translation, str) or not translation.strip():
+            continue
+        for word in requested.get(key.strip().lower(), ()):
+            translations[word] = translation.strip()
+    return translations
 
 
 class TranslationService:
+    """
+    Translates words with an OpenAI chat model (OPENAI_TRANSLATION_MODEL).
+
+    Words are sent in batches sized by OPENAI_TRANSLATION_BATCH_TOKENS,
+    several batches at a time, and the model replies with a JSON object
+    mapping each word to its translation, so a short or reordered reply
+    cannot shift translations onto the wrong words. Only the words missing
+    from a reply, or from a failed request, are sent again.
+    """
+
     def __init__(self):
         self.client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
         if self.client.api_key:
@@ -21,106 +118,96 @@ class TranslationService:
             msg = "OpenAI API key not found in environment variables"
             logger.error(f"Failed to initialize OpenAI API: {msg}")
             raise ValueError(msg)
+        self.model = settings.OPENAI_TRANSLATION_MODEL
+
+    def request_translations(self, words, source_language, target_language):
+        """Translate one batch with a single request."""
+        with request_slots(), backend_call(type(self).__name__):
+            response = self.client.chat.completions.create(
+                model=self.model,
+                messages=[
+                    {
+                        "role": "system",
+                        "content": SYSTEM_PROMPT.format(
+                            source=source_language, target=target_language
+                        ),
+                    },
+                    {"role": "user", "content": json.dumps(words)},
+                ],
+                response_format={"type": "json_object"},
+                temperature=0,
+                max_tokens=reply_tokens(words),
+            )
+        choice = response.choices[0]
+        if choice.finish_reason == 'length':
+            logger.warning(f"Translation reply for {len(words)} words was cut off")
+        return parse_translations(choice.message.content, words)
+
+    def translate_words(self, words, target_language='ru', source_language='en'):
+        """
+        Translate a list of words, returning their translations in order
+        (None for words the model did not translate).
+
+        Raises the last error if no word could be translated at all.
+        """
+        translations = {}
+        pending = list(dict.fromkeys(words))
+        budget = settings.OPENAI_TRANSLATION_BATCH_TOKENS
+        error = None
+        for attempt in range(1, MAX_ATTEMPTS + 1):
+            batches = list(token_batches(pending, budget))
+            workers = min(settings.OPENAI_TRANSLATION_MAX_CONCURRENT_REQUESTS, len(batches))
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                # Each request runs in a copy of this context, so it is
+                # counted against the job's usage
+                futures = [
+                    pool.submit(
+                        copy_context().run,
+                        self.request_translations, batch, source_language, target_language
+                    )
+                    for batch in batches
+                ]
+                for future in futures:
+                    try:
+                        translations.update(future.result())
+                    except Exception as e:
+                        logger.error(f"Translation request failed: {str(e)}")
+                        error = e
+            pending = [word for word in pending if word not in translations]
+            if not pending or attempt == MAX_ATTEMPTS:
+                break
+            note_retry(type(self).__name__, attempt, f"{len(pending)} words untranslated")
+            # Smaller batches for the retry, in case replies were cut off
+            budget = max(budget // 2, 3 * estimate_tokens(max(pending, key=len)) + WORD_OVERHEAD_TOKENS)
+            time.sleep(min(RETRY_MAX_WAIT, RETRY_MIN_WAIT * 2 ** (attempt - 1)))
+
+        if pending:
+            if not translations and error:
+                raise error
+            logger.warning(f"{len(pending)} words left untranslated after {MAX_ATTEMPTS} attempts")
+        return [translations.get(word) for word in words]
 
-    @retry(
-        stop=stop_after_attempt(3),
-        wait=wait_exponential(multiplier=1, min=4, max=10)
-    )
     def batch_translate(self, texts, source_lang='en', target_lang='ru'):
         """
-        Translate a batch of texts using OpenAI's API with optimized batching
-        and caching. Only translates valid words (alphabetic).
+        Translate a batch of texts, returning None for the ones that are
+        not single alphabetic words. Translations are cached per word in
+        the translation cache.
         """
-        try:
-            # Filter out invalid words
-            valid_texts = [
-                text for text in texts
-                if text and isinstance(text, str) and text.isalpha()
-            ]
-            
-            if not valid_texts:
-                logger.warning("No valid words to translate in batch")
-                return [None] * len(texts)
-            
-            # Check cache first
-            key_parts = [
-                'translation',
-                source_lang,
-                target_lang,
-                str(hash(tuple(valid_texts)))
-            ]
-            cache_key = '_'.join(key_parts)
-            cached = cache.get(cache_key)
-            if cached:
-                logger.info("Retrieved translations from cache")
-                # Map cached translations back to original texts
-                result = []
-                valid_idx = 0
-                for text in texts:
-                    if (text and isinstance(text, str) and text.isalpha()):
-                        result.append(cached[valid_idx])
-                        valid_idx += 1
-                    else:
-                        result.append(None)
-                return result
-
-            logger.info("Batch translating %d words", len(valid_texts))
-            
-            # Prepare optimized prompt
-            prompt = (
-                f"Translate these {len(valid_texts)} words from {source_lang} "
-                f"to {target_lang}. Return translations in JSON format: "
-                "{'translations': ['word1', 'word2', ...]}\n\n"
-                f"Words: {', '.join(valid_texts)}"
-            )
+        from .translation_usage import TrackedTranslator
 
-            response = self.client.chat.completions.create(
-                model="gpt-4",
-                messages=[{"role": "user", "content": prompt}],
-                temperature=0.3
-            )
+        valid_texts = list(dict.fromkeys(
+            text for text in texts
+            if text and isinstance(text, str) and text.isalpha()
+        ))
+        if not valid_texts:
+            logger.warning("No valid words to translate in batch")
+            return [None] * len(texts)
 
-            # Parse response
-            try:
-                content = response.choices[0].message.content
-                result = json.loads(content)
-                translations = result.get('translations', [])
-                
-                # Ensure we have the same number of translations as valid texts
-                if len(translations) < len(valid_texts):
-                    logger.warning(
-                        "Received fewer translations than expected. "
-                        "Padding with None."
-                    )
-                    translations.extend(
-                        [None] * (len(valid_texts) - len(translations))
-                    )
-                elif len(translations) > len(valid_texts):
-                    logger.warning("Received extra translations. Truncating.")
-                    translations = translations[:len(valid_texts)]
-
-                # Cache successful translations
-                cache.set(cache_key, translations, timeout=3600)
-                
-                # Map translations back to original texts
-                result = []
-                valid_idx = 0
-                for text in texts:
-                    if (text and isinstance(text, str) and text.isalpha()):
-                        result.append(translations[valid_idx])
-                        valid_idx += 1
-                    else:
-                        result.append(None)
-                return result
-
-            except (json.JSONDecodeError, KeyError, AttributeError) as e:
-                logger.error(
-                    "Failed to parse translation response: %s", e
-                )
-                raise ValueError(
-                    "Invalid response format from translation API"
-                )
-
-        except Exception as e:
-            logger.error("Translation failed: %s", e)
-            raise 
\ No newline at end of file
+        translator = TrackedTranslator(self, source_language=source_lang)
+        translations = dict(zip(
+            valid_texts, translator.translate_words(valid_texts, target_language=target_lang)
+        ))
+        return [
+            translations.get(text) if isinstance(text, str) else None
+            for text in texts
+        ]
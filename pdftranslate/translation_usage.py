@@ -0,0 +1,241 @@
+import logging
+import threading
+from collections import defaultdict
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import F
+from .metrics import backend_call, count_backend_usage
+from .models import PDFDocument, TranslationNamespace, TranslationUsage
+from .write_queue import write_queue
+
+logger = logging.getLogger(__name__)
+
+
+def translate_words(translation_service, words, target_language):
+    """
+    Translate a batch of words with as few backend calls as it allows.
+
+    Backends with ``translate_words`` time and count each request they
+    make with ``backend_call``; words sent one at a time are timed here.
+    """
+    if hasattr(translation_service, 'translate_words'):
+        return translation_service.translate_words(words, target_language=target_language)
+    backend = type(translation_service).__name__
+    translations = []
+    for word in words:
+        with backend_call(backend):
+            translations.append(
+                translation_service.translate_word(word, target_language=target_language)
+            )
+    return translations
+
+
+def namespace_keys(backend, target_language):
+    """
+    Keys of the version counters that together name the cache namespace
+    of a backend and language pair: one for all translations, one per
+    backend, one per target language and one per pair. Bumping any of
+    them moves the matching translations to a fresh, empty namespace.
+
+    The counters are TranslationNamespace rows rather than cache entries,
+    so culling the cache cannot reset them.
+    """
+    return [
+        'translation-ns',
+        f'translation-ns:backend:{backend}',
+        f'translation-ns:language:{target_language}',
+        f'translation-ns:pair:{backend}:{target_language}',
+    ]
+
+
+def namespace_version(backend, target_language):
+    keys = namespace_keys(backend, target_language)
+    versions = dict(
+        TranslationNamespace.objects.filter(key__in=keys).values_list('key', 'version')
+    )
+    return '.'.join(str(versions.get(key, 1)) for key in keys)
+
+
+def increment_namespace(key):
+    TranslationNamespace.objects.get_or_create(key=key)
+    TranslationNamespace.objects.filter(key=key).update(version=F('version') + 1)
+    return TranslationNamespace.objects.get(key=key).version
+
+
+def bump_namespace(key):
+    """Invalidate a namespace in O(1): old entries are never read again and expire."""
+    return write_queue.write(increment_namespace, key)
+
+
+def translation_cache_key(version, backend, source_language, target_language, word):
+    return f'translation:{version}:{backend}:{source_language}:{target_language}:{word}'
+
+
+def invalidate_translations(backend=None, target_language=None, words=None):
+    """
+    Invalidate cached translations, optionally only those of a backend,
+    a target language and/or a list of words.
+
+    Without ``words`` this bumps a single namespace version. With
+    ``words`` only their entries are deleted, in every namespace matching
+    the other filters.
+    """
+    if words is None:
+        if backend and target_language:
+            key = f'translation-ns:pair:{backend}:{target_language}'
+        elif backend:
+            key = f'translation-ns:backend:{backend}'
+        elif target_language:
+            key = f'translation-ns:language:{target_language}'
+        else:
+            key = 'translation-ns'
+        bump_namespace(key)
+        return None
+
+    if backend:
+        backends = [backend]
+    else:
+        backends = {settings.TRANSLATION_BACKEND.rsplit('.', 1)[-1]}
+        backends.update(
+            TranslationUsage.objects.values_list('backend', flat=True).distinct()
+        )
+    languages = [target_language] if target_language else [
+        code for code, _ in PDFDocument.LANGUAGE_CHOICES
+    ]
+    keys = []
+    for name in backends:
+        for language in languages:
+            version = namespace_version(name, language)
+            keys.extend(
+                translation_cache_key(version, name, 'en', language, word)
+                for word in words
+            )
+    caches['translations'].delete_many(keys)
+    return len(keys)
+
+
+class TrackedTranslator:
+    """
+    Wrap a translation backend with a per-word cache and count what the
+    translations cost: backend calls, characters sent, cache hits and
+    retries, per target language.
+
+    Only words missing from the cache reach the backend, so a word is
+    paid for once per backend and language pair, across documents.
+
+    ``fetch`` may be called from several threads at once; the cache is
+    only touched by ``lookup`` and ``remember``, which should run on the
+    thread that owns the job's database connection.
+    """
+
+    def __init__(self, translation_service, source_language='en', backend=None):
+        self.service = translation_service
+        # Names the backend in cache keys and usage rows
+        self.backend = backend or type(translation_service).__name__
+        self.source_language = source_language
+        self.usage = defaultdict(lambda: defaultdict(int))
+        self.lock = threading.Lock()
+
+    def cache_keys(self, words, target_language):
+        version = namespace_version(self.backend, target_language)
+        return {
+            word: translation_cache_key(
+                version, self.backend, self.source_language, target_language, word
+            )
+            for word in words
+        }
+
+    def lookup(self, words, target_language):
+        """
+        Return the cache keys of ``words``, the translations found in the
+        cache by key, and the words that still need translating.
+        """
+        keys = self.cache_keys(words, target_language)
+        cached = caches['translations'].get_many(keys.values())
+        with self.lock:
+            usage = self.usage[target_language]
+            usage['words_requested'] += len(words)
+            usage['cache_hits'] += len(cached)
+        missing = [word for word in words if keys[word] not in cached]
+        return keys, cached, missing
+
+    def fetch(self, words, target_language):
+        """Translate ``words`` with the backend, counting the cost."""
+        counts = defaultdict(int)
+        try:
+            with count_backend_usage(counts):
+                return dict(zip(
+                    words, translate_words(self.service, words, target_language)
+                ))
+        finally:
+            with self.lock:
+                usage = self.usage[target_language]
+                usage['backend_calls'] += counts['backend_calls']
+                usage['characters'] += sum(len(word) for word in words)
+                usage['retries'] += counts['retries']
+
+    def remember(self, words, keys, cached, translated):
+        """Cache new translations and return the translations of ``words`` in order."""
+        # The cache is a database table, so its writes go through the
+        # single writer; nothing waits for them
+        write_queue.submit(
+            caches['translations'].set_many,
+            {keys[word]: trans for word, trans in translated.items() if trans},
+            timeout=settings.TRANSLATION_CACHE_TTL
+        )
+        return [
+            cached[keys[word]] if keys[word] in cached else translated.get(word)
+            for word in words
+        ]
+
+    def translate_words(self, words, target_language='ru'):
+        keys, cached, missing = self.lookup(words, target_language)
+        translated = self.fetch(missing, target_language) if missing else {}
+        return self.remember(words, keys, cached, translated)
+
+    def warm(self, words, target_language, known=None, offline=False):
+        """
+        Make sure ``words`` are in the translation cache.
+
+        Words already cached are left alone, words in the ``known``
+        word -> translation mapping are stored as they are and the rest
+        are translated by the backend, unless ``offline``. Returns how
+        many words were cached, stored from ``known`` and translated.
+        """
+        cache = caches['translations']
+        known = known or {}
+        keys = self.cache_keys(words, target_language)
+        cached = cache.get_many(keys.values())
+        missing = [word for word in words if keys[word] not in cached]
+        provided = {word: known[word] for word in missing if known.get(word)}
+        to_translate = [word for word in missing if word not in provided]
+        translated = {}
+        if to_translate and not offline:
+            translated = self.fetch(to_translate, target_language)
+        write_queue.write(
+            cache.set_many,
+            {
+                keys[word]: trans
+                for word, trans in {**provided, **translated}.items()
+                if trans
+            },
+            timeout=settings.TRANSLATION_CACHE_TTL
+        )
+        return len(cached), len(provided), sum(1 for trans in translated.values() if trans)
+
+    def save_usage(self, document_id=None):
+        """Store the counts collected so far, one row per target language."""
+        rows = [
+            TranslationUsage(
+                document_id=document_id,
+                backend=self.backend,
+                source_language=self.source_language,
+                target_language=target_language,
+                **counts
+            )
+            for target_language, counts in self.usage.items()
+            if any(counts.values())
+        ]
+        write_queue.write(TranslationUsage.objects.bulk_create, rows)
+        self.usage.clear()
+        return rows
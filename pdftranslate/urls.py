@@ -3,8 +3,14 @@ from . import views
 
 urlpatterns = [
     path('', views.pdf_list, name='pdf_list'),
+    path('metrics', views.metrics, name='metrics'),
     path('upload/', views.upload_pdf, name='upload_pdf'),
+    path('upload/video/', views.upload_video, name='upload_video'),
+    path('import/', views.import_word_list, name='import_word_list'),
     path('delete/<int:pk>/', views.delete_pdf, name='delete_pdf'),
+    path('retranslate/<int:pk>/', views.retranslate_pdf, name='retranslate_pdf'),
+    path('cancel/<int:pk>/', views.cancel_translation, name='cancel_translation'),
+    path('priority/<int:pk>/', views.change_priority, name='change_priority'),
     path('translation-progress/<int:pk>/', views.get_translation_progress, name='translation_progress'),
     path('login/', views.login_view, name='login'),
     path('logout/', views.logout_view, name='logout'),
@@ -16,4 +22,6 @@ urlpatterns = [
     path('flashcards/dashboard/', views.flashcard_dashboard, name='flashcard_dashboard'),
     path('sse/progress/<int:document_id>/', views.sse_progress, name='sse_progress'),
     path('translated-words/<int:document_id>/', views.translated_words_list, name='translated_words_list'),
+    path('export/words/<int:document_id>/<str:file_format>/', views.export_words, name='export_words'),
+    path('export/flashcards/<str:file_format>/', views.export_flashcards, name='export_flashcards'),
 ] 
\ No newline at end of file
@@ -1,25 +1,36 @@
-from django.shortcuts import render, redirect, get_object_or_404
+from django.shortcuts import aget_object_or_404, render, redirect, get_object_or_404
 from django.contrib import messages
 from django.contrib.auth import login, authenticate, logout
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.forms import UserCreationForm
+from django.conf import settings
 from django.core.files.storage import default_storage
-from django.http import JsonResponse, StreamingHttpResponse
+from django.http import FileResponse, Http404, HttpResponse, JsonResponse, StreamingHttpResponse
 from django.utils import timezone
+from django.utils.http import content_disposition_header
 from django.db.models import Q
-from .models import PDFDocument, WordEntry, Flashcard
-from .tasks import start_translation
-from PyPDF2 import PdfReader
-import io
+from .models import PDFDocument, Flashcard, translation_of
+from .job_scheduler import QueueFull, job_scheduler
+from .tasks import (
+    cancel_job,
+    set_priority,
+    start_purge,
+    start_translation,
+    start_video_translation,
+    start_word_list_import,
+)
+from .pdf_utils import HashingFile, looks_like_pdf
+from .exporters import EXPORT_CHUNK_SIZE, build_apkg, iter_csv
+from .metrics import render_latest
 import re
 import logging
 import os
-from datetime import datetime, timedelta
+from datetime import timedelta
 from django.db import models
 import json
-import asyncio
 import time
-from django.core.paginator import Paginator
+import tempfile
+from django.core.paginator import InvalidPage, Paginator
 
 logger = logging.getLogger(__name__)
 
@@ -64,16 +75,16 @@ def login_view(request):
 
 @login_required
 def delete_pdf(request, pk):
-    """Delete a PDF document and its associated files."""
+    """
+    Delete a document. It disappears at once; its words, flashcards and
+    file are purged in the background.
+    """
     document = get_object_or_404(PDFDocument, pk=pk, user=request.user)
     
     try:
-        # Delete the actual file from storage
-        if document.pdf_file and os.path.exists(document.pdf_file.path):
-            os.remove(document.pdf_file.path)
-        
-        # Delete the database record (this will cascade delete WordEntries)
-        document.delete()
+        cancel_job(document.id)
+        document.soft_delete()
+        start_purge(document.id)
         messages.success(request, f'"{document.title}" has been deleted.')
     except Exception as e:
         logger.error(f"Error deleting PDF {document.title}: {str(e)}")
@@ -81,52 +92,96 @@ def delete_pdf(request, pk):
     
     return redirect('pdf_list')
 
+@login_required
+def cancel_translation(request, pk):
+    """Cancel a document's waiting or running job; a running one stops before its next batch."""
+    document = get_object_or_404(PDFDocument, pk=pk, user=request.user)
+    if request.method != 'POST':
+        return redirect('pdf_list')
+    if cancel_job(document.id):
+        messages.success(request, f'Cancelled processing "{document.title}".')
+    else:
+        messages.error(request, f'"{document.title}" is not being processed.')
+    return redirect('pdf_list')
+
+@login_required
+def change_priority(request, pk):
+    """Move a document's job ahead of (or behind) the user's other waiting jobs."""
+    document = get_object_or_404(PDFDocument, pk=pk, user=request.user)
+    if request.method != 'POST':
+        return redirect('pdf_list')
+    try:
+        priority = int(request.POST.get('priority', ''))
+    except ValueError:
+        priority = None
+    if priority not in dict(PDFDocument.PRIORITY_CHOICES):
+        messages.error(request, 'Unsupported priority.')
+        return redirect('pdf_list')
+    set_priority(document.id, priority)
+    return redirect('pdf_list')
+
+def job_queue_full(request):
+    """
+    Turn new jobs away while the job queue is full, before their files are
+    stored for nothing.
+    """
+    if job_scheduler.admits(request.user.id):
+        return False
+    queue_full(request, 'Too many documents are waiting to be processed')
+    return True
+
+def queue_full(request, reason):
+    messages.error(request, f'{reason}. Please try again once some have finished.')
+
 @login_required
 def upload_pdf(request):
     if request.method == 'POST':
+        if job_queue_full(request):
+            return redirect('pdf_list')
         if 'pdf_file' not in request.FILES:
             messages.error(request, 'No file was uploaded.')
             return redirect('upload_pdf')
         
         pdf_file = request.FILES['pdf_file']
         target_language = request.POST.get('target_language', 'ru')
+        supported_languages = dict(PDFDocument.LANGUAGE_CHOICES)
+        extra_languages = [
+            language for language in dict.fromkeys(request.POST.getlist('extra_languages'))
+            if language in supported_languages and language != target_language
+        ]
         
         # Check if it's actually a PDF file
         if not pdf_file.name.lower().endswith('.pdf'):
             messages.error(request, 'Please upload a PDF file.')
             return redirect('upload_pdf')
         
+        # Only look at the header and trailer here; the background job
+        # parses the whole document and marks it as failed if it is broken.
+        if not looks_like_pdf(pdf_file):
+            messages.error(
+                request,
+                'The file appears to be invalid or corrupted.'
+            )
+            return redirect('upload_pdf')
+        
         try:
-            # Read the file content once
-            file_content = pdf_file.read()
-            
-            # Try to parse it as PDF to validate
-            try:
-                pdf_reader = PdfReader(io.BytesIO(file_content))
-                if len(pdf_reader.pages) == 0:
-                    raise ValueError("The PDF file appears to be empty")
-            except Exception as e:
-                logger.error(f"Invalid PDF file: {str(e)}")
-                messages.error(
-                    request,
-                    'The file appears to be invalid or corrupted.'
-                )
-                return redirect('upload_pdf')
-            
             # Create PDFDocument instance
             document = PDFDocument.objects.create(
                 user=request.user,
                 title=pdf_file.name,
                 target_language=target_language,
+                extra_languages=extra_languages,
                 translation_status='pending'
             )
             
-            # Save the file using default storage
+            # Stream the file to storage, hashing it on the way
+            content = HashingFile(pdf_file)
             file_name = default_storage.save(
                 f'pdfs/{request.user.id}/{document.id}/{pdf_file.name}',
-                io.BytesIO(file_content)
+                content
             )
             document.pdf_file.name = file_name
+            document.content_hash = content.content_hash
             document.save()
             
             # Start translation in background
@@ -137,6 +192,8 @@ def upload_pdf(request):
                 'PDF uploaded successfully. Translation in progress...'
             )
             
+        except QueueFull as e:
+            queue_full(request, e)
         except Exception as e:
             messages.error(
                 request,
@@ -155,15 +212,208 @@ def upload_pdf(request):
     return render(request, 'pdftranslate/upload.html', context)
 
 @login_required
-def get_translation_progress(request, pk):
+def retranslate_pdf(request, pk):
+    """
+    Translate a PDF again, optionally into a new target language. The
+    words stored when it was first parsed are reused, so the PDF is not
+    read again.
+    """
+    document = get_object_or_404(PDFDocument, pk=pk, user=request.user, source_type='pdf')
+    if request.method != 'POST':
+        return redirect('pdf_list')
+    # A pending or in-progress document whose job this process no longer
+    # has was lost in a restart and can be started again
+    if (document.translation_status in ('pending', 'in_progress')
+            and job_scheduler.tracks(document.id)):
+        messages.error(request, f'"{document.title}" is already being translated.')
+        return redirect('pdf_list')
+    if job_queue_full(request):
+        return redirect('pdf_list')
+
+    target_language = request.POST.get('target_language', document.target_language)
+    if target_language not in dict(PDFDocument.LANGUAGE_CHOICES):
+        messages.error(request, 'Unsupported target language.')
+        return redirect('pdf_list')
+
+    document.target_language = target_language
+    document.extra_languages = [
+        language for language in document.extra_languages if language != target_language
+    ]
+    document.translation_status = 'pending'
+    document.translation_progress = 0
+    document.failure_reason = ''
+    document.save()
+    try:
+        start_translation(document.id)
+    except QueueFull as e:
+        queue_full(request, e)
+        return redirect('pdf_list')
+    messages.success(
+        request,
+        f'Translating "{document.title}" into {document.get_target_language_display()}...'
+    )
+    return redirect('pdf_list')
+
+VIDEO_EXTENSIONS = ('.mp4', '.mov', '.mkv', '.webm', '.avi')
+
+@login_required
+def upload_video(request):
+    """Upload a video whose speech is transcribed into translated words."""
+    if request.method == 'POST':
+        if job_queue_full(request):
+            return redirect('pdf_list')
+        if 'video_file' not in request.FILES:
+            messages.error(request, 'No file was uploaded.')
+            return redirect('upload_video')
+        
+        video_file = request.FILES['video_file']
+        target_language = request.POST.get('target_language', 'ru')
+        
+        if not video_file.name.lower().endswith(VIDEO_EXTENSIONS):
+            messages.error(request, 'Please upload an MP4, MOV, MKV, WebM or AVI video.')
+            return redirect('upload_video')
+        
+        try:
+            document = PDFDocument.objects.create(
+                user=request.user,
+                title=video_file.name,
+                source_type='video',
+                target_language=target_language,
+                translation_status='pending'
+            )
+            
+            content = HashingFile(video_file)
+            file_name = default_storage.save(
+                f'videos/{request.user.id}/{document.id}/{video_file.name}',
+                content
+            )
+            document.pdf_file.name = file_name
+            document.content_hash = content.content_hash
+            document.save()
+            
+            start_video_translation(document.id)
+            
+            messages.success(
+                request,
+                'Video uploaded successfully. Words will appear as the speech is transcribed...'
+            )
+        except QueueFull as e:
+            queue_full(request, e)
+        except Exception as e:
+            messages.error(
+                request,
+                'An unexpected error occurred. Please try again.'
+            )
+            logger.error(
+                f"Unexpected error processing {video_file.name}: {str(e)}"
+            )
+        
+        return redirect('pdf_list')
+    
+    context = {
+        'language_choices': PDFDocument.LANGUAGE_CHOICES
+    }
+    return render(request, 'pdftranslate/upload_video.html', context)
+
+WORD_LIST_EXTENSIONS = ('.csv', '.tsv', '.txt')
+
+@login_required
+def import_word_list(request):
+    """Import a CSV/TSV or plain word list without going through a PDF."""
+    if request.method == 'POST':
+        if job_queue_full(request):
+            return redirect('pdf_list')
+        if 'word_list' not in request.FILES:
+            messages.error(request, 'No file was uploaded.')
+            return redirect('import_word_list')
+        
+        word_list = request.FILES['word_list']
+        target_language = request.POST.get('target_language', 'ru')
+        create_flashcards = request.POST.get('create_flashcards') == 'on'
+        
+        if not word_list.name.lower().endswith(WORD_LIST_EXTENSIONS):
+            messages.error(request, 'Please upload a .csv, .tsv or .txt word list.')
+            return redirect('import_word_list')
+        
+        try:
+            document = PDFDocument.objects.create(
+                user=request.user,
+                title=request.POST.get('title') or word_list.name,
+                source_type='word_list',
+                target_language=target_language,
+                translation_status='pending'
+            )
+            
+            # Stream the list to storage; the import reads it back line by line
+            content = HashingFile(word_list)
+            file_name = default_storage.save(
+                f'wordlists/{request.user.id}/{document.id}/{word_list.name}',
+                content
+            )
+            document.pdf_file.name = file_name
+            document.content_hash = content.content_hash
+            document.save()
+            
+            start_word_list_import(document.id, create_flashcards=create_flashcards)
+            
+            messages.success(
+                request,
+                'Word list uploaded successfully. Import in progress...'
+            )
+        except QueueFull as e:
+            queue_full(request, e)
+        except Exception as e:
+            messages.error(
+                request,
+                'An unexpected error occurred. Please try again.'
+            )
+            logger.error(
+                f"Unexpected error importing {word_list.name}: {str(e)}"
+            )
+        
+        return redirect('pdf_list')
+    
+    context = {
+        'language_choices': PDFDocument.LANGUAGE_CHOICES
+    }
+    return render(request, 'pdftranslate/import_word_list.html', context)
+
+async def request_user(request):
+    """
+    The request's user, loaded with the async ORM. It also replaces the
+    lazy request.user, which would query the database synchronously when a
+    template looks at it.
+    """
+    request.user = await request.auser()
+    return request.user
+
+async def apaginate(queryset, number, per_page, count):
+    """
+    Paginate ``queryset`` with the async ORM, given its row count. Only the
+    requested page is fetched; invalid page numbers show the first page.
+    """
+    paginator = Paginator(range(count), per_page)
+    try:
+        page = paginator.page(number)
+    except InvalidPage:
+        page = paginator.page(1)
+    offset = (page.number - 1) * per_page
+    page.object_list = [obj async for obj in queryset[offset:offset + per_page]]
+    return paginator, page
+
+@login_required
+async def get_translation_progress(request, pk):
     """AJAX endpoint to get translation progress."""
     try:
-        document = PDFDocument.objects.get(pk=pk, user=request.user)
+        user = await request.auser()
+        document = await PDFDocument.objects.aget(pk=pk, user=user)
         return JsonResponse({
             'status': document.translation_status,
             'progress': document.translation_progress,
             'total_words': document.total_words,
-            'translated_words': document.translated_words
+            'translated_words': document.translated_words,
+            'failure_reason': document.failure_reason,
+            'queue_position': job_scheduler.position(document.id),
         })
     except PDFDocument.DoesNotExist:
         return JsonResponse({'error': 'Document not found'}, status=404)
@@ -174,48 +424,72 @@ def get_translation_progress(request, pk):
             status=500
         )
 
+def metrics(request):
+    """Prometheus scrape endpoint for translation job metrics."""
+    token = settings.METRICS_TOKEN
+    if token and request.headers.get('Authorization') != f'Bearer {token}':
+        return HttpResponse(status=403)
+    body, content_type = render_latest()
+    return HttpResponse(body, content_type=content_type)
+
 @login_required
-def pdf_list(request):
-    documents = PDFDocument.objects.filter(user=request.user).prefetch_related('words').all()
-    context = {'documents': documents}
+async def pdf_list(request):
+    user = await request_user(request)
+    documents = [document async for document in PDFDocument.objects.filter(user=user)]
+    context = {
+        'documents': documents,
+        # Documents left pending or in progress by a restart
+        'lost_jobs': {
+            document.id for document in documents
+            if document.translation_status in ('pending', 'in_progress')
+            and not job_scheduler.tracks(document.id)
+        },
+        'language_choices': PDFDocument.LANGUAGE_CHOICES,
+        'priority_choices': PDFDocument.PRIORITY_CHOICES,
+    }
     return render(request, 'pdftranslate/pdf_list.html', context)
 
 @login_required
-def flashcard_list(request):
+async def flashcard_list(request):
     now = timezone.now()
+    user = await request_user(request)
     document_id = request.GET.get('document_id')
     page = request.GET.get('page', 1)
     
     # Get all user's documents that have flashcards
-    user_documents = PDFDocument.objects.filter(
-        user=request.user,
-        words__flashcard__isnull=False
-    ).distinct()
+    user_documents = [
+        document async for document in PDFDocument.objects.filter(
+            user=user,
+            words__flashcard__isnull=False
+        ).distinct()
+    ]
     
     # Base queryset
     if document_id:
-        flashcards = Flashcard.objects.filter(word_entry__document_id=document_id, user=request.user)
+        flashcards = Flashcard.objects.filter(word_entry__document_id=document_id, user=user)
     else:
         # If no document selected, show the first document's flashcards
-        if user_documents.exists():
-            first_doc = user_documents.first()
-            flashcards = Flashcard.objects.filter(word_entry__document=first_doc, user=request.user)
+        if user_documents:
+            first_doc = user_documents[0]
+            flashcards = Flashcard.objects.filter(word_entry__document=first_doc, user=user)
             document_id = first_doc.id
         else:
             flashcards = Flashcard.objects.none()
     
-    # Get statistics for the selected document
-    total_cards = flashcards.count()
-    cards_due = flashcards.filter(next_review__lte=now).count()
-    cards_learned = flashcards.filter(review_count__gt=0).count()
-    cards_mastered = flashcards.filter(review_count__gte=5).count()
+    # Get statistics for the selected document in one query
+    stats = await flashcards.aaggregate(
+        total_cards=models.Count('id'),
+        cards_due=models.Count('id', filter=Q(next_review__lte=now)),
+        cards_learned=models.Count('id', filter=Q(review_count__gt=0)),
+        cards_mastered=models.Count(
+            'id', filter=Q(review_count__gte=settings.KNOWN_WORD_MIN_REVIEWS)
+        ),
+    )
     
-    # Pagination
-    paginator = Paginator(flashcards, 12)  # Show 12 cards per page
-    try:
-        flashcards_page = paginator.page(page)
-    except:
-        flashcards_page = paginator.page(1)
+    # Pagination, 12 cards per page
+    paginator, flashcards_page = await apaginate(
+        flashcards.select_related('word_entry__lexeme'), page, 12, stats['total_cards']
+    )
     
     # Calculate progress for each flashcard
     for card in flashcards_page:
@@ -223,10 +497,7 @@ def flashcard_list(request):
     
     context = {
         'flashcards': flashcards_page,
-        'total_cards': total_cards,
-        'cards_due': cards_due,
-        'cards_learned': cards_learned,
-        'cards_mastered': cards_mastered,
+        **stats,
         'paginator': paginator,
         'page_obj': flashcards_page,
         'documents': user_documents,
@@ -235,16 +506,17 @@ def flashcard_list(request):
     return render(request, 'pdftranslate/flashcard_list.html', context)
 
 @login_required
-def flashcard_review(request, pk=None):
+async def flashcard_review(request, pk=None):
     """Review a specific flashcard or get the next due card."""
     now = timezone.now()
+    user = await request_user(request)
     
     if request.method == 'POST':
         # Handle review submission
-        flashcard = get_object_or_404(
+        flashcard = await aget_object_or_404(
             Flashcard,
             pk=request.POST.get('flashcard_id'),
-            user=request.user
+            user=user
         )
         
         # Get the interval and determine if remembered
@@ -272,13 +544,13 @@ def flashcard_review(request, pk=None):
             flashcard.review_count += 1
         else:
             flashcard.review_count = max(0, flashcard.review_count - 1)
-        flashcard.save()
+        await flashcard.asave()
         
         # Find the next card to review
-        next_card = Flashcard.objects.filter(
-            user=request.user,
+        next_card = await Flashcard.objects.filter(
+            user=user,
             next_review__lte=now
-        ).exclude(pk=flashcard.pk).first()
+        ).exclude(pk=flashcard.pk).afirst()
         
         if next_card:
             return redirect('flashcard_review', pk=next_card.pk)
@@ -288,33 +560,29 @@ def flashcard_review(request, pk=None):
     # GET request - show the next card
     if pk is None:
         # Get the next due card
-        flashcard = Flashcard.objects.filter(
-            user=request.user,
+        flashcard = await Flashcard.objects.filter(
+            user=user,
             next_review__lte=now
-        ).first()
+        ).select_related('word_entry__lexeme').afirst()
         if not flashcard:
             messages.info(request, 'No cards due for review at this time.')
             return redirect('flashcard_list')
     else:
         # Get the specific card
-        flashcard = get_object_or_404(Flashcard, pk=pk, user=request.user)
+        flashcard = await aget_object_or_404(
+            Flashcard.objects.select_related('word_entry__lexeme'), pk=pk, user=user
+        )
     
     # Get progress information
-    total_due = Flashcard.objects.filter(
-        user=request.user,
-        next_review__lte=now
-    ).count()
-    reviewed_today = Flashcard.objects.filter(
-        user=request.user,
-        last_reviewed__date=now.date()
-    ).count()
-    cards_remaining_today = max(0, total_due - reviewed_today)
+    progress = await Flashcard.objects.filter(user=user).aaggregate(
+        total_due=models.Count('id', filter=Q(next_review__lte=now)),
+        reviewed_today=models.Count('id', filter=Q(last_reviewed__date=now.date())),
+    )
     
     context = {
         'flashcard': flashcard,
-        'total_due': total_due,
-        'reviewed_today': reviewed_today,
-        'cards_remaining_today': cards_remaining_today,
+        **progress,
+        'cards_remaining_today': max(0, progress['total_due'] - progress['reviewed_today']),
     }
     return render(request, 'pdftranslate/flashcard_review.html', context)
 
@@ -340,47 +608,46 @@ def create_flashcards(request, document_id):
     return redirect('flashcard_list')
 
 @login_required
-def flashcard_dashboard(request):
+async def flashcard_dashboard(request):
     """Display detailed flashcard statistics and progress."""
     now = timezone.now()
     today = now.date()
     
     # Get all user's flashcards
-    user_flashcards = Flashcard.objects.filter(user=request.user)
-    
-    # Today's statistics
-    cards_due_today = user_flashcards.filter(next_review__date=today).count()
-    cards_reviewed_today = user_flashcards.filter(last_reviewed__date=today).count()
-    cards_remaining_today = max(0, cards_due_today - cards_reviewed_today)
+    user_flashcards = Flashcard.objects.filter(user=await request_user(request))
     
-    # Overall statistics
-    total_cards = user_flashcards.count()
-    cards_learned = user_flashcards.filter(review_count__gt=0).count()
-    cards_mastered = user_flashcards.filter(review_count__gte=5).count()
+    # Today's and overall statistics in one query
+    stats = await user_flashcards.aaggregate(
+        cards_due_today=models.Count('id', filter=Q(next_review__date=today)),
+        cards_reviewed_today=models.Count('id', filter=Q(last_reviewed__date=today)),
+        total_cards=models.Count('id'),
+        cards_learned=models.Count('id', filter=Q(review_count__gt=0)),
+        cards_mastered=models.Count(
+            'id', filter=Q(review_count__gte=settings.KNOWN_WORD_MIN_REVIEWS)
+        ),
+    )
+    cards_due_today = stats['cards_due_today']
+    cards_reviewed_today = stats['cards_reviewed_today']
     
     # Review streak
     current_streak = 0
     check_date = today
-    while user_flashcards.filter(last_reviewed__date=check_date).exists():
+    while await user_flashcards.filter(last_reviewed__date=check_date).aexists():
         current_streak += 1
         check_date -= timedelta(days=1)
     
     # Next due dates
-    upcoming_reviews = (
-        user_flashcards
+    upcoming_reviews = [
+        review async for review in user_flashcards
         .filter(next_review__gt=now)
         .values('next_review__date')
         .annotate(count=models.Count('id'))
         .order_by('next_review__date')[:7]
-    )
+    ]
     
     context = {
-        'cards_due_today': cards_due_today,
-        'cards_reviewed_today': cards_reviewed_today,
-        'cards_remaining_today': cards_remaining_today,
-        'total_cards': total_cards,
-        'cards_learned': cards_learned,
-        'cards_mastered': cards_mastered,
+        **stats,
+        'cards_remaining_today': max(0, cards_due_today - cards_reviewed_today),
         'current_streak': current_streak,
         'upcoming_reviews': upcoming_reviews,
         'completion_rate': int((cards_reviewed_today / cards_due_today * 100) if cards_due_today > 0 else 100),
@@ -408,6 +675,7 @@ def sse_progress(request, document_id):
     def event_stream():
         document = get_object_or_404(PDFDocument, id=document_id, user=request.user)
         last_progress = -1
+        last_status = None
         
         while True:
             try:
@@ -423,8 +691,8 @@ def sse_progress(request, document_id):
                     yield f"event: state\ndata: {json.dumps({'status': status, 'progress': current_progress, 'translated_words': current_words, 'total_words': total_words})}\n\n"
                     yield "event: heartbeat\ndata: ping\n\n"
                 
-                # Only send update if progress changed
-                elif current_progress != last_progress:
+                # Only send update if progress or status changed
+                elif current_progress != last_progress or status != last_status:
                     data = {
                         'status': status,
                         'progress': current_progress,
@@ -437,9 +705,10 @@ def sse_progress(request, document_id):
                     yield "event: heartbeat\ndata: ping\n\n"
                 
                 last_progress = current_progress
+                last_status = status
                 
-                # Stop if translation is complete or failed
-                if status in ['completed', 'failed']:
+                # Stop once the translation has finished, one way or another
+                if status in ['completed', 'failed', 'cancelled']:
                     break
                 
                 # Wait before next check
@@ -462,8 +731,101 @@ def sse_progress(request, document_id):
 @login_required
 def translated_words_list(request, document_id):
     document = get_object_or_404(PDFDocument, pk=document_id, user=request.user)
-    words = WordEntry.objects.filter(document=document).order_by('original_text')
+    language = request_language(request, document)
+    words = document.words_in(language).order_by('lexeme__word')
+    names = dict(PDFDocument.LANGUAGE_CHOICES)
     return render(request, 'pdftranslate/translated_words_list.html', {
         'document': document,
         'words': words,
+        'language': language,
+        'languages': [(code, names.get(code, code)) for code in document.languages],
     })
+
+def request_language(request, document):
+    """The ``?language=`` the document was translated into, else its primary one."""
+    language = request.GET.get('language')
+    return language if language in document.languages else document.target_language
+
+def export_response(file_format, filename, header, rows):
+    """
+    Stream ``rows`` as a CSV file or an Anki package.
+
+    ``rows`` should be a lazy ``.iterator()`` queryset whose first two
+    columns are the original word and its translation. ``filename`` may be
+    a document title, so it is quoted or RFC 5987-encoded as needed.
+    """
+    # Control characters cannot go into a header at all
+    filename = re.sub(r'[\x00-\x1f\x7f]', '', filename)
+    if file_format == 'csv':
+        response = StreamingHttpResponse(
+            iter_csv(header, rows),
+            content_type='text/csv; charset=utf-8'
+        )
+        response['Content-Disposition'] = content_disposition_header(True, f'{filename}.csv')
+        return response
+    if file_format == 'apkg':
+        # The package is a zipped SQLite file, so it has to be complete
+        # before it can be sent; it is built on disk and streamed from there.
+        package = tempfile.TemporaryFile()
+        build_apkg(filename, ((row[0], row[1]) for row in rows), package)
+        package.seek(0)
+        return FileResponse(
+            package,
+            as_attachment=True,
+            filename=f'{filename}.apkg',
+            content_type='application/octet-stream'
+        )
+    raise Http404('Unknown export format')
+
+@login_required
+def export_words(request, document_id, file_format):
+    """Export the translated words of a document."""
+    document = get_object_or_404(PDFDocument, pk=document_id, user=request.user)
+    language = request_language(request, document)
+    words = (
+        document.words_in(language)
+        .alias(translation=translation_of())
+        .filter(translation__isnull=False)
+        .order_by('page_number', 'position')
+        .values_list('lexeme__word', translation_of(), 'page_number', 'position')
+        .iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    )
+    filename = os.path.splitext(document.title)[0] or 'words'
+    if document.extra_languages:
+        filename += f'-{language}'
+    return export_response(
+        file_format,
+        filename,
+        ['original', 'translation', 'page', 'position'],
+        words
+    )
+
+@login_required
+def export_flashcards(request, file_format):
+    """Export the user's flashcard deck, optionally for a single document."""
+    flashcards = Flashcard.objects.filter(user=request.user)
+    document_id = request.GET.get('document_id')
+    if document_id:
+        try:
+            document_id = int(document_id)
+        except ValueError:
+            return HttpResponse('Invalid document_id.', status=400)
+        flashcards = flashcards.filter(word_entry__document_id=document_id)
+    rows = (
+        flashcards
+        .order_by('next_review')
+        .values_list(
+            'word_entry__lexeme__word',
+            translation_of('word_entry__'),
+            'word_entry__document__title',
+            'next_review',
+            'review_count'
+        )
+        .iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    )
+    return export_response(
+        file_format,
+        'flashcards',
+        ['original', 'translation', 'document', 'next_review', 'review_count'],
+        rows
+    )
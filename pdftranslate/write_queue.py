@@ -0,0 +1,143 @@
+"""
+Per-process single writer for background ingestion.
+
+SQLite lets one connection write at a time. Instead of every job thread
+committing its own small transactions and queueing on the database lock
+(while request threads wait behind them), jobs hand their writes to one
+writer thread. It runs the writes that arrive within
+INGESTION_QUEUE_BATCH_WINDOW seconds of each other, up to
+INGESTION_QUEUE_MAX_BATCH of them, in a single transaction.
+
+Writes submitted inside an open transaction run inline, so they commit or
+roll back with it (this is also what happens in tests).
+"""
+import logging
+import os
+import queue
+import threading
+import time
+import traceback
+from concurrent.futures import Future
+from django.conf import settings
+from django.db import connection, transaction
+
+logger = logging.getLogger(__name__)
+
+
+class WriteQueue:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pending = None
+        self.thread = None
+        self.pid = None
+
+    def runs_inline(self):
+        return (
+            not settings.INGESTION_QUEUE_ENABLED
+            or connection.in_atomic_block
+            or threading.current_thread() is self.thread
+        )
+
+    def submit(self, fn, *args, **kwargs):
+        """
+        Queue ``fn(*args, **kwargs)`` for the writer thread and return a
+        Future of its result. Failures are logged even if nobody waits.
+        """
+        future = Future()
+        if self.runs_inline():
+            try:
+                future.set_result(fn(*args, **kwargs))
+            except Exception as e:
+                future.set_exception(e)
+            return future
+        self.start().put((future, fn, args, kwargs))
+        return future
+
+    def write(self, fn, *args, **kwargs):
+        """Run ``fn(*args, **kwargs)`` on the writer thread and wait for its result."""
+        return self.submit(fn, *args, **kwargs).result()
+
+    def flush(self):
+        """Wait until every write submitted so far has run."""
+        if self.thread is not None and self.pid == os.getpid():
+            self.write(lambda: None)
+
+    def start(self):
+        with self.lock:
+            # Threads do not survive a fork, so worker processes start their own
+            if self.thread is None or self.pid != os.getpid() or not self.thread.is_alive():
+                if self.pending is not None:
+                    self.abandon(self.pending)
+                self.pending = queue.Queue()
+                self.pid = os.getpid()
+                self.thread = threading.Thread(
+                    target=self.run, args=(self.pending,), name='ingestion-writer', daemon=True
+                )
+                self.thread.start()
+            return self.pending
+
+    def abandon(self, pending):
+        """Fail the writes a stopped writer thread left behind, so nobody waits on them."""
+        while True:
+            try:
+                future, fn, _, _ = pending.get_nowait()
+            except queue.Empty:
+                return
+            if not future.done():
+                future.set_exception(
+                    RuntimeError(f"Writer thread stopped before {getattr(fn, '__qualname__', fn)} ran")
+                )
+
+    def next_batch(self, pending):
+        batch = [pending.get()]
+        deadline = time.monotonic() + settings.INGESTION_QUEUE_BATCH_WINDOW
+        while len(batch) < settings.INGESTION_QUEUE_MAX_BATCH:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(pending.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def run(self, pending):
+        while True:
+            batch = self.next_batch(pending)
+            try:
+                self.run_batch(batch)
+            except Exception as e:
+                # Whatever went wrong, nobody may be left waiting on these
+                logger.error(f"Writer thread failed: {str(e)}")
+                logger.error(traceback.format_exc())
+                for future, _, _, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+
+    def run_batch(self, batch):
+        connection.close_if_unusable_or_obsolete()
+        try:
+            with transaction.atomic():
+                results = [fn(*args, **kwargs) for _, fn, args, kwargs in batch]
+        except Exception:
+            # The whole batch was rolled back; run the writes one
+            # transaction each so only the failing one fails
+            for item in batch:
+                self.run_one(*item)
+            return
+        for (future, _, _, _), result in zip(batch, results):
+            future.set_result(result)
+
+    def run_one(self, future, fn, args, kwargs):
+        try:
+            with transaction.atomic():
+                result = fn(*args, **kwargs)
+        except Exception as e:
+            logger.error(f"Queued write {getattr(fn, '__qualname__', fn)} failed: {str(e)}")
+            logger.error(traceback.format_exc())
+            future.set_exception(e)
+        else:
+            future.set_result(result)
+
+
+write_queue = WriteQueue()